@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+import pandas as pd
+import duckdb
+from sqlalchemy import text
+import os
+import time
+import argparse
+from datetime import datetime
+from dotenv import load_dotenv
+from load_data import COLUMN_MAPPING
+from db import get_engine
+from parquet_cache import FiscalYearWriter, partition_path
+
+# Load environment variables
+load_dotenv()
+
+# Group-by dimensions exposed by the CLI and ArchiveAnalytics.group_by
+DIMENSIONS = {
+    'agency': 'department_agency',
+    'naics': 'naics_code',
+    'set_aside': 'set_aside',
+    'fiscal_year': 'fiscal_year',
+    'awardee': 'awardee'
+}
+
+METRICS = """
+    COUNT(*) AS contracts,
+    COUNT(award_amount) AS awards,
+    ROUND(SUM(award_amount), 2) AS total_award_amount,
+    ROUND(AVG(award_amount), 2) AS avg_award_amount
+"""
+
+def export_snapshot(engine, snapshot_dir, fiscal_years=None, batch_size=100000):
+    """Copy archived_opportunities into a local Parquet snapshot, one partition per fiscal year
+    
+    Rows are streamed with a server-side cursor, so memory stays at one batch.
+    The layout is the same as the loader's --parquet-cache, so either can be
+    queried. Partitions written here are tagged with the export time rather
+    than a CSV hash, so the loader will rebuild them from the CSVs if asked.
+    """
+    columns = list(COLUMN_MAPPING.values())
+    source = f"postgres-export:{datetime.now().isoformat(timespec='seconds')}"
+    
+    with engine.connect() as conn:
+        if fiscal_years is None:
+            fiscal_years = [row[0] for row in conn.execute(text(
+                "SELECT DISTINCT fiscal_year FROM archived_opportunities WHERE fiscal_year IS NOT NULL ORDER BY fiscal_year"
+            ))]
+        
+        for fiscal_year in fiscal_years:
+            start_time = time.time()
+            writer = FiscalYearWriter(snapshot_dir, fiscal_year, source)
+            query = text(f"""
+                SELECT {', '.join(columns)}
+                FROM archived_opportunities
+                WHERE fiscal_year = :fiscal_year
+                ORDER BY id
+            """)
+            try:
+                streaming = conn.execution_options(stream_results=True, max_row_buffer=batch_size)
+                for chunk in pd.read_sql(query, streaming, params={'fiscal_year': fiscal_year}, chunksize=batch_size):
+                    chunk['award_amount'] = chunk['award_amount'].astype('float64')
+                    writer.write(chunk)
+            except BaseException:
+                writer.abort()
+                raise
+            writer.close()
+            print(f"  ✓ FY{fiscal_year}: {writer.rows_written} rows in {time.time() - start_time:.1f}s")
+
+class ArchiveAnalytics:
+    """In-process DuckDB queries over a Parquet snapshot of the archive
+    
+    The snapshot is exposed as the view `archive` with every
+    archived_opportunities column plus fiscal_year from the partition path.
+    Filters on fiscal_year skip whole partitions, and only the columns a
+    query touches are read.
+    """
+    
+    def __init__(self, snapshot_dir, threads=None, memory_limit=None):
+        if not os.path.isdir(snapshot_dir):
+            raise FileNotFoundError(f"No snapshot at {snapshot_dir}; run `analytics.py export` or load with --parquet-cache")
+        self.snapshot_dir = snapshot_dir
+        self.conn = duckdb.connect()
+        if threads:
+            self.conn.execute(f"SET threads = {int(threads)}")
+        if memory_limit:
+            self.conn.execute(f"SET memory_limit = '{memory_limit}'")
+        pattern = partition_path(snapshot_dir, '*').replace("'", "''")
+        self.conn.execute(f"""
+            CREATE VIEW archive AS
+            SELECT * FROM read_parquet('{pattern}', hive_partitioning = true)
+        """)
+    
+    def query(self, sql, params=None):
+        """Run SQL against the `archive` view and return a DataFrame"""
+        return self.conn.execute(sql, params or []).df()
+    
+    def group_by(self, by, fiscal_years=None, where=None, limit=20, order_by='contracts'):
+        """Contract count and award totals grouped by one or more DIMENSIONS
+        
+        by is a dimension name or list of names (see DIMENSIONS). where maps
+        dimension names to a value or list of values to keep.
+        """
+        by = [by] if isinstance(by, str) else list(by)
+        unknown = [name for name in by + list(where or {}) if name not in DIMENSIONS]
+        if unknown:
+            raise ValueError(f"Unknown dimension(s) {unknown}; choose from {list(DIMENSIONS)}")
+        if order_by not in ('contracts', 'awards', 'total_award_amount', 'avg_award_amount'):
+            raise ValueError(f"Cannot order by {order_by}")
+        
+        conditions = []
+        params = []
+        filters = dict(where or {})
+        if fiscal_years:
+            filters['fiscal_year'] = fiscal_years
+        for name, values in filters.items():
+            values = list(values) if isinstance(values, (list, tuple, set)) else [values]
+            conditions.append(f"{DIMENSIONS[name]} IN ({', '.join('?' for _ in values)})")
+            params.extend(values)
+        
+        group_columns = ', '.join(f"{DIMENSIONS[name]} AS {name}" for name in by)
+        sql = f"""
+            SELECT {group_columns}, {METRICS}
+            FROM archive
+            {'WHERE ' + ' AND '.join(conditions) if conditions else ''}
+            GROUP BY ALL
+            ORDER BY {order_by} DESC NULLS LAST
+        """
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        return self.query(sql, params)
+    
+    def row_count(self):
+        """Number of rows in the snapshot"""
+        return self.conn.execute("SELECT COUNT(*) FROM archive").fetchone()[0]
+    
+    def close(self):
+        self.conn.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+
+def parse_args():
+    """Parse command-line options for the analytics CLI"""
+    parser = argparse.ArgumentParser(description="Query a local Parquet snapshot of archived_opportunities with DuckDB")
+    parser.add_argument(
+        '--snapshot',
+        default=os.getenv('analytics_snapshot_dir', 'data/archive-snapshot'),
+        help="Snapshot directory, partitioned by fiscal_year (default: $analytics_snapshot_dir or data/archive-snapshot)"
+    )
+    commands = parser.add_subparsers(dest='command', required=True)
+    
+    export = commands.add_parser('export', help="Export archived_opportunities from the database into the snapshot")
+    export.add_argument('--fy', type=int, nargs='+', help="Only these fiscal years")
+    export.add_argument('--batch-size', type=int, default=100000, help="Rows per streamed batch (default: 100000)")
+    
+    summary = commands.add_parser('summary', help="Contract counts and award totals grouped by dimensions")
+    summary.add_argument('--by', nargs='+', default=['agency'], choices=list(DIMENSIONS), help="Group-by dimensions (default: agency)")
+    summary.add_argument('--fy', type=int, nargs='+', help="Only these fiscal years")
+    summary.add_argument('--agency', help="Only this department/agency")
+    summary.add_argument('--naics', help="Only this NAICS code")
+    summary.add_argument('--set-aside', help="Only this set-aside")
+    summary.add_argument('--order-by', default='contracts', choices=['contracts', 'awards', 'total_award_amount', 'avg_award_amount'])
+    summary.add_argument('--limit', type=int, default=20, help="Rows to show, 0 for all (default: 20)")
+    summary.add_argument('--csv', help="Also write the result to this CSV file")
+    
+    sql = commands.add_parser('sql', help="Run a SQL query against the `archive` view")
+    sql.add_argument('query')
+    sql.add_argument('--csv', help="Also write the result to this CSV file")
+    
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    
+    if args.command == 'export':
+        engine = get_engine(pool_size=1, max_overflow=0, statement_timeout_ms=0, application_name='analytics_export')
+        print(f"Exporting archived_opportunities to {args.snapshot}...")
+        export_snapshot(engine, args.snapshot, args.fy, args.batch_size)
+        print("Export completed!")
+        return
+    
+    with ArchiveAnalytics(args.snapshot) as analytics:
+        start_time = time.time()
+        if args.command == 'summary':
+            where = {}
+            if args.agency:
+                where['agency'] = args.agency
+            if args.naics:
+                where['naics'] = args.naics
+            if args.set_aside:
+                where['set_aside'] = args.set_aside
+            result = analytics.group_by(args.by, args.fy, where, args.limit, args.order_by)
+        else:
+            result = analytics.query(args.query)
+        elapsed = time.time() - start_time
+        
+        with pd.option_context('display.max_rows', None, 'display.max_columns', None, 'display.width', 200):
+            print(result.to_string(index=False))
+        print(f"\n{len(result)} rows in {elapsed:.3f}s")
+        if args.csv:
+            result.to_csv(args.csv, index=False)
+            print(f"✓ Wrote {args.csv}")
+
+if __name__ == "__main__":
+    main()
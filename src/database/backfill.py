@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+import os
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dotenv import load_dotenv
+from db import get_engine
+from partition_archive import is_partitioned, partition_tables
+from instrumentation import recording_scope, stage, profiled, add_instrumentation_args, start_from_args
+
+# Load environment variables
+load_dotenv()
+
+BACKFILL_SQL_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'create_backfill_progress.sql')
+DEPARTMENT_AGENCY_SQL_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'create_department_agency_table.sql')
+
+def ensure_backfill_tables(engine):
+    """Create the backfill_job and backfill_range tables if they don't exist"""
+    with open(BACKFILL_SQL_FILE) as f:
+        create_sql = f.read()
+    with engine.begin() as conn:
+        conn.execute(text(create_sql))
+
+def id_bounds(engine, table_name):
+    """(min id, max id) of a table, or (None, None) if it is empty"""
+    with engine.connect() as conn:
+        return tuple(conn.execute(text(f"SELECT MIN(id), MAX(id) FROM {table_name}")).fetchone())
+
+def keyset_ranges(min_id, max_id, batch_size):
+    """Half-open [start, end) id ranges of batch_size ids covering min_id..max_id"""
+    return [(start, start + batch_size) for start in range(min_id, max_id + 1, batch_size)]
+
+def start_job(engine, job_name, table_name, batch_size, restart=False):
+    """Register a backfill job or pick up an unfinished one
+    
+    Returns (batch_size, min_id, max_id, done) where done is the set of range
+    starts already committed. A resumed job keeps the batch size it started
+    with, so its ranges line up, and is extended to the table's current
+    max id.
+    """
+    min_id, max_id = id_bounds(engine, table_name)
+    if min_id is None:
+        return batch_size, 0, -1, set()
+    
+    with engine.begin() as conn:
+        job = conn.execute(
+            text("SELECT * FROM backfill_job WHERE job_name = :job_name"),
+            {'job_name': job_name}
+        ).mappings().fetchone()
+        
+        if job and not restart and job['table_name'] == table_name:
+            conn.execute(text("""
+                UPDATE backfill_job
+                SET max_id = :max_id, status = 'in_progress', completed_at = NULL
+                WHERE job_name = :job_name
+            """), {'job_name': job_name, 'max_id': max_id})
+            done = {row[0] for row in conn.execute(
+                text("SELECT range_start FROM backfill_range WHERE job_name = :job_name"),
+                {'job_name': job_name}
+            )}
+            return job['batch_size'], job['min_id'], max_id, done
+        
+        conn.execute(text("DELETE FROM backfill_job WHERE job_name = :job_name"), {'job_name': job_name})
+        conn.execute(text("""
+            INSERT INTO backfill_job (job_name, table_name, batch_size, min_id, max_id)
+            VALUES (:job_name, :table_name, :batch_size, :min_id, :max_id)
+        """), {
+            'job_name': job_name,
+            'table_name': table_name,
+            'batch_size': batch_size,
+            'min_id': min_id,
+            'max_id': max_id
+        })
+    return batch_size, min_id, max_id, set()
+
+class BackfillProgress:
+    """Thread-safe progress and ETA for a keyset backfill
+    
+    Progress is measured in ids covered, which tracks the real work because
+    every range scans its ids whether or not rows change. The rate used for
+    the ETA only counts ranges run in this session.
+    """
+    
+    def __init__(self, total_ids, done_ids, report_every=5.0):
+        self.total_ids = total_ids
+        self.done_ids = done_ids
+        self.session_ids = 0
+        self.rows_updated = 0
+        self.report_every = report_every
+        self.start_time = time.time()
+        self.last_report = 0
+        self.lock = threading.Lock()
+    
+    def add(self, range_ids, rows_updated):
+        with self.lock:
+            self.done_ids += range_ids
+            self.session_ids += range_ids
+            self.rows_updated += rows_updated
+            now = time.time()
+            if now - self.last_report >= self.report_every or self.done_ids >= self.total_ids:
+                self.last_report = now
+                self.report(now)
+    
+    def report(self, now=None):
+        elapsed = (now or time.time()) - self.start_time
+        rate = self.session_ids / elapsed if elapsed > 0 else 0
+        remaining = (self.total_ids - self.done_ids) / rate if rate > 0 else 0
+        percent = self.done_ids / self.total_ids * 100 if self.total_ids else 100
+        print(f"  [{percent:5.1f}%] {self.done_ids:,}/{self.total_ids:,} ids | {self.rows_updated:,} rows updated | "
+              f"{rate:,.0f} ids/sec | Elapsed: {elapsed:.1f}s | ETA: {remaining:.1f}s")
+
+def run_range(engine, job_name, update_sql, start, end, retries=3, scope=None):
+    """UPDATE one id range and record it as done in the same transaction
+    
+    Each attempt is recorded as a 'range' stage of scope (ids in, rows
+    updated out) when metrics are being recorded.
+    """
+    for attempt in range(retries):
+        try:
+            with stage('range', rows_in=end - start, scope=scope) as rows, engine.begin() as conn:
+                result = conn.execute(text(update_sql), {'start_id': start, 'end_id': end})
+                rows.rows_out = result.rowcount
+                conn.execute(text("""
+                    INSERT INTO backfill_range (job_name, range_start, range_end, rows_updated)
+                    VALUES (:job_name, :range_start, :range_end, :rows_updated)
+                    ON CONFLICT (job_name, range_start) DO NOTHING
+                """), {'job_name': job_name, 'range_start': start, 'range_end': end, 'rows_updated': result.rowcount})
+            return result.rowcount
+        except OperationalError as e:
+            # Dropped connections and lock timeouts are retried; the range's
+            # transaction rolled back, so it can simply run again
+            if attempt == retries - 1:
+                raise
+            print(f"  Range [{start}, {end}) failed ({str(e).splitlines()[0]}), retrying...")
+            time.sleep(2 ** attempt)
+
+def run_backfill(engine, job_name, table_name, update_sql, batch_size=20000, workers=4, restart=False):
+    """Run an UPDATE over a table in keyset ranges of id, in parallel and resumably
+    
+    update_sql must restrict itself to `id >= :start_id AND id < :end_id`, so
+    each range reads only its slice of the primary key index and no range
+    rescans rows an earlier range covered. Ranges are disjoint, so `workers`
+    connections can run them concurrently without lock contention. Each
+    range commits with its checkpoint in backfill_range; rerunning the same
+    job_name skips committed ranges. Returns the number of rows updated.
+    """
+    ensure_backfill_tables(engine)
+    batch_size, min_id, max_id, done = start_job(engine, job_name, table_name, batch_size, restart)
+    ranges = keyset_ranges(min_id, max_id, batch_size)
+    pending = [(start, end) for start, end in ranges if start not in done]
+    
+    total_ids = len(ranges) * batch_size
+    print(f"Backfill '{job_name}' on {table_name}: ids {min_id}..{max_id}, {len(ranges)} ranges of {batch_size}, "
+          f"{len(ranges) - len(pending)} already done, {workers} workers")
+    progress = BackfillProgress(total_ids, (len(ranges) - len(pending)) * batch_size)
+    
+    with recording_scope(job_name, table_name=table_name, workers=workers) as scope, \
+            ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(run_range, engine, job_name, update_sql, start, end, scope=scope): (start, end)
+                   for start, end in pending}
+        try:
+            for future in as_completed(futures):
+                progress.add(batch_size, future.result())
+        except BaseException:
+            # Committed ranges stay recorded; a rerun picks up from there
+            for future in futures:
+                future.cancel()
+            raise
+    
+    with engine.begin() as conn:
+        conn.execute(text("""
+            UPDATE backfill_job SET status = 'complete', completed_at = CURRENT_TIMESTAMP
+            WHERE job_name = :job_name
+        """), {'job_name': job_name})
+    
+    elapsed = time.time() - progress.start_time
+    rate = progress.session_ids / elapsed if elapsed > 0 else 0
+    print(f"✓ Backfill '{job_name}' complete: {progress.rows_updated:,} rows updated in {elapsed:.1f}s ({rate:,.0f} ids/sec)")
+    return progress.rows_updated
+
+def ensure_department_agency_column(engine, table_name='archived_opportunities'):
+    """Add the nullable department_agency_id column if it is missing"""
+    with engine.begin() as conn:
+        conn.execute(text(f"ALTER TABLE {table_name} ADD COLUMN IF NOT EXISTS department_agency_id INTEGER"))
+
+def ensure_department_agency_table(engine):
+    """Create the department_agency lookup table if it doesn't exist"""
+    with open(DEPARTMENT_AGENCY_SQL_FILE) as f:
+        create_sql = f.read()
+    with engine.begin() as conn:
+        conn.execute(text(create_sql))
+
+def populate_department_agency(engine, table_name='archived_opportunities', lookup_table='department_agency'):
+    """Insert every distinct trimmed agency name, with its most common CGAC code, into the lookup table"""
+    with engine.begin() as conn:
+        conn.execute(text("SET LOCAL statement_timeout = 0"))
+        result = conn.execute(text(f"""
+            INSERT INTO {lookup_table} (agency_name, agency_code)
+            SELECT TRIM(department_agency), MODE() WITHIN GROUP (ORDER BY cgac)
+            FROM {table_name}
+            WHERE TRIM(department_agency) <> ''
+            GROUP BY TRIM(department_agency)
+            ON CONFLICT (agency_name) DO NOTHING
+        """))
+    print(f"✓ Added {result.rowcount} agencies to {lookup_table}")
+
+def department_agency_update_sql(table_name='archived_opportunities', lookup_table='department_agency'):
+    """Keyset-range UPDATE that sets department_agency_id from the lookup table
+    
+    Rows that already hold the right id are left alone, so reruns and resumed
+    ranges write nothing.
+    """
+    return f"""
+        UPDATE {table_name} t
+        SET department_agency_id = da.id
+        FROM {lookup_table} da
+        WHERE t.id >= :start_id AND t.id < :end_id
+          AND da.agency_name = TRIM(t.department_agency)
+          AND t.department_agency_id IS DISTINCT FROM da.id
+    """
+
+def add_department_agency_constraints(engine, table_name='archived_opportunities', lookup_table='department_agency'):
+    """Index department_agency_id and add its foreign key once the backfill is done
+    
+    The constraint is added NOT VALID and validated separately, so the
+    validation scan does not block writes to the table. A partitioned table
+    cannot take a NOT VALID foreign key, so each partition gets one first;
+    the parent's constraint then adopts them without another scan.
+    """
+    with engine.begin() as conn:
+        conn.execute(text("SET LOCAL statement_timeout = 0"))
+        conn.execute(text(f"""
+            CREATE INDEX IF NOT EXISTS idx_{table_name}_department_agency_id
+            ON {table_name}(department_agency_id)
+        """))
+        with conn.connection.cursor() as cursor:
+            partitioned = is_partitioned(cursor, table_name)
+        constrained_tables = partition_tables(conn, table_name) if partitioned else [table_name]
+    
+    for constrained_table in constrained_tables:
+        with engine.begin() as conn:
+            conn.execute(text(f"""
+                DO $$
+                BEGIN
+                    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'fk_{constrained_table}_department_agency') THEN
+                        ALTER TABLE {constrained_table}
+                        ADD CONSTRAINT fk_{constrained_table}_department_agency
+                        FOREIGN KEY (department_agency_id) REFERENCES {lookup_table}(id) NOT VALID;
+                    END IF;
+                END $$;
+            """))
+        with engine.begin() as conn:
+            conn.execute(text("SET LOCAL statement_timeout = 0"))
+            conn.execute(text(f"ALTER TABLE {constrained_table} VALIDATE CONSTRAINT fk_{constrained_table}_department_agency"))
+    if partitioned:
+        with engine.begin() as conn:
+            conn.execute(text(f"""
+                DO $$
+                BEGIN
+                    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'fk_{table_name}_department_agency') THEN
+                        ALTER TABLE {table_name}
+                        ADD CONSTRAINT fk_{table_name}_department_agency
+                        FOREIGN KEY (department_agency_id) REFERENCES {lookup_table}(id);
+                    END IF;
+                END $$;
+            """))
+    print(f"✓ Indexed and constrained {table_name}.department_agency_id")
+
+def backfill_department_agency(engine, table_name='archived_opportunities', lookup_table='department_agency',
+                               batch_size=20000, workers=4, restart=False, add_constraints=True):
+    """Populate department_agency, backfill department_agency_id, then index and constrain it"""
+    if lookup_table == 'department_agency':
+        ensure_department_agency_table(engine)
+    ensure_department_agency_column(engine, table_name)
+    populate_department_agency(engine, table_name, lookup_table)
+    updated = run_backfill(engine, f"department_agency_id:{table_name}", table_name,
+                           department_agency_update_sql(table_name, lookup_table), batch_size, workers, restart)
+    if add_constraints:
+        add_department_agency_constraints(engine, table_name, lookup_table)
+    return updated
+
+def parse_args():
+    """Parse command-line options for the backfill"""
+    parser = argparse.ArgumentParser(description="Backfill archived_opportunities.department_agency_id in keyset ranges")
+    parser.add_argument('--table', default='archived_opportunities', help="Table to backfill (default: archived_opportunities)")
+    parser.add_argument('--lookup-table', default='department_agency', help="Agency lookup table (default: department_agency)")
+    parser.add_argument('--batch-size', type=int, default=20000, help="Ids per range (default: 20000)")
+    parser.add_argument('--workers', type=int, default=4, help="Ranges updated concurrently, one connection each (default: 4)")
+    parser.add_argument('--restart', action='store_true', help="Ignore checkpoints from an earlier run")
+    parser.add_argument('--skip-constraints', action='store_true', help="Do not add the index and foreign key afterwards")
+    add_instrumentation_args(parser)
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    start_from_args(args)
+    engine = get_engine(pool_size=args.workers, max_overflow=0, application_name='backfill')
+    with profiled(args.profile):
+        backfill_department_agency(engine, args.table, args.lookup_table, args.batch_size, args.workers,
+                                   args.restart, not args.skip_constraints)
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
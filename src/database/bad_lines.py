@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+import pandas as pd
+import numpy as np
+import os
+import io
+import re
+import csv
+import json
+import argparse
+from collections import defaultdict
+from datetime import datetime
+
+# One field of a SAM.gov record: quoted, with backslash-escaped or doubled
+# quotes inside, or unquoted without quotes, commas or line breaks
+QUOTED_FIELD = rb'"[^"\\]*(?:(?:\\.|"")[^"\\]*)*"'
+FIELD = rb'(' + QUOTED_FIELD + rb'|[^",\r\n]*)'
+LEADING_FIELD = re.compile(FIELD + rb',')
+TRAILING_FIELD = re.compile(rb',' + FIELD)
+ESCAPE = re.compile(rb'\\(.)|""', re.S)
+
+# A record still open after this many bytes is given up as malformed
+MAX_RECORD_BYTES = 1024 * 1024
+
+# Files are scanned in blocks of whole lines of about this size
+BLOCK_BYTES = 1024 * 1024
+
+QUOTE, COMMA, BACKSLASH, CARRIAGE_RETURN, NEWLINE = b'",\\\r\n'
+
+def record_pattern(field_count):
+    """Regex matching exactly one whole record of field_count fields, line break included"""
+    return re.compile(FIELD + rb'(?:,' + FIELD + rb'){%d}\r?\n' % (field_count - 1))
+
+def header_fields(header_line):
+    """Column names of a CSV header line (bytes); header names are plain ASCII"""
+    return next(csv.reader([header_line.decode('latin-1').rstrip('\r\n')]))
+
+def unescape(value):
+    """Undo the quoting of a field's bytes: outer quotes, \\-escapes and doubled quotes"""
+    if len(value) >= 2 and value.startswith(b'"') and value.endswith(b'"'):
+        value = value[1:-1]
+    return ESCAPE.sub(lambda match: match.group(1) or b'"', value)
+
+def iter_blocks(f, block_size=BLOCK_BYTES):
+    """Yield blocks of whole lines from a binary file, the last one newline-terminated too"""
+    while True:
+        block = f.read(block_size)
+        if not block:
+            return
+        if not block.endswith(b'\n'):
+            block += f.readline()
+            if not block.endswith(b'\n'):
+                block += b'\n'
+        yield block
+
+def plain_lines(block, field_count):
+    """Start and end offsets of a block's lines, and which lines hold one plain record each
+    
+    A plain record is quoted field by field, with no backslash and no
+    quote inside a field: it starts and ends with a quote and holds
+    exactly 2 * field_count quotes and field_count - 1 '","' separators.
+    The counts are taken for all lines of the block at once.
+    """
+    data = np.frombuffer(block, dtype=np.uint8)
+    ends = np.flatnonzero(data == NEWLINE) + 1
+    starts = np.concatenate(([0], ends[:-1]))
+    
+    def per_line(positions):
+        return np.diff(np.searchsorted(positions, np.concatenate(([0], ends))))
+    
+    quotes = np.flatnonzero(data == QUOTE)
+    commas = np.flatnonzero(data[1:-1] == COMMA) + 1
+    separators = commas[(data[commas - 1] == QUOTE) & (data[commas + 1] == QUOTE)]
+    last = data[np.maximum(ends - 2, 0)]
+    before_last = data[np.maximum(ends - 3, 0)]
+    plain = ((per_line(quotes) == 2 * field_count) & (per_line(separators) == field_count - 1)
+             & (per_line(np.flatnonzero(data == BACKSLASH)) == 0) & (data[starts] == QUOTE)
+             & ((last == QUOTE) | ((last == CARRIAGE_RETURN) & (before_last == QUOTE))))
+    return starts, ends, plain
+
+def scan_records(f, field_count, offset=0):
+    """Yield (byte offset, bytes, well formed, record count) for the records left in a binary file
+    
+    Runs of consecutive plain records (see plain_lines) come out as one
+    well-formed item each, with the number of records in it (1 for every
+    other item); every other line is checked against the record pattern.
+    A line that leaves a quoted field open (a Description with line
+    breaks) is joined with the following lines until the record is
+    complete. A record that never completes is given up as malformed at
+    the next line that is a whole record on its own, so a stray quote or
+    backslash costs that one record instead of running it into the next,
+    as the C parser does. Lines of the open record that could start a
+    record of their own (every field before the last parses) are tried as
+    one, and a given-up record is split at them, so a multi-line record
+    right after a broken one is not swallowed by it.
+    """
+    pattern = record_pattern(field_count)
+    
+    def starts_record(line):
+        return repair_record(line, field_count) is not None
+    
+    def given_up(lines, offsets, starts):
+        if not lines:
+            return
+        bounds = [0] + starts + [len(lines)]
+        for start, end in zip(bounds, bounds[1:]):
+            yield offsets[start], b''.join(lines[start:end]), False, 1
+    
+    # The open record: its lines, their offsets and the lines that could start a record
+    pending, offsets, starts = [], [], []
+    
+    def feed(line, offset, plain):
+        nonlocal pending, offsets, starts
+        if not pending:
+            if plain or pattern.fullmatch(line):
+                yield offset, line, True, 1
+            else:
+                pending, offsets, starts = [line], [offset], []
+            return
+        
+        for start in [0] + starts:
+            joined = b''.join(pending[start:]) + line
+            if pattern.fullmatch(joined):
+                yield from given_up(pending[:start], offsets[:start], [i for i in starts if i < start])
+                yield offsets[start], joined, True, 1
+                pending = []
+                return
+        if plain or pattern.fullmatch(line):
+            yield from given_up(pending, offsets, starts)
+            yield offset, line, True, 1
+            pending = []
+        elif sum(map(len, pending)) + len(line) > MAX_RECORD_BYTES:
+            yield from given_up(pending + [line], offsets + [offset], starts)
+            pending = []
+        else:
+            if starts_record(line):
+                starts.append(len(pending))
+            pending.append(line)
+            offsets.append(offset)
+    
+    for block in iter_blocks(f):
+        line_starts, line_ends, plain = plain_lines(block, field_count)
+        irregular = np.flatnonzero(~plain)
+        i = 0
+        while i < len(line_ends):
+            if plain[i] and not pending:
+                # Hand over the whole run of plain records up to the next irregular line
+                j = irregular[np.searchsorted(irregular, i)] if irregular.size and irregular[-1] > i else len(line_ends)
+                yield offset + int(line_starts[i]), block[line_starts[i]:line_ends[j - 1]], True, j - i
+                i = j
+            else:
+                yield from feed(block[line_starts[i]:line_ends[i]], offset + int(line_starts[i]), plain[i])
+                i += 1
+        offset += len(block)
+    if pending:
+        yield from given_up(pending, offsets, starts)
+
+def split_fields(text):
+    """The fields (bytes, still quoted) of text when all of it parses as whole fields, else None"""
+    match = re.compile(FIELD).match(text)
+    fields, position = [match.group(1)], match.end()
+    while position < len(text):
+        match = TRAILING_FIELD.match(text, position)
+        if match is None:
+            return None
+        fields.append(match.group(1))
+        position = match.end()
+    return fields
+
+def repair_record(record, field_count):
+    """(field values, dropped fields) of a malformed record whose damage is confined to its end, or None
+    
+    Description is the last column of the extracts and the only free text
+    long enough to carry unescaped quotes, stray backslashes and line
+    breaks. When every field before it parses, the rest of the record is
+    the description. If the rest is whole fields (a record with extra
+    fields), the first is the description and the others are dropped and
+    returned unescaped. Otherwise all of it is taken as the description:
+    its outer quotes are dropped and escapes undone, and anything that
+    does not fit the quoting is kept as text. All values are bytes.
+    """
+    values = []
+    position = 0
+    for _ in range(field_count - 1):
+        match = LEADING_FIELD.match(record, position)
+        if match is None:
+            return None
+        values.append(unescape(match.group(1)))
+        position = match.end()
+    rest = record[position:].rstrip(b'\r\n')
+    fields = split_fields(rest)
+    if fields is not None and len(fields) > 1:
+        return values + [unescape(fields[0])], [unescape(field) for field in fields[1:]]
+    return values + [unescape(rest)], []
+
+class Quarantine:
+    """Malformed records of one CSV file, repaired where possible
+    
+    Every malformed record is appended to path (when given) as a JSON line
+    with its byte offset, length, status ('recovered' or 'lost'), the extra
+    fields dropped from a recovered record, and its text, in a single
+    unbuffered write, so parallel workers can share the file.
+    Repaired rows are kept to be loaded after the file's clean rows.
+    """
+    
+    def __init__(self, csv_file_path, fiscal_year=None, path=None, encoding='utf-8', encoding_errors='strict'):
+        self.csv_file_path = csv_file_path
+        self.fiscal_year = fiscal_year
+        self.encoding = encoding
+        self.encoding_errors = encoding_errors
+        self.output = open(path, 'ab', buffering=0) if path else None
+        self.rows = []
+        self.malformed = 0
+        self.lost = 0
+    
+    def add(self, offset, record, field_count):
+        repaired = repair_record(record, field_count)
+        self.malformed += 1
+        if repaired is None:
+            self.lost += 1
+            dropped = []
+        else:
+            values, dropped = repaired
+            self.rows.append([value.decode(self.encoding, self.encoding_errors) or None for value in values])
+        if self.output is not None:
+            self.output.write(json.dumps({
+                'file': os.path.basename(self.csv_file_path),
+                'fiscal_year': self.fiscal_year,
+                'offset': offset,
+                'bytes': len(record),
+                'status': 'lost' if repaired is None else 'recovered',
+                'dropped_fields': [field.decode(self.encoding, 'backslashreplace') for field in dropped],
+                'quarantined_at': datetime.now().isoformat(timespec='seconds'),
+                'record': record.decode(self.encoding, 'backslashreplace')
+            }).encode('utf-8') + b'\n')
+    
+    def repaired_frame(self, columns):
+        """The recovered rows as a raw chunk with the file's header, handed over once"""
+        rows, self.rows = self.rows, []
+        return pd.DataFrame(rows, columns=columns, dtype=object)
+    
+    def summary(self):
+        return {'rows_malformed': self.malformed, 'rows_recovered': self.malformed - self.lost, 'rows_lost': self.lost}
+    
+    def close(self):
+        if self.output is not None:
+            self.output.close()
+            self.output = None
+        if self.malformed:
+            label = f"FY{self.fiscal_year}" if self.fiscal_year else self.csv_file_path
+            print(f"  {label}: {self.malformed} malformed records quarantined, "
+                  f"{self.malformed - self.lost} recovered, {self.lost} lost")
+
+class CleanRecords(io.RawIOBase):
+    """Read-only binary view of a CSV file holding only its header and well-formed records
+    
+    Malformed records go to the quarantine as they are met, so read_csv
+    can parse the rest with the C engine and never skips a line itself.
+    The first skip_records records, well-formed or not, are left out
+    without being quarantined (they were read before). columns is the
+    file's header.
+    """
+    
+    def __init__(self, csv_file_path, quarantine, skip_records=0):
+        self.f = open(csv_file_path, 'rb')
+        header = self.f.readline()
+        self.columns = header_fields(header)
+        self.records = scan_records(self.f, len(self.columns), len(header))
+        self.quarantine = quarantine
+        self.skip_records = skip_records
+        self.buffer = bytearray(header)
+    
+    def readable(self):
+        return True
+    
+    def readinto(self, b):
+        while len(self.buffer) < len(b):
+            record = next(self.records, None)
+            if record is None:
+                break
+            offset, data, well_formed, count = record
+            if self.skip_records:
+                if count <= self.skip_records:
+                    self.skip_records -= count
+                    continue
+                # Only a run of plain records, one per line, is cut
+                data = data.split(b'\n', self.skip_records)[-1]
+                self.skip_records = 0
+            if well_formed:
+                self.buffer += data
+            else:
+                self.quarantine.add(offset, data, len(self.columns))
+        n = min(len(b), len(self.buffer))
+        b[:n] = self.buffer[:n]
+        del self.buffer[:n]
+        return n
+    
+    def close(self):
+        self.f.close()
+        super().close()
+
+def open_clean_csv(csv_file_path, quarantine, skip_records=0):
+    """Open a CSV for read_csv with its malformed records diverted to quarantine"""
+    return io.BufferedReader(CleanRecords(csv_file_path, quarantine, skip_records), buffer_size=1024 * 1024)
+
+def report(quarantine_path):
+    """Print recovered and lost rows per fiscal year from a quarantine file
+    
+    A record quarantined by several loads of the same file is counted once,
+    with its latest status.
+    """
+    latest = {}
+    with open(quarantine_path, encoding='utf-8') as f:
+        for line in f:
+            entry = json.loads(line)
+            latest[(entry['file'], entry['offset'])] = entry
+    
+    totals = defaultdict(lambda: {'recovered': 0, 'lost': 0})
+    for entry in latest.values():
+        totals[entry['fiscal_year']][entry['status']] += 1
+    print(f"{'fiscal year':<12} {'malformed':>10} {'recovered':>10} {'lost':>6}")
+    for fiscal_year in sorted(totals, key=lambda year: (year is None, year)):
+        counts = totals[fiscal_year]
+        print(f"{str(fiscal_year):<12} {counts['recovered'] + counts['lost']:>10} {counts['recovered']:>10} {counts['lost']:>6}")
+
+def parse_args():
+    """Parse command-line options for scanning files and reporting quarantined records"""
+    parser = argparse.ArgumentParser(description="Find, repair and report malformed records in SAM.gov archive CSVs")
+    commands = parser.add_subparsers(dest='command', required=True)
+    scan = commands.add_parser('scan', help="Scan CSVs without loading them, appending malformed records to the quarantine file")
+    scan.add_argument('csv_files', nargs='+')
+    scan.add_argument('--quarantine', required=True, help="Quarantine file to append to")
+    summary = commands.add_parser('report', help="Recovered and lost rows per fiscal year")
+    summary.add_argument('--quarantine', required=True, help="Quarantine file to read")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    if args.command == 'scan':
+        from load_data import detect_encoding, extract_fiscal_year
+        for csv_file_path in args.csv_files:
+            encoding, encoding_errors = detect_encoding(csv_file_path)
+            quarantine = Quarantine(csv_file_path, extract_fiscal_year(csv_file_path), args.quarantine, encoding, encoding_errors)
+            with open_clean_csv(csv_file_path, quarantine) as f:
+                while f.read(1024 * 1024):
+                    pass
+            quarantine.close()
+    report(args.quarantine)
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+import pandas as pd
+import numpy as np
+import argparse
+import time
+from load_data import clean_currency_value, clean_boolean_value, COLUMN_MAPPING
+from cleaning import clean_currency_series, clean_boolean_series, parse_date_series, DATE_COLUMNS
+
+def make_sample(rows, seed=0):
+    """Build a synthetic frame shaped like the SAM.gov Award$/Active/date columns"""
+    rng = np.random.default_rng(seed)
+    
+    amounts = rng.integers(0, 50_000_000, rows) / 100
+    award = pd.Series([f"${a:,.2f}" for a in amounts], dtype=object)
+    award[rng.random(rows) < 0.4] = np.nan
+    award[rng.random(rows) < 0.01] = 'TBD'
+    award[rng.random(rows) < 0.01] = ' 1 234.50 '
+    
+    active = pd.Series(rng.choice(['Yes', 'No', 'yes', 'N', '', 'unknown'], rows, p=[0.5, 0.3, 0.05, 0.05, 0.05, 0.05]), dtype=object)
+    active[rng.random(rows) < 0.05] = np.nan
+    
+    # Dates repeat heavily within a fiscal year, with DST offsets mixed in
+    days = pd.date_range('2014-10-01', '2015-09-30', freq='D')
+    posted_days = days[rng.integers(0, len(days), rows)]
+    posted = pd.Series([f"{d:%Y-%m-%d} {h:02d}:{m:02d}:00.000-0{4 + (d.month < 3 or d.month > 10)}"
+                        for d, h, m in zip(posted_days, rng.integers(0, 24, rows), rng.integers(0, 60, rows))], dtype=object)
+    archive = pd.Series([f"{d:%Y-%m-%d}" for d in days[rng.integers(0, len(days), rows)]], dtype=object)
+    award_date = archive.copy()
+    award_date[rng.random(rows) < 0.5] = np.nan
+    deadline = pd.Series([f"{d:%Y-%m-%d}T17:00:00-04:00" for d in days[rng.integers(0, len(days), rows)]], dtype=object)
+    deadline[rng.random(rows) < 0.2] = np.nan
+    
+    return pd.DataFrame({
+        'award_amount': award,
+        'active': active,
+        'posted_date': posted,
+        'archive_date': archive,
+        'award_date': award_date,
+        'response_deadline': deadline
+    })
+
+def load_sample(csv_file_path, rows):
+    """Read the cleaning-relevant columns from a real fiscal-year CSV"""
+    wanted = {csv: db for csv, db in COLUMN_MAPPING.items() if db in ['award_amount', 'active'] + DATE_COLUMNS}
+    df = pd.read_csv(csv_file_path, usecols=list(wanted), nrows=rows, encoding='latin-1', quoting=1,
+                     escapechar='\\', on_bad_lines='skip', dtype=object)
+    return df.rename(columns=wanted)
+
+def outputs_match(expected, actual):
+    """Compare two cleaned columns: same nulls, identical non-null values"""
+    expected_null = expected.isna().to_numpy()
+    actual_null = actual.isna().to_numpy()
+    if len(expected) != len(actual) or not (expected_null == actual_null).all():
+        return False
+    return bool((expected[~expected_null].to_numpy() == actual[~actual_null].to_numpy()).all())
+
+def time_it(func, repeat):
+    """Best-of-N wall time and the last result"""
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def run_benchmark(df, repeat=3):
+    """Time row-wise vs vectorized cleaning per column and check the outputs match"""
+    cases = []
+    if 'award_amount' in df.columns:
+        cases.append(('award_amount',
+                      lambda: df['award_amount'].apply(clean_currency_value),
+                      lambda: clean_currency_series(df['award_amount'])))
+    if 'active' in df.columns:
+        cases.append(('active',
+                      lambda: df['active'].apply(clean_boolean_value),
+                      lambda: clean_boolean_series(df['active'])))
+    for col in DATE_COLUMNS:
+        if col in df.columns:
+            cases.append((col,
+                          lambda col=col: pd.to_datetime(df[col], errors='coerce'),
+                          lambda col=col: parse_date_series(df[col])))
+    
+    print(f"{'column':<20} {'current':>10} {'vectorized':>11} {'speedup':>8}  match")
+    all_match = True
+    for name, current, vectorized in cases:
+        current_time, expected = time_it(current, repeat)
+        vectorized_time, actual = time_it(vectorized, repeat)
+        match = outputs_match(expected, actual)
+        all_match = all_match and match
+        print(f"{name:<20} {current_time:>9.3f}s {vectorized_time:>10.3f}s {current_time / vectorized_time:>7.1f}x  {'✓' if match else '✗'}")
+    
+    return all_match
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark vectorized cleaning kernels against the row-wise functions")
+    parser.add_argument('--rows', type=int, default=100_000, help="Sample size (default: 100000)")
+    parser.add_argument('--csv', help="Sample from a real fiscal-year CSV instead of synthetic data")
+    parser.add_argument('--repeat', type=int, default=3, help="Best-of-N timing (default: 3)")
+    args = parser.parse_args()
+    
+    df = load_sample(args.csv, args.rows) if args.csv else make_sample(args.rows)
+    print(f"Benchmarking cleaning on {len(df)} rows\n")
+    
+    if run_benchmark(df, args.repeat):
+        print("\n✓ Vectorized output matches the current functions")
+    else:
+        print("\n✗ Vectorized output differs from the current functions")
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
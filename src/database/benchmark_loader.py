@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+import pandas as pd
+from sqlalchemy import create_engine, text
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import tempfile
+import argparse
+import subprocess
+from contextlib import contextmanager
+from datetime import datetime
+from dotenv import load_dotenv
+from db import connection_params, database_url, copy_dataframe
+from load_data import (detect_encoding, estimate_chunk_size, iter_csv_chunks, clean_dataframe, extract_fiscal_year,
+                       merge_from_staging)
+from partition_archive import partition
+from synthetic_csv import generate_files
+
+# Load environment variables
+load_dotenv()
+
+SCHEMA_SQL_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'create_database.sql')
+DEFAULT_RESULTS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'loader_benchmark.json')
+SCRATCH_DATABASE = 'loader_benchmark'
+
+# Loader stages in pipeline order: parse the CSV, clean types, COPY into
+# staging, then merge with ON CONFLICT (notice_id) DO NOTHING
+STAGES = ['read', 'clean', 'write', 'dedupe']
+
+@contextmanager
+def scratch_database(name=SCRATCH_DATABASE, partitioned=False):
+    """Yield an engine on a throwaway database with the archive schema, dropped afterwards
+    
+    The database is created on the server the supabase_* variables point
+    at, which must be a local or disposable one, never Supabase itself.
+    With partitioned, the archive is partitioned by fiscal_year first.
+    """
+    params = connection_params()
+    if 'supabase' in params['host']:
+        raise SystemExit("Point supabase_url/supabase_port at a local PostgreSQL server to run the benchmark")
+    
+    admin = create_engine(database_url(params), isolation_level='AUTOCOMMIT')
+    with admin.connect() as conn:
+        conn.execute(text(f"DROP DATABASE IF EXISTS {name}"))
+        conn.execute(text(f"CREATE DATABASE {name} ENCODING 'UTF8' TEMPLATE template0"))
+    engine = create_engine(database_url({**params, 'database': name}), pool_size=1, max_overflow=0)
+    try:
+        with open(SCHEMA_SQL_FILE) as f:
+            create_sql = f.read()
+        with engine.begin() as conn:
+            conn.execute(text(create_sql))
+        if partitioned:
+            partition(engine)
+        yield engine
+    finally:
+        engine.dispose()
+        with admin.connect() as conn:
+            conn.execute(text(f"DROP DATABASE IF EXISTS {name}"))
+        admin.dispose()
+
+def run_stages(engine, csv_paths, memory_budget_mb=256, source_rows=0):
+    """Load the files once into an empty archive, timing each loader stage
+    
+    Runs the same read, clean, COPY and merge steps as the loader's COPY
+    path, one file and one staging table at a time. Returns per-stage
+    seconds and rows in/out; source_rows is the number of records written
+    to the files, the read stage's input.
+    """
+    stats = {stage: {'seconds': 0.0, 'rows_in': 0, 'rows_out': 0} for stage in STAGES}
+    stats['read']['rows_in'] = source_rows
+    with engine.begin() as conn:
+        conn.execute(text("TRUNCATE archived_opportunities RESTART IDENTITY"))
+    
+    def timed(stage, func, *args):
+        start = time.perf_counter()
+        result = func(*args)
+        stats[stage]['seconds'] += time.perf_counter() - start
+        return result
+    
+    for csv_file_path in csv_paths:
+        fiscal_year = extract_fiscal_year(os.path.basename(csv_file_path))
+        encoding, encoding_errors = timed('read', detect_encoding, csv_file_path)
+        chunk_size = timed('read', estimate_chunk_size, csv_file_path, encoding, memory_budget_mb, 1000, 1000, encoding_errors)
+        chunks = iter_csv_chunks(csv_file_path, encoding, chunk_size, encoding_errors)
+        staging_table = 'staging_loader_benchmark'
+        columns = None
+        staged = 0
+        
+        raw_conn = engine.raw_connection()
+        try:
+            with raw_conn.cursor() as cursor:
+                while True:
+                    chunk = timed('read', next, chunks, None)
+                    if chunk is None:
+                        break
+                    stats['read']['rows_out'] += len(chunk)
+                    stats['clean']['rows_in'] += len(chunk)
+                    chunk = timed('clean', clean_dataframe, chunk, fiscal_year)
+                    stats['clean']['rows_out'] += len(chunk)
+                    
+                    if columns is None:
+                        columns = list(chunk.columns)
+                        column_list = ', '.join(f'"{col}"' for col in columns)
+                        cursor.execute(f"""
+                            CREATE UNLOGGED TABLE {staging_table} AS
+                            SELECT {column_list} FROM archived_opportunities WITH NO DATA
+                        """)
+                    stats['write']['rows_in'] += len(chunk)
+                    timed('write', copy_dataframe, cursor, chunk.reindex(columns=columns), staging_table)
+                    stats['write']['rows_out'] += len(chunk)
+                    staged += len(chunk)
+                
+                if columns is not None:
+                    stats['dedupe']['rows_in'] += staged
+                    stats['dedupe']['rows_out'] += timed('dedupe', merge_from_staging, cursor, staging_table, columns,
+                                                         'archived_opportunities', None, fiscal_year)
+                    cursor.execute(f"DROP TABLE {staging_table}")
+            timed('dedupe', raw_conn.commit)
+        except Exception:
+            raw_conn.rollback()
+            raise
+        finally:
+            raw_conn.close()
+    return stats
+
+def best_of(runs):
+    """Per stage, the fastest of several runs (row counts are identical across runs)"""
+    best = {}
+    for stage in STAGES:
+        fastest = min(runs, key=lambda run: run[stage]['seconds'])[stage]
+        best[stage] = {
+            'seconds': round(fastest['seconds'], 3),
+            'rows_in': fastest['rows_in'],
+            'rows_out': fastest['rows_out'],
+            'rows_per_sec': round(fastest['rows_in'] / fastest['seconds']) if fastest['seconds'] > 0 else None
+        }
+    return best
+
+def git_revision():
+    """Short commit hash of the working tree, suffixed -dirty when tracked files are modified"""
+    try:
+        revision = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], capture_output=True, text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return revision + ('-dirty' if dirty.strip() else '')
+
+def run_benchmark(fiscal_years, rows, seed=0, repeat=3, memory_budget_mb=256, data_dir=None, partitioned=False):
+    """Generate the synthetic files, load them repeat times into a scratch database, and return the results
+    
+    With data_dir the generated files are kept there; otherwise they are
+    written to a temporary directory and removed. The files depend only on
+    the fiscal years, rows and seed, so runs with the same settings load
+    identical bytes. partitioned loads into the fiscal-year partitioned
+    archive instead of the single table.
+    """
+    work_dir = data_dir or tempfile.mkdtemp(prefix='loader_benchmark_')
+    try:
+        start_time = time.time()
+        csv_paths, summaries = generate_files(work_dir, fiscal_years, rows, seed)
+        print(f"  Generated {len(csv_paths)} files, {sum(s['bytes'] for s in summaries) / 1024 / 1024:.0f} MB ({time.time() - start_time:.1f}s)")
+        
+        runs = []
+        with scratch_database(partitioned=partitioned) as engine:
+            with engine.connect() as conn:
+                server_version = conn.execute(text("SHOW server_version")).scalar()
+            for run in range(repeat):
+                runs.append(run_stages(engine, csv_paths, memory_budget_mb, sum(s['rows'] for s in summaries)))
+                total = sum(stats['seconds'] for stats in runs[-1].values())
+                print(f"  Run {run + 1}/{repeat}: {total:.1f}s")
+    finally:
+        if data_dir is None:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    
+    stages = best_of(runs)
+    total_seconds = sum(stats['seconds'] for stats in stages.values())
+    return {
+        'revision': git_revision(),
+        'recorded_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'postgres': server_version,
+        'dataset': {
+            'fiscal_years': list(fiscal_years),
+            'rows_per_file': rows,
+            'seed': seed,
+            'files': summaries
+        },
+        'repeat': repeat,
+        'memory_budget_mb': memory_budget_mb,
+        'partitioned': partitioned,
+        'stages': stages,
+        'total': {
+            'seconds': round(total_seconds, 3),
+            'rows_per_sec': round(stages['read']['rows_in'] / total_seconds) if total_seconds > 0 else None
+        }
+    }
+
+def print_results(results):
+    """Print the per-stage table of a results dict"""
+    print(f"\n{'stage':<8} {'seconds':>9} {'rows in':>10} {'rows out':>10} {'rows/sec':>10}")
+    for stage in STAGES:
+        stats = results['stages'][stage]
+        print(f"{stage:<8} {stats['seconds']:>9.3f} {stats['rows_in']:>10} {stats['rows_out']:>10} {stats['rows_per_sec'] or 0:>10,}")
+    print(f"{'total':<8} {results['total']['seconds']:>9.3f} {'':>10} {'':>10} {results['total']['rows_per_sec'] or 0:>10,}")
+
+def compare_results(old, new, tolerance=0.15):
+    """Print per-stage throughput changes between two results dicts; returns the list of regressions
+    
+    A stage regresses when its rows/sec falls by more than tolerance, or
+    when its row counts change (the loader now keeps or drops different
+    rows from the same input). Runs over different datasets are not
+    comparable and raise ValueError.
+    """
+    if old['dataset'] != new['dataset']:
+        raise ValueError("The results were recorded on different datasets; re-run with the same --fy, --rows and --seed")
+    
+    regressions = []
+    print(f"{'stage':<8} {'old rows/sec':>13} {'new rows/sec':>13} {'change':>8}")
+    for stage in STAGES:
+        before, after = old['stages'][stage], new['stages'][stage]
+        change = after['rows_per_sec'] / before['rows_per_sec'] - 1 if before['rows_per_sec'] and after['rows_per_sec'] else 0.0
+        flag = ''
+        if (before['rows_in'], before['rows_out']) != (after['rows_in'], after['rows_out']):
+            flag = f"✗ rows {before['rows_in']}->{before['rows_out']} became {after['rows_in']}->{after['rows_out']}"
+            regressions.append(stage)
+        elif change < -tolerance:
+            flag = '✗ slower'
+            regressions.append(stage)
+        print(f"{stage:<8} {before['rows_per_sec'] or 0:>13,} {after['rows_per_sec'] or 0:>13,} {change:>+7.1%}  {flag}")
+    print(f"{old.get('revision')} -> {new.get('revision')}")
+    return regressions
+
+def parse_args():
+    """Parse command-line options for the loader benchmark"""
+    parser = argparse.ArgumentParser(description="Benchmark the loader's read, clean, write and dedupe stages on synthetic FY CSVs")
+    commands = parser.add_subparsers(dest='command', required=True)
+    
+    run = commands.add_parser('run', help="Generate synthetic CSVs, load them into a scratch database and record per-stage timings")
+    run.add_argument('--fy', type=int, nargs='+', default=[2015, 2016, 2017], help="Fiscal years to generate (default: 2015 2016 2017)")
+    run.add_argument('--rows', type=int, default=50_000, help="Rows per file (default: 50000)")
+    run.add_argument('--seed', type=int, default=0, help="Generator seed (default: 0)")
+    run.add_argument('--repeat', type=int, default=3, help="Best-of-N timing per stage (default: 3)")
+    run.add_argument('--memory-budget-mb', type=int, default=256, help="Chunk memory budget, as for load_data.py (default: 256)")
+    run.add_argument('--data-dir', help="Keep the generated CSVs in this directory")
+    run.add_argument('--partitioned', action='store_true', help="Load into the archive partitioned by fiscal_year (see partition_archive.py)")
+    run.add_argument('--results', default=DEFAULT_RESULTS_FILE, help="Results file to write (default: loader_benchmark.json)")
+    run.add_argument('--compare', action='store_true', help="Compare with the existing results file before overwriting it (exit 1 on regression)")
+    run.add_argument('--tolerance', type=float, default=0.15, help="Allowed drop in rows/sec per stage for --compare (default: 0.15)")
+    
+    compare = commands.add_parser('compare', help="Compare two results files (exit 1 on regression)")
+    compare.add_argument('old')
+    compare.add_argument('new')
+    compare.add_argument('--tolerance', type=float, default=0.15, help="Allowed drop in rows/sec per stage (default: 0.15)")
+    
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    
+    if args.command == 'compare':
+        with open(args.old) as f:
+            old = json.load(f)
+        with open(args.new) as f:
+            new = json.load(f)
+        if compare_results(old, new, args.tolerance):
+            sys.exit(1)
+        return
+    
+    print(f"Benchmarking the loader on FY {', '.join(map(str, args.fy))}, {args.rows} rows per file...")
+    results = run_benchmark(args.fy, args.rows, args.seed, args.repeat, args.memory_budget_mb, args.data_dir, args.partitioned)
+    print_results(results)
+    
+    regressions = []
+    if args.compare and os.path.exists(args.results):
+        with open(args.results) as f:
+            previous = json.load(f)
+        print()
+        regressions = compare_results(previous, results, args.tolerance)
+    
+    with open(args.results, 'w') as f:
+        json.dump(results, f, indent=2)
+        f.write('\n')
+    print(f"\n✓ Wrote {args.results}")
+    if regressions:
+        print(f"✗ Regressed: {', '.join(regressions)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+from sqlalchemy import text
+import os
+import re
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dotenv import load_dotenv
+from db import get_engine, uses_pgbouncer
+from normalize_schema import SOURCE_TABLE, physical_table
+from partition_archive import is_partitioned, partition_tables, index_definitions, index_definition_on
+
+# Load environment variables
+load_dotenv()
+
+DEFERRED_INDEX_SQL_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'create_deferred_index.sql')
+
+# Date columns that follow load order, offered as BRIN indexes
+BRIN_COLUMNS = ['posted_date', 'archive_date']
+DEFAULT_PAGES_PER_RANGE = 32
+
+# PostgreSQL truncates longer identifiers
+MAX_IDENTIFIER_BYTES = 63
+
+def ensure_deferred_index_table(engine):
+    """Create the deferred_index table if it doesn't exist"""
+    with open(DEFERRED_INDEX_SQL_FILE) as f:
+        create_sql = f.read()
+    with engine.begin() as conn:
+        conn.execute(text(create_sql))
+
+def deferred_indexes(engine, table_name=SOURCE_TABLE):
+    """{index name: CREATE INDEX statement} of the table's dropped indexes awaiting a rebuild"""
+    ensure_deferred_index_table(engine)
+    with engine.connect() as conn:
+        return dict(conn.execute(text("""
+            SELECT index_name, definition FROM deferred_index
+            WHERE table_name = :table_name
+            ORDER BY index_name
+        """), {'table_name': table_name}).fetchall())
+
+def drop_secondary_indexes(engine, table_name=SOURCE_TABLE):
+    """Drop every index that does not back a constraint, recording it in deferred_index first
+    
+    The primary key and unique_notice_id stay, since ON CONFLICT needs the
+    latter to skip duplicates. The definitions are saved in the same
+    transaction as the drop, so an interrupted load can still be followed
+    by `bulk_indexes.py rebuild`. Returns the names of the dropped indexes.
+    """
+    ensure_deferred_index_table(engine)
+    with engine.begin() as conn:
+        indexes = index_definitions(conn, table_name)
+        for name, definition in indexes.items():
+            conn.execute(text("""
+                INSERT INTO deferred_index (index_name, table_name, definition)
+                VALUES (:index_name, :table_name, :definition)
+                ON CONFLICT (index_name) DO NOTHING
+            """), {'index_name': name, 'table_name': table_name, 'definition': definition})
+            conn.execute(text(f"DROP INDEX {name}"))
+    print(f"✓ Dropped {len(indexes)} secondary indexes on {table_name}: {', '.join(indexes) or 'none'}")
+    return list(indexes)
+
+def brin_definition(table_name, column, pages_per_range=DEFAULT_PAGES_PER_RANGE):
+    """CREATE INDEX statement for idx_<column> as a BRIN index
+    
+    A BRIN index stores the min and max of each block range, so it stays a
+    few hundred kB however large the table grows, but it only narrows a
+    scan when rows were loaded roughly in column order.
+    """
+    return f"CREATE INDEX idx_{column} ON {table_name} USING brin ({column}) WITH (pages_per_range = {pages_per_range})"
+
+def column_correlation(engine, table_name, column):
+    """pg_stats correlation of a column with physical row order (-1..1), or None before ANALYZE"""
+    with engine.connect() as conn:
+        return conn.execute(text("""
+            SELECT correlation FROM pg_stats
+            WHERE tablename = :table_name AND attname = :column
+        """), {'table_name': table_name, 'column': column}).scalar()
+
+def build_index(engine, statement, maintenance_work_mem, invalid_index=None):
+    """Run one CREATE INDEX on its own autocommit connection with a raised maintenance_work_mem
+    
+    A failed CREATE INDEX CONCURRENTLY leaves an invalid index behind; when
+    its name is known it is dropped so the next rebuild can retry.
+    """
+    start_time = time.time()
+    with engine.connect() as conn:
+        conn = conn.execution_options(isolation_level='AUTOCOMMIT')
+        conn.execute(text("SET statement_timeout = 0"))
+        conn.execute(text("SET maintenance_work_mem = :memory"), {'memory': maintenance_work_mem})
+        try:
+            conn.execute(text(statement))
+        except Exception:
+            if invalid_index:
+                conn.execute(text(f"DROP INDEX IF EXISTS {invalid_index}"))
+            raise
+    return time.time() - start_time
+
+def partition_index_name(name, partition):
+    """Name of index name's counterpart on a partition: <name>_<partition>"""
+    partition = partition.split('.')[-1].strip('"')
+    return f"{name}_{partition}"[:MAX_IDENTIFIER_BYTES]
+
+def index_jobs(engine, table_name, definitions, concurrently):
+    """(label, statement, invalid index name) for every build needed to restore definitions
+    
+    A partitioned index cannot be built CONCURRENTLY, so with concurrently
+    each partition's index is built on its own as <name>_<partition> and
+    the parent's index, created afterwards, adopts them. Valid indexes that
+    already exist are skipped, so a rebuild after a failure only builds
+    what is missing; an invalid one left by an interrupted CONCURRENTLY
+    build is dropped first.
+    """
+    with engine.connect() as conn:
+        with conn.connection.cursor() as cursor:
+            partitioned = is_partitioned(cursor, table_name)
+        partitions = partition_tables(conn, table_name) if partitioned else []
+        indexes = dict(conn.execute(text("""
+            SELECT c.relname, i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+        """)).fetchall())
+    
+    jobs = []
+    leftovers = []
+    
+    def add(label, statement, index_name):
+        if indexes.get(index_name):
+            return
+        if index_name in indexes:
+            leftovers.append(index_name)
+        # A plain CREATE INDEX that fails leaves nothing behind
+        jobs.append((label, statement, index_name if concurrently else None))
+    
+    for name, definition in definitions.items():
+        if name in indexes and (partitioned or indexes[name]):
+            continue
+        if partitioned and concurrently:
+            for partition in partitions:
+                index_name = partition_index_name(name, partition)
+                add(f"{name} on {partition}", index_definition_on(definition, partition, concurrently=True, index_name=index_name),
+                    index_name)
+        elif concurrently:
+            add(name, re.sub(r'^CREATE (UNIQUE )?INDEX ', r'CREATE \1INDEX CONCURRENTLY ', definition), name)
+        else:
+            add(name, definition.replace(' ON ONLY ', ' ON '), name)
+    
+    if leftovers:
+        with engine.connect() as conn:
+            conn = conn.execution_options(isolation_level='AUTOCOMMIT')
+            for index_name in leftovers:
+                conn.execute(text(f"DROP INDEX IF EXISTS {index_name}"))
+        print(f"  Dropped {len(leftovers)} invalid indexes left by an interrupted build: {', '.join(leftovers)}")
+    return jobs
+
+def rebuild_indexes(engine, table_name=SOURCE_TABLE, workers=2, maintenance_work_mem='512MB', concurrently=True,
+                    brin_dates=False, pages_per_range=DEFAULT_PAGES_PER_RANGE):
+    """Rebuild the table's deferred indexes, several at a time, then ANALYZE it
+    
+    Builds run on `workers` connections. CREATE INDEX CONCURRENTLY lets the
+    table take writes meanwhile, but two concurrent builds on one table
+    wait for each other, so they only overlap across partitions. Without
+    concurrently, plain CREATE INDEX builds of one table overlap but block
+    writes until they finish. With brin_dates, posted_date and
+    archive_date are rebuilt (or added) as BRIN indexes. Returns the
+    number of indexes restored.
+    """
+    if uses_pgbouncer():
+        raise RuntimeError("Index builds need session settings and CONCURRENTLY; connect directly, not through pgbouncer")
+    definitions = deferred_indexes(engine, table_name)
+    if brin_dates:
+        for column in BRIN_COLUMNS:
+            definitions[f"idx_{column}"] = brin_definition(table_name, column, pages_per_range)
+    
+    jobs = index_jobs(engine, table_name, definitions, concurrently)
+    print(f"Rebuilding {len(definitions)} indexes on {table_name} ({len(jobs)} builds, {workers} at a time, "
+          f"maintenance_work_mem {maintenance_work_mem}{', concurrently' if concurrently else ''})...")
+    start_time = time.time()
+    failed = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(build_index, engine, statement, maintenance_work_mem, invalid): label
+                   for label, statement, invalid in jobs}
+        for future in as_completed(futures):
+            try:
+                print(f"  ✓ {futures[future]} ({future.result():.1f}s)")
+            except Exception as e:
+                failed.append(futures[future])
+                print(f"  ✗ {futures[future]}: {str(e)}")
+    if failed:
+        raise RuntimeError(f"{len(failed)} index builds failed; fix the cause and run `bulk_indexes.py rebuild` again")
+    
+    with engine.connect() as conn:
+        existing = {row[0] for row in conn.execute(text("SELECT relname FROM pg_class WHERE relkind IN ('i', 'I')"))}
+    for name, definition in definitions.items():
+        if name not in existing:
+            # Only reached for partitioned tables: adopts the partitions' matching indexes without rebuilding them
+            build_index(engine, definition.replace(' ON ONLY ', ' ON '), maintenance_work_mem)
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM deferred_index WHERE table_name = :table_name"), {'table_name': table_name})
+    
+    with engine.connect() as conn:
+        conn.execution_options(isolation_level='AUTOCOMMIT').execute(text(f"ANALYZE {table_name}"))
+    print(f"✓ Rebuilt {len(definitions)} indexes and analyzed {table_name} ({time.time() - start_time:.1f}s)")
+    return len(definitions)
+
+def convert_to_brin(engine, table_name=SOURCE_TABLE, pages_per_range=DEFAULT_PAGES_PER_RANGE, maintenance_work_mem='512MB'):
+    """Replace the B-tree indexes on posted_date and archive_date with BRIN indexes, without blocking writes
+    
+    Each BRIN index is built CONCURRENTLY under a temporary name, the B-tree
+    it replaces is dropped CONCURRENTLY, and the BRIN index takes its name.
+    Prints each column's correlation with row order, which decides whether
+    the BRIN index can skip anything. Not available on a partitioned table,
+    where the indexes are rebuilt with `rebuild --brin-dates` instead.
+    """
+    with engine.connect() as conn:
+        with conn.connection.cursor() as cursor:
+            if is_partitioned(cursor, table_name):
+                raise RuntimeError(f"{table_name} is partitioned; use load_data.py --bulk --brin-dates or `rebuild --brin-dates`")
+        conn.execution_options(isolation_level='AUTOCOMMIT').execute(text(f"ANALYZE {table_name}"))
+    
+    for column in BRIN_COLUMNS:
+        correlation = column_correlation(engine, table_name, column)
+        brin_name = f"idx_{column}_brin"
+        seconds = build_index(engine, brin_definition(table_name, column, pages_per_range).replace(
+            f"CREATE INDEX idx_{column} ", f"CREATE INDEX CONCURRENTLY {brin_name} "), maintenance_work_mem, brin_name)
+        with engine.connect() as conn:
+            conn = conn.execution_options(isolation_level='AUTOCOMMIT')
+            conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS idx_{column}"))
+            conn.execute(text(f"ALTER INDEX {brin_name} RENAME TO idx_{column}"))
+        print(f"  ✓ idx_{column} is now BRIN ({seconds:.1f}s, correlation {correlation if correlation is None else round(correlation, 2)})")
+
+def report_index_sizes(engine, table_name=SOURCE_TABLE):
+    """Print every index on the table (summed over partitions) with its access method and size"""
+    with engine.connect() as conn:
+        rows = conn.execute(text("""
+            SELECT COALESCE(parent.relname, c.relname) AS index_name, am.amname,
+                   SUM(pg_relation_size(c.oid)) AS bytes
+            FROM pg_index i
+            JOIN pg_class c ON c.oid = i.indexrelid
+            JOIN pg_am am ON am.oid = c.relam
+            LEFT JOIN pg_inherits inh ON inh.inhrelid = c.oid
+            LEFT JOIN pg_class parent ON parent.oid = inh.inhparent
+            WHERE i.indrelid = to_regclass(:table_name)
+               OR i.indrelid IN (SELECT inhrelid FROM pg_inherits WHERE inhparent = to_regclass(:table_name))
+            GROUP BY 1, 2
+            ORDER BY 1
+        """), {'table_name': table_name}).fetchall()
+    for name, method, size in rows:
+        print(f"  {name:<48} {method:<6} {size / 1024 / 1024:>9.1f} MB")
+    print(f"  {'total':<48} {'':<6} {sum(row[2] for row in rows) / 1024 / 1024:>9.1f} MB")
+
+def parse_args():
+    """Parse command-line options for deferred and BRIN index management"""
+    parser = argparse.ArgumentParser(description="Drop, rebuild and convert the secondary indexes of archived_opportunities")
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('drop', help="Drop the secondary indexes, recording them in deferred_index")
+    rebuild = commands.add_parser('rebuild', help="Rebuild the indexes recorded in deferred_index, then ANALYZE")
+    rebuild.add_argument('--workers', type=int, default=2, help="Indexes built at once, one connection each (default: 2)")
+    rebuild.add_argument('--maintenance-work-mem', default='512MB', help="maintenance_work_mem for each build (default: 512MB)")
+    rebuild.add_argument('--no-concurrently', action='store_true', help="Plain CREATE INDEX: faster, but blocks writes until done")
+    rebuild.add_argument('--brin-dates', action='store_true', help="Build posted_date and archive_date as BRIN indexes")
+    brin = commands.add_parser('brin', help="Convert the posted_date and archive_date indexes to BRIN in place")
+    brin.add_argument('--pages-per-range', type=int, default=DEFAULT_PAGES_PER_RANGE,
+                      help=f"Table pages summarized per BRIN entry (default: {DEFAULT_PAGES_PER_RANGE})")
+    commands.add_parser('sizes', help="Index sizes and access methods")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    engine = get_engine(pool_size=getattr(args, 'workers', 1), max_overflow=0, statement_timeout_ms=0, application_name='bulk_indexes')
+    table_name = physical_table(engine)
+    if args.command == 'drop':
+        drop_secondary_indexes(engine, table_name)
+    elif args.command == 'rebuild':
+        rebuild_indexes(engine, table_name, workers=args.workers, maintenance_work_mem=args.maintenance_work_mem,
+                        concurrently=not args.no_concurrently, brin_dates=args.brin_dates)
+    elif args.command == 'brin':
+        convert_to_brin(engine, table_name, pages_per_range=args.pages_per_range)
+    report_index_sizes(engine, table_name)
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+import pandas as pd
+import numpy as np
+import re
+from datetime import timedelta, timezone
+from pandas.tseries.api import guess_datetime_format
+from pandas.api.extensions import take
+
+# Lookup used by clean_boolean_series; mirrors clean_boolean_value in load_data.py
+BOOLEAN_VALUES = {
+    'true': True, 'yes': True, '1': True, 'y': True,
+    'false': False, 'no': False, '0': False, 'n': False
+}
+
+DATE_COLUMNS = ['posted_date', 'archive_date', 'award_date', 'response_deadline']
+
+# Trailing UTC offset such as -05, -0500 or -05:00
+OFFSET_PATTERN = re.compile(r'([+-])(\d{2}):?(\d{2})?$')
+
+def _to_float(value):
+    """Scalar path for values the vectorized conversion rejects; same rules as clean_currency_value"""
+    cleaned = re.sub(r'[$,\s]', '', str(value))
+    try:
+        return float(cleaned)
+    except (ValueError, TypeError):
+        return None
+
+def _to_boolean(value):
+    """Scalar clean_boolean_value, applied once per distinct value"""
+    if pd.isna(value) or value == '':
+        return None
+    return BOOLEAN_VALUES.get(str(value).lower())
+
+def clean_currency_series(series):
+    """Vectorized clean_currency_value: strip '$', ',' and whitespace, convert to float
+    
+    The common case is handled with literal string replaces and
+    astype(float64), which uses the same conversion as float(), so results
+    match the row-wise function bit for bit. Values that still fail to
+    convert (inner whitespace, 'TBD', ...) take the scalar path.
+    """
+    if pd.api.types.is_bool_dtype(series):
+        # float(str(True)) fails in the row-wise function
+        return pd.Series(float('nan'), index=series.index)
+    if pd.api.types.is_numeric_dtype(series):
+        return series.astype('float64')
+    
+    present = series.notna() & (series != '')
+    text = series[present].astype(str)
+    cleaned = text.str.replace('$', '', regex=False).str.replace(',', '', regex=False)
+    
+    try:
+        values = cleaned.astype('float64')
+    except ValueError:
+        rejected = pd.to_numeric(cleaned, errors='coerce').isna().to_numpy()
+        array = np.full(len(cleaned), np.nan)
+        array[~rejected] = cleaned[~rejected].astype('float64').to_numpy()
+        # None from the scalar path becomes NaN in the float64 array
+        array[rejected] = np.array([_to_float(value) for value in text[rejected]], dtype='float64')
+        values = pd.Series(array, index=cleaned.index)
+    
+    return values.reindex(series.index)
+
+def clean_boolean_series(series):
+    """Vectorized clean_boolean_value: map true/yes/1/y and false/no/0/n to booleans
+    
+    The column has a handful of distinct spellings, so each is converted once
+    and the result is mapped back.
+    """
+    lookup = {value: _to_boolean(value) for value in pd.unique(series.dropna())}
+    return series.map(lookup).astype(object).where(series.notna(), None)
+
+def _fixed_offset(offset_text):
+    """datetime.timezone for a '+HH', '+HHMM' or '+HH:MM' suffix, or None if invalid"""
+    match = OFFSET_PATTERN.match(offset_text)
+    if not match:
+        return None
+    sign = -1 if match.group(1) == '-' else 1
+    hours, minutes = int(match.group(2)), int(match.group(3) or 0)
+    if hours > 23 or minutes > 59:
+        return None
+    return timezone(sign * timedelta(hours=hours, minutes=minutes))
+
+def _parse_with_offsets(uniques, date_format):
+    """Parse '%z' timestamps by splitting off the UTC offset
+    
+    pd.to_datetime is slow on offset-suffixed strings and slower still when a
+    column mixes offsets (SAM.gov timestamps switch between -04 and -05 with
+    daylight saving), because it builds one object per value. Parsing the
+    local part as naive datetimes and localizing each distinct offset is an
+    order of magnitude faster and gives the same values: a single offset
+    yields a tz-aware column, mixed offsets an object column of Timestamps.
+    Values whose suffix does not look like an offset go through
+    pd.to_datetime unchanged.
+    """
+    values = pd.Series(uniques, dtype=object)
+    width = len(OFFSET_PATTERN.search(values.iloc[0]).group(0))
+    local = pd.to_datetime(values.str[:-width], format=date_format.replace('%z', ''), errors='coerce')
+    offsets = values.str[-width:]
+    
+    groups = offsets.groupby(offsets, sort=False).indices
+    zones = {offset: _fixed_offset(offset) for offset in groups}
+    if len(groups) == 1 and all(zones.values()):
+        return local.dt.tz_localize(next(iter(zones.values())))
+    
+    parsed = pd.Series(pd.NaT, index=values.index, dtype=object)
+    for offset, positions in groups.items():
+        if zones[offset] is None:
+            parsed.iloc[positions] = pd.to_datetime(values.iloc[positions], format=date_format, errors='coerce').astype(object)
+        else:
+            parsed.iloc[positions] = local.iloc[positions].dt.tz_localize(zones[offset]).astype(object)
+    return parsed
+
+def parse_date_series(series, date_format=None):
+    """Parse a date column with one explicit format, converting each distinct value once
+    
+    With no date_format, the format is guessed once from the first non-null
+    value, the same way pd.to_datetime infers it, and then applied
+    explicitly. Output matches pd.to_datetime(series, errors='coerce').
+    """
+    # Looking at a short head first avoids a full null scan on dense columns
+    first_index = series.iloc[:1000].first_valid_index()
+    if first_index is None:
+        first_index = series.first_valid_index()
+    if first_index is None:
+        return pd.to_datetime(series, errors='coerce')
+    
+    first = series.loc[first_index]
+    if date_format is None and isinstance(first, str):
+        date_format = guess_datetime_format(first)
+    
+    if date_format is None:
+        return pd.to_datetime(series, errors='coerce')
+    
+    if date_format.endswith('%z') and isinstance(first, str) and OFFSET_PATTERN.search(first):
+        # Factorizing hashes each value once; the parsed distinct values are taken back by code
+        codes, uniques = pd.factorize(series)
+        parsed = _parse_with_offsets(uniques, date_format)
+        # A tz-aware column takes as a DatetimeArray, mixed offsets as an object array of Timestamps
+        values = parsed.array if isinstance(parsed.dtype, pd.DatetimeTZDtype) else parsed.to_numpy()
+        return pd.Series(take(values, codes, allow_fill=True, fill_value=pd.NaT), index=series.index, name=series.name)
+    
+    return pd.to_datetime(series, format=date_format, errors='coerce', cache=True)
+
+def clean_types(df, date_formats=None):
+    """Apply the vectorized cleaning kernels to the columns present in df
+    
+    date_formats optionally maps a date column to an explicit strptime format.
+    """
+    date_formats = date_formats or {}
+    
+    if 'award_amount' in df.columns:
+        df['award_amount'] = clean_currency_series(df['award_amount'])
+    if 'active' in df.columns:
+        df['active'] = clean_boolean_series(df['active'])
+    
+    for col in DATE_COLUMNS:
+        if col in df.columns:
+            df[col] = parse_date_series(df[col], date_formats.get(col))
+    
+    return df
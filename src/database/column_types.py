@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+import pandas as pd
+from cleaning import DATE_COLUMNS
+
+# Free text held as Arrow strings: one contiguous buffer per column instead
+# of a Python str object (about 50 bytes of overhead) per value
+TEXT_DTYPE = pd.StringDtype('pyarrow')
+
+# Columns with a few to a few thousand distinct values per file, held as
+# categoricals: one small integer code per row plus the distinct values once
+CATEGORICAL_COLUMNS = [
+    'department_agency', 'cgac', 'sub_tier', 'office', 'type', 'base_type', 'archive_type',
+    'set_aside_code', 'set_aside', 'naics_code', 'pop_state', 'pop_country', 'active',
+    'primary_contact_title', 'secondary_contact_title', 'organization_type', 'state', 'country_code'
+]
+
+# Columns cleaned to a non-text type (see cleaning.clean_types); nullable
+# extension types keep missing values as NA instead of widening to object
+# or float. fiscal_year and department_agency_id are fixed-width ids.
+TYPED_DTYPES = {
+    'award_amount': 'float64',
+    'active': 'boolean',
+    'fiscal_year': 'Int16',
+    'department_agency_id': 'Int32'
+}
+
+def column_dtype(column):
+    """Planned in-memory dtype of a cleaned archive column, or None for the dates
+    
+    Every column the plan does not name is text, as in create_database.sql.
+    """
+    if column in TYPED_DTYPES:
+        return TYPED_DTYPES[column]
+    if column in DATE_COLUMNS:
+        # Left to cleaning.parse_date_series: mixed UTC offsets come back as Timestamp objects
+        return None
+    if column in CATEGORICAL_COLUMNS:
+        return 'category'
+    return TEXT_DTYPE
+
+def read_dtypes(column_mapping):
+    """read_csv dtype argument for the raw CSV columns named in column_mapping (CSV name -> column)
+    
+    Every raw value is text: low-cardinality columns are read straight into
+    categoricals, everything else as str, so the parser never guesses a
+    numeric type and turns a NAICS code into 423450.0 or a CGAC of 097
+    into 97. Arrow conversion happens in apply_dtype_plan, because the
+    parser builds Python strings first either way and converting a
+    finished column is several times cheaper than converting while
+    parsing.
+    """
+    return {csv_name: 'category' if column in CATEGORICAL_COLUMNS else str
+            for csv_name, column in column_mapping.items()}
+
+def apply_dtype_plan(df):
+    """Convert a cleaned DataFrame's columns to their planned dtypes, in place; returns df
+    
+    Columns already in their planned dtype are left alone, so applying the
+    plan again at a later stage is cheap. The dates keep their dtype, and
+    so does a numeric column the plan does not name (such as id), which is
+    not turned into text.
+    """
+    for col in df.columns:
+        dtype = column_dtype(col)
+        if dtype is None or df[col].dtype == dtype:
+            continue
+        text_like = pd.api.types.is_object_dtype(df[col]) or isinstance(df[col].dtype, (pd.StringDtype, pd.CategoricalDtype))
+        if dtype == TEXT_DTYPE and not text_like:
+            continue
+        df[col] = df[col].astype(dtype)
+    return df
\ No newline at end of file
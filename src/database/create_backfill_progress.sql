@@ -0,0 +1,21 @@
+-- Checkpoints for keyset backfills run by backfill.py
+CREATE TABLE IF NOT EXISTS backfill_job (
+    job_name TEXT PRIMARY KEY,
+    table_name TEXT NOT NULL,
+    batch_size INTEGER NOT NULL,
+    min_id BIGINT NOT NULL,
+    max_id BIGINT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'in_progress',
+    started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    completed_at TIMESTAMP
+);
+
+-- One row per committed id range; written in the same transaction as the range's UPDATE
+CREATE TABLE IF NOT EXISTS backfill_range (
+    job_name TEXT NOT NULL REFERENCES backfill_job(job_name) ON DELETE CASCADE,
+    range_start BIGINT NOT NULL,
+    range_end BIGINT NOT NULL,
+    rows_updated BIGINT NOT NULL DEFAULT 0,
+    completed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (job_name, range_start)
+);
\ No newline at end of file
@@ -0,0 +1,7 @@
+-- Secondary indexes dropped by load_data.py --bulk, kept until bulk_indexes.py rebuilds them
+CREATE TABLE IF NOT EXISTS deferred_index (
+    index_name TEXT PRIMARY KEY,
+    table_name TEXT NOT NULL,
+    definition TEXT NOT NULL,
+    dropped_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
\ No newline at end of file
@@ -1,5 +1,5 @@
 -- Create department_agency lookup table
-CREATE TABLE department_agency (
+CREATE TABLE IF NOT EXISTS department_agency (
     id SERIAL PRIMARY KEY,
     agency_name TEXT UNIQUE NOT NULL,
     agency_code TEXT,
@@ -8,11 +8,13 @@ CREATE TABLE department_agency (
 );
 
 -- Create index for faster lookups
-CREATE INDEX idx_department_agency_name ON department_agency(agency_name);
-CREATE INDEX idx_department_agency_code ON department_agency(agency_code);
+CREATE INDEX IF NOT EXISTS idx_department_agency_name ON department_agency(agency_name);
+CREATE INDEX IF NOT EXISTS idx_department_agency_code ON department_agency(agency_code);
 
 -- Add foreign key constraint to archived_opportunities table
--- (Run this after populating the department_agency table)
+-- (backfill.py adds the column, backfills it in keyset ranges, and then
+-- adds the index and foreign key below; load_data.py --agency-ids fills it
+-- at ingest time instead)
 -- ALTER TABLE archived_opportunities 
 -- ADD COLUMN department_agency_id INTEGER,
 -- ADD CONSTRAINT fk_department_agency 
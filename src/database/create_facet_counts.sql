@@ -0,0 +1,13 @@
+-- Contract counts and award totals by agency x NAICS x set-aside x fiscal year x place-of-performance state.
+-- Built by facet_cube.py and kept current by load_data.py from the rows each load inserts.
+CREATE TABLE IF NOT EXISTS facet_counts (
+    department_agency TEXT,
+    naics_code TEXT,
+    set_aside TEXT,
+    fiscal_year INTEGER,
+    pop_state TEXT,
+    contracts BIGINT NOT NULL,
+    awards BIGINT NOT NULL DEFAULT 0,
+    total_award_amount NUMERIC NOT NULL DEFAULT 0,
+    CONSTRAINT unique_facet_counts UNIQUE NULLS NOT DISTINCT (department_agency, naics_code, set_aside, fiscal_year, pop_state)
+);
\ No newline at end of file
@@ -0,0 +1,15 @@
+-- Per-file ingest manifest used by load_data.py --resume
+CREATE TABLE IF NOT EXISTS ingest_manifest (
+    file_name TEXT PRIMARY KEY,
+    content_hash TEXT NOT NULL,
+    size_bytes BIGINT NOT NULL,
+    fiscal_year INTEGER,
+    status TEXT NOT NULL DEFAULT 'in_progress',
+    chunk_size INTEGER,
+    rows_read BIGINT NOT NULL DEFAULT 0,
+    rows_inserted BIGINT NOT NULL DEFAULT 0,
+    last_committed_chunk INTEGER NOT NULL DEFAULT -1,
+    started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    completed_at TIMESTAMP
+);
\ No newline at end of file
@@ -0,0 +1,27 @@
+-- Canonical vendors resolved from awardee spellings by vendors.py
+CREATE TABLE IF NOT EXISTS vendor (
+    id SERIAL PRIMARY KEY,
+    canonical_name TEXT NOT NULL,
+    normalized_name TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Every distinct awardee spelling and the vendor it resolved to; join on archived_opportunities.awardee
+CREATE TABLE IF NOT EXISTS vendor_alias (
+    awardee TEXT PRIMARY KEY,
+    normalized_name TEXT NOT NULL,
+    vendor_id INTEGER NOT NULL REFERENCES vendor(id),
+    contracts BIGINT NOT NULL DEFAULT 0
+);
+
+CREATE INDEX IF NOT EXISTS idx_vendor_alias_vendor_id ON vendor_alias(vendor_id);
+CREATE INDEX IF NOT EXISTS idx_vendor_alias_normalized_name ON vendor_alias(normalized_name);
+
+-- One row per resolution run; incremental runs start after the last run's max_id
+CREATE TABLE IF NOT EXISTS vendor_run (
+    id SERIAL PRIMARY KEY,
+    max_id BIGINT NOT NULL,
+    new_names INTEGER NOT NULL,
+    new_vendors INTEGER NOT NULL,
+    completed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
\ No newline at end of file
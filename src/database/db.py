@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+import pandas as pd
+from psycopg2.extras import execute_values
+from sqlalchemy import create_engine, event, text
+import io
+import os
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Supabase exposes Postgres directly on 5432 and through pgbouncer in
+# transaction mode on 6543
+DIRECT_PORT = '5432'
+PGBOUNCER_PORT = '6543'
+
+# Default per-statement limit; 0 disables it. Bulk loads pass 0 explicitly.
+DEFAULT_STATEMENT_TIMEOUT_MS = int(os.getenv('db_statement_timeout_ms', '300000'))
+
+# Bytes psycopg2 reads from the source per COPY message (its default is 8 KB).
+# It releases the GIL for each send, so small blocks mean thousands of waits
+# to get it back while other threads of the loader are busy.
+COPY_BLOCK_BYTES = 1024 * 1024
+
+_engines = {}
+
+def connection_params():
+    """Supabase connection parameters from environment"""
+    return {
+        'host': os.getenv('supabase_url', 'db.urilshgkjcbwatvkjgda.supabase.co'),
+        'port': os.getenv('supabase_port', DIRECT_PORT),
+        'database': os.getenv('supbase_database', 'postgres'),
+        'user': os.getenv('supbaabase_username', 'postgres'),
+        'password': os.getenv('supabase_pswd')
+    }
+
+def database_url(db_params=None):
+    """SQLAlchemy URL for the given (or environment) connection parameters"""
+    db_params = db_params or connection_params()
+    return f"postgresql://{db_params['user']}:{db_params['password']}@{db_params['host']}:{db_params['port']}/{db_params['database']}"
+
+def uses_pgbouncer(db_params=None):
+    """True when connecting through pgbouncer (port 6543, or supabase_pgbouncer=true)"""
+    db_params = db_params or connection_params()
+    return str(db_params['port']) == PGBOUNCER_PORT or os.getenv('supabase_pgbouncer', '').lower() in ('1', 'true', 'yes')
+
+def get_engine(pool_size=5, max_overflow=5, statement_timeout_ms=None, application_name='gov-contract'):
+    """Shared, pooled engine for the Supabase database
+    
+    Engines are cached per configuration, so every caller in a process reuses
+    the same pool. Connections are pre-pinged on checkout and recycled every
+    30 minutes, which drops ones the server or a NAT closed while idle.
+    
+    Through pgbouncer in transaction mode, session state does not survive a
+    transaction and startup options are rejected, so the statement timeout is
+    applied with SET LOCAL at the start of each transaction instead of as a
+    connection option. Server-side cursors are only used inside a transaction
+    (see stream_query), which transaction mode supports.
+    """
+    if statement_timeout_ms is None:
+        statement_timeout_ms = DEFAULT_STATEMENT_TIMEOUT_MS
+    key = (pool_size, max_overflow, statement_timeout_ms, application_name)
+    if key in _engines:
+        return _engines[key]
+    
+    db_params = connection_params()
+    pgbouncer = uses_pgbouncer(db_params)
+    connect_args = {
+        'application_name': application_name,
+        'connect_timeout': 10,
+        'keepalives': 1,
+        'keepalives_idle': 30,
+        'keepalives_interval': 10,
+        'keepalives_count': 5
+    }
+    if statement_timeout_ms and not pgbouncer:
+        connect_args['options'] = f"-c statement_timeout={int(statement_timeout_ms)}"
+    
+    engine = create_engine(
+        database_url(db_params),
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_pre_ping=True,
+        pool_recycle=1800,
+        pool_use_lifo=True,
+        connect_args=connect_args
+    )
+    
+    if statement_timeout_ms and pgbouncer:
+        @event.listens_for(engine, 'begin')
+        def set_statement_timeout(conn):
+            # Runs on the DBAPI cursor so it does not re-enter SQLAlchemy's begin
+            with conn.connection.cursor() as cursor:
+                cursor.execute(f"SET LOCAL statement_timeout = {int(statement_timeout_ms)}")
+    
+    _engines[key] = engine
+    return engine
+
+def stream_query(engine, query, params=None, batch_size=50000):
+    """Yield DataFrames of at most batch_size rows from a server-side cursor
+    
+    The whole read runs in one transaction, so the named cursor stays valid
+    through pgbouncer, and only one batch is held client-side at a time.
+    """
+    with engine.begin() as conn:
+        result = conn.execution_options(stream_results=True, max_row_buffer=batch_size).execute(
+            text(query) if isinstance(query, str) else query, params or {}
+        )
+        columns = list(result.keys())
+        while True:
+            rows = result.fetchmany(batch_size)
+            if not rows:
+                break
+            yield pd.DataFrame(rows, columns=columns)
+
+def copy_dataframe(cursor, df, table_name, columns=None, chunk_size=50000):
+    """COPY a DataFrame into a table in bounded CSV slices on a DBAPI cursor"""
+    columns = columns or list(df.columns)
+    column_list = ', '.join(f'"{col}"' for col in columns)
+    for start in range(0, len(df), chunk_size):
+        buffer = io.StringIO()
+        df.iloc[start:start + chunk_size].to_csv(buffer, index=False, header=False, columns=columns)
+        buffer.seek(0)
+        cursor.copy_expert(f"COPY {table_name} ({column_list}) FROM STDIN WITH (FORMAT csv)", buffer, size=COPY_BLOCK_BYTES)
+
+def copy_file(cursor, path, table_name, columns):
+    """COPY a headerless UTF-8 CSV file into a table on a DBAPI cursor"""
+    column_list = ', '.join(f'"{col}"' for col in columns)
+    with open(path, encoding='utf-8', newline='') as f:
+        cursor.copy_expert(f"COPY {table_name} ({column_list}) FROM STDIN WITH (FORMAT csv)", f, size=COPY_BLOCK_BYTES)
+
+def insert_rows(conn, query, rows, page_size=1000, fetch=False):
+    """Multi-row INSERT with psycopg2 execute_values on a SQLAlchemy Connection
+    
+    query holds a single VALUES %s placeholder. Returns the RETURNING rows
+    when fetch is true, otherwise the number of rows affected.
+    """
+    rows = list(rows)
+    if fetch:
+        with conn.connection.cursor() as cursor:
+            return execute_values(cursor, query, rows, page_size=page_size, fetch=True)
+    
+    # rowcount only covers the last page execute_values sends, so send one
+    # page per call and add them up
+    affected = 0
+    with conn.connection.cursor() as cursor:
+        for start in range(0, len(rows), page_size):
+            execute_values(cursor, query, rows[start:start + page_size], page_size=page_size)
+            affected += cursor.rowcount
+    return affected
@@ -1,7 +1,10 @@
 #!/usr/bin/env python3
 import pandas as pd
 import os
+import argparse
 from dotenv import load_dotenv
+from load_data import COLUMN_MAPPING
+from parquet_cache import read_archive
 
 # Load environment variables
 load_dotenv()
@@ -104,9 +107,40 @@ def debug_csv_columns():
         print(f"\nDataFrame shape: {df.shape}")
         print(f"Sample data:")
         print(df.head(2))
+    
+    except Exception as e:
+        print(f"Error: {str(e)}")
+
+def debug_cached_columns(cache_dir, fiscal_year=2015):
+    """Debug the columns of the cleaned Parquet archive"""
+    print(f"Testing Parquet cache in {cache_dir}...")
+    
+    # Cached rows are already cleaned and renamed, so only the mapped columns
+    # of one fiscal year are read; a missing column fails the read by name
+    try:
+        df = read_archive(cache_dir, columns=list(COLUMN_MAPPING.values()), fiscal_years=[fiscal_year])
         
+        print("Cached columns:")
+        for i, col in enumerate(df.columns):
+            print(f"  {i+1}: '{col}' ({df[col].dtype})")
+        
+        print(f"\nDataFrame shape: {df.shape}")
+        print(f"Sample data:")
+        print(df.head(2))
+    
     except Exception as e:
         print(f"Error: {str(e)}")
 
 if __name__ == "__main__":
-    debug_csv_columns() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Debug CSV column parsing")
+    parser.add_argument(
+        '--parquet-cache',
+        metavar='DIR',
+        help="Check the cleaned Parquet dataset written by load_data.py --parquet-cache instead of the CSV"
+    )
+    args = parser.parse_args()
+    
+    if args.parquet_cache:
+        debug_cached_columns(args.parquet_cache)
+    else:
+        debug_csv_columns() 
\ No newline at end of file
@@ -1,9 +1,9 @@
 #!/usr/bin/env python3
 import pandas as pd
 import psycopg2
-from sqlalchemy import create_engine, text
-import os
+from sqlalchemy import text
 from dotenv import load_dotenv
+from db import get_engine
 
 # Load environment variables
 load_dotenv()
@@ -11,16 +11,7 @@ load_dotenv()
 def debug_database_data():
     """Debug what's actually in the database"""
     
-    # Database connection
-    db_params = {
-        'host': os.getenv('supabase_url', 'db.urilshgkjcbwatvkjgda.supabase.co'),
-        'port': os.getenv('supabase_port', '6543'),
-        'database': os.getenv('supbase_database', 'postgres'),
-        'user': os.getenv('supbaabase_username', 'postgres'),
-        'password': os.getenv('supabase_pswd')
-    }
-    
-    engine = create_engine(f"postgresql://{db_params['user']}:{db_params['password']}@{db_params['host']}:{db_params['port']}/{db_params['database']}")
+    engine = get_engine(pool_size=1, max_overflow=0, application_name='debug_data')
     
     with engine.connect() as conn:
         # Check total count
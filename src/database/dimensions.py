@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+import pandas as pd
+from sqlalchemy import text
+import threading
+from db import insert_rows
+from column_types import TYPED_DTYPES
+
+class DimensionCache:
+    """In-memory name -> id map for a lookup table such as department_agency
+    
+    The map is read once from the table. Names not seen before are inserted
+    in one batch per chunk and added to the map, so a chunk's ids can be
+    written together with its rows instead of by a later UPDATE. New names
+    commit in their own short transaction before the chunk is written; a
+    failed chunk only leaves an unused lookup row behind, never an id that
+    points nowhere.
+    """
+    
+    def __init__(self, engine, table_name='department_agency', name_column='agency_name', code_column='agency_code'):
+        self.engine = engine
+        self.table_name = table_name
+        self.name_column = name_column
+        self.code_column = code_column
+        self.lock = threading.Lock()
+        self.ids = {}
+        self.load()
+    
+    def load(self):
+        """(Re)read the whole lookup table into the map"""
+        with self.engine.connect() as conn:
+            rows = conn.execute(text(f"SELECT {self.name_column}, id FROM {self.table_name}"))
+            self.ids = {name: id_ for name, id_ in rows}
+        print(f"  Cached {len(self.ids)} {self.table_name} ids")
+    
+    def add_names(self, names, codes=None):
+        """Insert unseen names (with an optional code each) and cache their ids"""
+        codes = codes or {}
+        with self.lock:
+            unseen = [name for name in names if name not in self.ids]
+            if not unseen:
+                return 0
+            with self.engine.begin() as conn:
+                returned = insert_rows(conn, f"""
+                    INSERT INTO {self.table_name} ({self.name_column}, {self.code_column})
+                    VALUES %s
+                    ON CONFLICT ({self.name_column}) DO NOTHING
+                    RETURNING {self.name_column}, id
+                """, [(name, codes.get(name)) for name in unseen], fetch=True)
+                self.ids.update(dict(returned))
+                # Names another loader inserted first come back through a lookup
+                missing = [name for name in unseen if name not in self.ids]
+                if missing:
+                    rows = conn.execute(
+                        text(f"SELECT {self.name_column}, id FROM {self.table_name} WHERE {self.name_column} = ANY(:names)"),
+                        {'names': missing}
+                    )
+                    self.ids.update(dict(rows.fetchall()))
+            return len(returned)
+    
+    def resolve(self, names, codes=None):
+        """Ids for a Series of names as a nullable Int64 Series, inserting unseen names first
+        
+        Names are matched with spaces trimmed, as TRIM() does in the
+        department_agency_id backfill join; blank and null names get a null
+        id. codes is an optional aligned Series (e.g. cgac) whose most common
+        value per new name is stored alongside it.
+        """
+        keys = names.astype('string').str.strip(' ').replace('', pd.NA)
+        unseen = [name for name in keys.dropna().unique() if name not in self.ids]
+        if unseen:
+            new_codes = {}
+            if codes is not None:
+                pairs = pd.DataFrame({'name': keys, 'code': codes}).dropna()
+                pairs = pairs[pairs['name'].isin(unseen)]
+                if len(pairs) > 0:
+                    new_codes = pairs.groupby('name')['code'].agg(lambda values: values.value_counts().index[0]).to_dict()
+            added = self.add_names(unseen, new_codes)
+            if added:
+                print(f"  Added {added} new {self.table_name} rows")
+        return keys.map(self.ids).astype('Int64')
+
+def assign_agency_ids(df, agency_cache):
+    """Set department_agency_id on a cleaned chunk from the agency cache"""
+    if 'department_agency' in df.columns:
+        ids = agency_cache.resolve(df['department_agency'], df.get('cgac'))
+        df['department_agency_id'] = ids.astype(TYPED_DTYPES['department_agency_id'])
+    return df
+
+def insert_new_agencies(cursor, staging_table, agency_lookup='department_agency'):
+    """Add agencies from a staging table that the lookup does not have yet, with their most common CGAC"""
+    cursor.execute(f"""
+        INSERT INTO {agency_lookup} (agency_name, agency_code)
+        SELECT TRIM(department_agency), MODE() WITHIN GROUP (ORDER BY cgac)
+        FROM {staging_table}
+        WHERE TRIM(department_agency) <> ''
+        GROUP BY TRIM(department_agency)
+        ON CONFLICT (agency_name) DO NOTHING
+    """)
+    return cursor.rowcount
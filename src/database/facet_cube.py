@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+import pandas as pd
+from sqlalchemy import text
+import os
+import sys
+import time
+import argparse
+from dotenv import load_dotenv
+from db import get_engine, insert_rows
+
+# Load environment variables
+load_dotenv()
+
+CUBE_SQL_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'create_facet_counts.sql')
+CUBE_TABLE = 'facet_counts'
+
+# Facet name -> archive column, in the cube's column order
+CUBE_DIMENSIONS = {
+    'agency': 'department_agency',
+    'naics': 'naics_code',
+    'set_aside': 'set_aside',
+    'fiscal_year': 'fiscal_year',
+    'state': 'pop_state'
+}
+
+CUBE_COLUMNS = list(CUBE_DIMENSIONS.values())
+
+def cube_exists(cursor):
+    """True once facet_counts has been created; loads only maintain it from then on"""
+    cursor.execute("SELECT to_regclass(%s) IS NOT NULL", (CUBE_TABLE,))
+    return cursor.fetchone()[0]
+
+def upsert_counts_sql(source, expressions=None, amount='award_amount'):
+    """INSERT ... SELECT adding grouped counts and award totals from source onto facet_counts
+    
+    expressions give the cube columns' values in source, in cube column
+    order (by default the columns of the same name), and amount the award
+    amount.
+    """
+    expressions = expressions or CUBE_COLUMNS
+    select_list = ', '.join(f"{expression} AS {column}" for expression, column in zip(expressions, CUBE_COLUMNS))
+    return f"""
+        INSERT INTO {CUBE_TABLE} ({', '.join(CUBE_COLUMNS)}, contracts, awards, total_award_amount)
+        SELECT {select_list}, COUNT(*), COUNT({amount}), COALESCE(SUM({amount}), 0)
+        FROM {source}
+        GROUP BY {', '.join(str(i + 1) for i in range(len(CUBE_COLUMNS)))}
+        ON CONFLICT ON CONSTRAINT unique_facet_counts
+        DO UPDATE SET contracts = {CUBE_TABLE}.contracts + EXCLUDED.contracts,
+                      awards = {CUBE_TABLE}.awards + EXCLUDED.awards,
+                      total_award_amount = {CUBE_TABLE}.total_award_amount + EXCLUDED.total_award_amount
+    """
+
+def insert_counting_facets(cursor, insert_sql, returning=None, expressions=None, joins=''):
+    """Run an INSERT ... SELECT and add the rows it inserted to facet_counts
+    
+    Both happen in one statement, so the counts move with the insert and
+    roll back with it, and rows skipped by ON CONFLICT are never counted.
+    returning lists the inserted columns to read back (the cube columns by
+    default; award_amount is always added); expressions and joins map them
+    onto the cube columns, e.g. dimension keys joined back to their values.
+    Returns the number of rows inserted. Without a facet_counts table this
+    is a plain insert.
+    """
+    if not cube_exists(cursor):
+        cursor.execute(insert_sql)
+        return cursor.rowcount
+    
+    returning = (returning or CUBE_COLUMNS) + ['award_amount']
+    expressions = expressions or [f"i.{column}" for column in CUBE_COLUMNS]
+    cursor.execute(f"""
+        WITH inserted AS (
+            {insert_sql}
+            RETURNING {', '.join(returning)}
+        ), counted AS (
+            {upsert_counts_sql(f'inserted i {joins}', expressions, 'i.award_amount')}
+        )
+        SELECT COUNT(*) FROM inserted
+    """)
+    return cursor.fetchone()[0]
+
+def add_counted_rows(conn, rows):
+    """Add rows of cube column values plus award_amount (e.g. from INSERT ... RETURNING) to facet_counts"""
+    columns = CUBE_COLUMNS + ['award_amount']
+    casts = ['text', 'text', 'text', 'integer', 'text', 'numeric']
+    expressions = [f"v.{column}::{cast}" for column, cast in zip(columns, casts)]
+    source = f"(VALUES %s) AS v({', '.join(columns)})"
+    return insert_rows(conn, upsert_counts_sql(source, expressions[:-1], expressions[-1]), [tuple(row) for row in rows])
+
+def ensure_cube_table(engine):
+    """Create the facet_counts table if it doesn't exist"""
+    with open(CUBE_SQL_FILE) as f:
+        create_sql = f.read()
+    with engine.begin() as conn:
+        conn.execute(text(create_sql))
+
+def rebuild_cube(engine):
+    """Recompute facet_counts from the whole archive
+    
+    The archive is locked against writes for the recompute, so a concurrent
+    load is neither missed nor counted twice.
+    """
+    ensure_cube_table(engine)
+    start_time = time.time()
+    with engine.begin() as conn:
+        conn.execute(text("SET LOCAL statement_timeout = 0"))
+        conn.execute(text("LOCK TABLE archived_opportunities IN SHARE MODE"))
+        conn.execute(text(f"TRUNCATE {CUBE_TABLE}"))
+        with conn.connection.cursor() as cursor:
+            cursor.execute(upsert_counts_sql('archived_opportunities'))
+            cells = cursor.rowcount
+    with engine.connect() as conn:
+        conn.execute(text(f"ANALYZE {CUBE_TABLE}"))
+        conn.commit()
+    print(f"✓ Rebuilt {CUBE_TABLE}: {cells:,} cells ({time.time() - start_time:.1f}s)")
+
+def check_cube(engine, show=10):
+    """Compare facet_counts with a full recompute; returns the differing cells from each side as a DataFrame
+    
+    Runs in one REPEATABLE READ snapshot, so a concurrent load cannot make
+    the two sides disagree.
+    """
+    columns = ', '.join(CUBE_COLUMNS)
+    start_time = time.time()
+    with engine.connect() as conn:
+        conn = conn.execution_options(isolation_level='REPEATABLE READ')
+        with conn.begin():
+            conn.execute(text("SET LOCAL statement_timeout = 0"))
+            # EXCEPT compares NULLs as equal, as the cube's unique constraint does
+            mismatches = pd.read_sql(text(f"""
+                WITH recomputed AS (
+                    SELECT {columns}, COUNT(*) AS contracts, COUNT(award_amount) AS awards,
+                           COALESCE(SUM(award_amount), 0) AS total_award_amount
+                    FROM archived_opportunities
+                    GROUP BY {columns}
+                ), cube AS (
+                    SELECT {columns}, contracts, awards, total_award_amount FROM {CUBE_TABLE}
+                )
+                SELECT 'facet_counts' AS side, * FROM (SELECT * FROM cube EXCEPT SELECT * FROM recomputed) c
+                UNION ALL
+                SELECT 'recomputed' AS side, * FROM (SELECT * FROM recomputed EXCEPT SELECT * FROM cube) r
+                ORDER BY {columns}, side
+            """), conn)
+    elapsed = time.time() - start_time
+    if len(mismatches) == 0:
+        print(f"✓ {CUBE_TABLE} matches a full recompute ({elapsed:.1f}s)")
+    else:
+        print(f"✗ {len(mismatches.drop_duplicates(CUBE_COLUMNS))} {CUBE_TABLE} cells differ from a full recompute ({elapsed:.1f}s)")
+        print(mismatches.head(show).to_string(index=False))
+    return mismatches
+
+def facet_counts(engine, facet, filters=None, limit=20):
+    """Contract counts per value of one facet, narrowed by filters on the others
+    
+    filters maps facet names to a value or a list of values. Reads the
+    pre-aggregated cells only.
+    """
+    column = CUBE_DIMENSIONS[facet]
+    conditions = []
+    params = {'limit': limit}
+    for name, values in (filters or {}).items():
+        values = list(values) if isinstance(values, (list, tuple, set)) else [values]
+        conditions.append(f"{CUBE_DIMENSIONS[name]} = ANY(:{name})")
+        params[name] = values
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    with engine.connect() as conn:
+        return pd.read_sql(text(f"""
+            SELECT {column} AS {facet}, SUM(contracts)::bigint AS contracts
+            FROM {CUBE_TABLE}
+            {where}
+            GROUP BY 1
+            HAVING SUM(contracts) > 0
+            ORDER BY contracts DESC, 1
+            LIMIT :limit
+        """), conn, params=params)
+
+def parse_args():
+    """Parse command-line options for the facet cube"""
+    parser = argparse.ArgumentParser(description="Pre-aggregated facet counts over archived_opportunities")
+    commands = parser.add_subparsers(dest='command', required=True)
+    
+    commands.add_parser('build', help="Create facet_counts and compute it from the whole archive")
+    commands.add_parser('check', help="Compare facet_counts with a full recompute (exit 1 on mismatch)")
+    
+    counts = commands.add_parser('counts', help="Contract counts per value of one facet")
+    counts.add_argument('facet', choices=list(CUBE_DIMENSIONS))
+    counts.add_argument('--agency', nargs='+', help="Only these departments/agencies")
+    counts.add_argument('--naics', nargs='+', help="Only these NAICS codes")
+    counts.add_argument('--set-aside', nargs='+', help="Only these set-asides")
+    counts.add_argument('--fy', type=int, nargs='+', help="Only these fiscal years")
+    counts.add_argument('--state', nargs='+', help="Only these place-of-performance states")
+    counts.add_argument('--limit', type=int, default=20, help="Values to show (default: 20)")
+    
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    
+    if args.command == 'build':
+        engine = get_engine(pool_size=1, max_overflow=0, statement_timeout_ms=0, application_name='facet_cube')
+        rebuild_cube(engine)
+        return
+    if args.command == 'check':
+        engine = get_engine(pool_size=1, max_overflow=0, statement_timeout_ms=0, application_name='facet_cube')
+        if len(check_cube(engine)) > 0:
+            sys.exit(1)
+        return
+    
+    engine = get_engine(pool_size=1, max_overflow=0, application_name='facet_cube')
+    filters = {}
+    for name, values in [('agency', args.agency), ('naics', args.naics), ('set_aside', args.set_aside),
+                         ('fiscal_year', args.fy), ('state', args.state)]:
+        if values:
+            filters[name] = values
+    start_time = time.time()
+    result = facet_counts(engine, args.facet, filters, args.limit)
+    elapsed = time.time() - start_time
+    print(result.to_string(index=False))
+    print(f"\n{len(result)} rows in {elapsed * 1000:.0f} ms")
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
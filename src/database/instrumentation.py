@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+import os
+import sys
+import json
+import time
+import cProfile
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# (path, trace_memory) while recording, None otherwise
+_settings = None
+_output = None
+_output_lock = threading.Lock()
+_started_tracemalloc = False
+_local = threading.local()
+
+# Stages being timed under tracemalloc, each mapped to whether another
+# stage overlapped it. The traced peak is process-wide, so it is only
+# attributed to a stage that ran alone.
+_traced_stages = {}
+_traced_lock = threading.Lock()
+
+def start_recording(path, trace_memory=False):
+    """Start emitting stage metrics as JSON lines, appended to path ('-' for stdout)
+    
+    trace_memory also records the Python heap peak of every stage that no
+    other stage overlaps (not those of a threaded pipeline) with
+    tracemalloc, which slows pandas-heavy stages noticeably; the resident
+    set size is always recorded.
+    """
+    global _settings, _output, _started_tracemalloc
+    stop_recording()
+    _output = sys.stdout if path == '-' else open(path, 'a', buffering=1)
+    _settings = (path, trace_memory)
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        _started_tracemalloc = True
+
+def stop_recording():
+    """Stop recording and close the metrics file"""
+    global _settings, _output, _started_tracemalloc
+    if _output is not None and _output is not sys.stdout:
+        _output.close()
+    if _started_tracemalloc:
+        tracemalloc.stop()
+    _settings, _output, _started_tracemalloc = None, None, False
+
+def recording_settings():
+    """Current (path, trace_memory), or None; pass to init_worker to record from a worker process"""
+    return _settings
+
+def init_worker(settings):
+    """ProcessPoolExecutor initializer: record to the parent's metrics file from a worker process"""
+    if settings is not None:
+        start_recording(*settings)
+
+def rss_mb():
+    """Current resident set size in MB, or None where /proc is not available"""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return pages * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024
+
+def max_rss_mb():
+    """Peak resident set size of this process so far in MB, or None"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes on Linux
+    return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024
+
+def emit(record):
+    """Write one JSON line to the metrics output"""
+    line = json.dumps(record, default=str)
+    with _output_lock:
+        if _output is not None:
+            _output.write(line + '\n')
+            _output.flush()
+
+class StageRows:
+    """Row counts of one stage call; the caller sets rows_out (and rows_in when not known up front)"""
+    
+    def __init__(self, rows_in=None):
+        self.rows_in = rows_in
+        self.rows_out = None
+
+class StageScope:
+    """Stages of one unit of work (a file, a backfill job), aggregated over repeated calls
+    
+    A stage called once per chunk or per range is emitted as one line when
+    the scope closes: calls, seconds summed over calls, wall_seconds from
+    the first call's start to the last call's end (they differ when calls
+    overlap in threads), summed rows, and the memory high-water marks.
+    Safe to add to from several threads.
+    """
+    
+    def __init__(self, name, context=None):
+        self.name = name
+        self.context = context or {}
+        self.stages = {}
+        self.lock = threading.Lock()
+    
+    def add(self, stage_name, start, end, rows, traced_peak):
+        with self.lock:
+            stats = self.stages.setdefault(stage_name, {
+                'calls': 0, 'seconds': 0.0, 'start': start, 'end': end,
+                'rows_in': None, 'rows_out': None, 'traced_peak': None
+            })
+            stats['calls'] += 1
+            stats['seconds'] += end - start
+            stats['start'] = min(stats['start'], start)
+            stats['end'] = max(stats['end'], end)
+            for key, value in [('rows_in', rows.rows_in), ('rows_out', rows.rows_out)]:
+                if value is not None:
+                    stats[key] = (stats[key] or 0) + value
+            if traced_peak is not None:
+                stats['traced_peak'] = max(stats['traced_peak'] or 0, traced_peak)
+    
+    def emit(self):
+        with self.lock:
+            stages = list(self.stages.items())
+            self.stages = {}
+        for stage_name, stats in stages:
+            emit(stage_record(self.name, self.context, stage_name, stats))
+
+def stage_record(scope_name, context, stage_name, stats):
+    """The JSON line for one stage of one scope"""
+    wall_seconds = stats['end'] - stats['start']
+    rows = stats['rows_in'] if stats['rows_in'] is not None else stats['rows_out']
+    record = {
+        'time': datetime.now().isoformat(timespec='milliseconds'),
+        'pid': os.getpid(),
+        'scope': scope_name,
+        **context,
+        'stage': stage_name,
+        'calls': stats['calls'],
+        'seconds': round(stats['seconds'], 4),
+        'wall_seconds': round(wall_seconds, 4),
+        'rows_in': stats['rows_in'],
+        'rows_out': stats['rows_out'],
+        'rows_per_sec': round(rows / wall_seconds) if rows is not None and wall_seconds > 0 else None,
+        'rss_mb': rss_mb(),
+        'max_rss_mb': max_rss_mb()
+    }
+    if stats['traced_peak'] is not None:
+        record['traced_peak_mb'] = stats['traced_peak'] / 1024 / 1024
+    for key in ['rss_mb', 'max_rss_mb', 'traced_peak_mb']:
+        if record.get(key) is not None:
+            record[key] = round(record[key], 1)
+    return record
+
+def current_scope():
+    """Innermost scope opened by this thread, or None"""
+    scopes = getattr(_local, 'scopes', None)
+    return scopes[-1] if scopes else None
+
+@contextmanager
+def recording_scope(name, **context):
+    """Collect the stages run inside the block under name, emitting them when it ends
+    
+    context (e.g. fiscal_year, method) is added to every line. Stages run
+    in other threads join the scope when it is passed to stage()
+    explicitly, or when the thread enters it with in_scope. Yields the
+    StageScope.
+    """
+    scope = StageScope(name, context)
+    try:
+        with in_scope(scope):
+            yield scope
+    finally:
+        if _settings is not None:
+            scope.emit()
+
+@contextmanager
+def in_scope(scope):
+    """Make scope this thread's current scope inside the block, without emitting it
+    
+    For a thread doing part of the work of a scope opened in another
+    thread. A scope of None leaves the current scope as it is.
+    """
+    if scope is None:
+        yield scope
+        return
+    if not hasattr(_local, 'scopes'):
+        _local.scopes = []
+    _local.scopes.append(scope)
+    try:
+        yield scope
+    finally:
+        _local.scopes.pop()
+
+@contextmanager
+def stage(name, rows_in=None, scope=None):
+    """Time one call of a stage, yielding a StageRows for the caller to fill in
+    
+    The call is added to scope, or to this thread's current scope, or
+    emitted on its own line when there is none. Its traced heap peak is
+    left out when another stage (in any thread) overlapped it. Costs next
+    to nothing when not recording.
+    """
+    rows = StageRows(rows_in)
+    if _settings is None:
+        yield rows
+        return
+    
+    trace_memory = _settings[1] and tracemalloc.is_tracing()
+    token = object()
+    if trace_memory:
+        with _traced_lock:
+            overlapped = bool(_traced_stages)
+            for other in _traced_stages:
+                _traced_stages[other] = True
+            if not overlapped:
+                tracemalloc.reset_peak()
+            _traced_stages[token] = overlapped
+    start = time.time()
+    try:
+        yield rows
+    finally:
+        end = time.time()
+        traced_peak = None
+        if trace_memory:
+            with _traced_lock:
+                if not _traced_stages.pop(token):
+                    traced_peak = tracemalloc.get_traced_memory()[1]
+        scope = scope or current_scope()
+        if scope is not None:
+            scope.add(name, start, end, rows, traced_peak)
+        else:
+            single = StageScope(None)
+            single.add(name, start, end, rows, traced_peak)
+            single.emit()
+
+def timed_chunks(chunks, name, scope=None):
+    """Yield from an iterator of DataFrames, recording each pull as a call of stage name
+    
+    Times the work a lazy reader does to produce each chunk, which a stage
+    around the consuming loop body would miss.
+    """
+    iterator = iter(chunks)
+    while True:
+        with stage(name, scope=scope) as rows:
+            chunk = next(iterator, None)
+            rows.rows_out = len(chunk) if chunk is not None else 0
+        if chunk is None:
+            return
+        yield chunk
+
+@contextmanager
+def profiled(path):
+    """Run the block under cProfile and dump the stats to path (no-op when path is None)
+    
+    Only the calling thread is profiled; view the dump with
+    `python -m pstats path` or snakeviz.
+    """
+    if path is None:
+        yield
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+        print(f"✓ Wrote profile to {path}")
+
+def add_instrumentation_args(parser):
+    """Add the --metrics, --trace-memory and --profile options to an argparse parser"""
+    parser.add_argument('--metrics', metavar='PATH',
+                        help="Append per-stage timing, row counts and memory as JSON lines to PATH ('-' for stdout)")
+    parser.add_argument('--trace-memory', action='store_true',
+                        help="With --metrics, also record each stage's Python heap peak with tracemalloc (slower)")
+    parser.add_argument('--profile', metavar='PATH', help="Write a cProfile dump of the run to PATH")
+
+def start_from_args(args):
+    """Start recording when --metrics was given"""
+    if args.metrics:
+        start_recording(args.metrics, args.trace_memory)
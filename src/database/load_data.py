@@ -1,15 +1,90 @@
 #!/usr/bin/env python3
 import pandas as pd
 import psycopg2
-from sqlalchemy import create_engine, text
+from sqlalchemy import text, column
+from sqlalchemy.dialects import postgresql
 import os
 import re
+import codecs
+import time
+import argparse
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from datetime import datetime
 from dotenv import load_dotenv
+from cleaning import clean_types
+from column_types import read_dtypes, apply_dtype_plan
+from db import get_engine, copy_dataframe, copy_file
+from dimensions import DimensionCache, assign_agency_ids, insert_new_agencies
+from normalize_schema import is_normalized, merge_into_fact, physical_table
+from partition_archive import (is_partitioned, partition_name, partition_merge_clauses, create_reload_table, index_reload_table,
+                               swap_partition)
+from facet_cube import CUBE_COLUMNS, cube_exists, insert_counting_facets, add_counted_rows
+from backfill import ensure_department_agency_table, ensure_department_agency_column
+from bulk_indexes import drop_secondary_indexes, rebuild_indexes
+from bad_lines import Quarantine, open_clean_csv
+from pipeline import threaded, chunks_in_flight
+from manifest import (ensure_manifest_table, plan_resume, record_chunk, complete_manifest_entry,
+                      fingerprint_and_check, start_manifest_entry, file_fingerprint)
+from parquet_cache import FiscalYearWriter, cache_is_current, iter_cached_chunks
+from instrumentation import (StageScope, recording_scope, stage, timed_chunks, recording_settings, init_worker, profiled,
+                             add_instrumentation_args, start_from_args)
 
 # Load environment variables
 load_dotenv()
 
+# Clean column names to match database schema
+COLUMN_MAPPING = {
+    'NoticeId': 'notice_id',
+    'Title': 'title',
+    'Sol#': 'solicitation_number',
+    'Department/Ind.Agency': 'department_agency',
+    'CGAC': 'cgac',
+    'Sub-Tier': 'sub_tier',
+    'FPDS Code': 'fpds_code',
+    'Office': 'office',
+    'AAC Code': 'aac_code',
+    'PostedDate': 'posted_date',
+    'Type': 'type',
+    'BaseType': 'base_type',
+    'ArchiveType': 'archive_type',
+    'ArchiveDate': 'archive_date',
+    'SetASideCode': 'set_aside_code',
+    'SetASide': 'set_aside',
+    'ResponseDeadLine': 'response_deadline',
+    'NaicsCode': 'naics_code',
+    'ClassificationCode': 'classification_code',
+    'PopStreetAddress': 'pop_street_address',
+    'PopCity': 'pop_city',
+    'PopState': 'pop_state',
+    'PopZip': 'pop_zip',
+    'PopCountry': 'pop_country',
+    'Active': 'active',
+    'AwardNumber': 'award_number',
+    'AwardDate': 'award_date',
+    'Award$': 'award_amount',
+    'Awardee': 'awardee',
+    'PrimaryContactTitle': 'primary_contact_title',
+    'PrimaryContactFullname': 'primary_contact_fullname',
+    'PrimaryContactEmail': 'primary_contact_email',
+    'PrimaryContactPhone': 'primary_contact_phone',
+    'PrimaryContactFax': 'primary_contact_fax',
+    'SecondaryContactTitle': 'secondary_contact_title',
+    'SecondaryContactFullname': 'secondary_contact_fullname',
+    'SecondaryContactEmail': 'secondary_contact_email',
+    'SecondaryContactPhone': 'secondary_contact_phone',
+    'SecondaryContactFax': 'secondary_contact_fax',
+    'OrganizationType': 'organization_type',
+    'State': 'state',
+    'City': 'city',
+    'ZipCode': 'zip_code',
+    'CountryCode': 'country_code',
+    'AdditionalInfoLink': 'additional_info_link',
+    'Link': 'link',
+    'Description': 'description'
+}
+
 def clean_currency_value(value):
     """Clean currency values and convert to float"""
     if pd.isna(value) or value == '':
@@ -46,231 +121,1012 @@ def extract_fiscal_year(filename):
     match = re.search(r'FY(\d{4})', filename)
     return int(match.group(1)) if match else None
 
-def load_csv_to_postgres(csv_file_path, engine, fiscal_year):
-    """Load a single CSV file to PostgreSQL"""
-    print(f"Loading {csv_file_path}...")
+def clean_dataframe(df, fiscal_year):
+    """Map CSV columns to the database schema and clean data types"""
+    # Clean column names by removing quotes and extra whitespace
+    df.columns = df.columns.str.strip().str.replace('"', '')
     
-    # Try different encodings to handle malformed CSV files
-    encodings = ['utf-8', 'latin-1', 'cp1252', 'iso-8859-1']
-    df = None
+    # Rename columns
+    df = df.rename(columns=COLUMN_MAPPING)
     
-    for encoding in encodings:
-        try:
-            # Try with more robust CSV parsing options
-            df = pd.read_csv(
-                csv_file_path, 
-                encoding=encoding,
-                quoting=1,  # QUOTE_ALL - handle quoted fields properly
-                escapechar='\\',  # Handle escaped characters
-                on_bad_lines='skip',  # Skip problematic lines
-                engine='python'  # Use Python engine for better error handling
-            )
-            print(f"  Successfully read with {encoding} encoding")
-            break
-        except UnicodeDecodeError:
-            continue
-        except Exception as e:
-            print(f"  Failed with {encoding} encoding: {str(e)}")
-            continue
+    # Add fiscal year column
+    df['fiscal_year'] = fiscal_year
     
-    if df is None:
-        print(f"  Error: Could not read file with any encoding")
-        return
+    # Clean data types - only if columns exist
+    df = clean_types(df)
+    
+    # Categoricals, Arrow strings and nullable types for the rest of the pipeline
+    return apply_dtype_plan(df)
+
+def ensure_unique_notice_id(engine):
+    """Add the unique_notice_id constraint if it doesn't exist"""
+    with engine.connect() as conn:
+        conn.execute(text("""
+            DO $$ 
+            BEGIN 
+                IF NOT EXISTS (
+                    SELECT 1 FROM pg_constraint 
+                    WHERE conname = 'unique_notice_id'
+                ) THEN
+                    ALTER TABLE archived_opportunities ADD CONSTRAINT unique_notice_id UNIQUE (notice_id);
+                END IF;
+            END $$;
+        """))
+        conn.commit()
+
+def decode_as_latin1(error):
+    """Codec error handler: decode undecodable bytes as latin-1 and carry on
+    
+    Registered as 'utf8_latin1_fallback' so a mostly-utf-8 file with a few
+    stray Windows bytes keeps its utf-8 text and only the bad bytes change.
+    """
+    return error.object[error.start:error.end].decode('latin-1'), error.end
+
+codecs.register_error('utf8_latin1_fallback', decode_as_latin1)
+
+def detect_encoding(csv_file_path, sample_size=1024 * 1024):
+    """Sniff the file encoding once from a byte sample
+    
+    Returns (encoding, encoding_errors) for read_csv. A sample that is utf-8,
+    or mostly utf-8 with a few stray bytes, is read as utf-8 with any bad
+    bytes decoded as latin-1 in place. A sample with no valid multi-byte utf-8
+    at all is read as latin-1, which maps every byte and so can never fail.
+    """
+    with open(csv_file_path, 'rb') as f:
+        sample = f.read(sample_size)
+    
+    text = sample.decode('utf-8', errors='replace')
+    invalid = text.count('\ufffd')
+    valid_non_ascii = len(re.findall('[^\x00-\x7f\ufffd]', text))
+    
+    if invalid == 0 or valid_non_ascii > invalid:
+        return 'utf-8', 'utf8_latin1_fallback'
+    return 'latin-1', 'strict'
+
+def csv_read_options(encoding, encoding_errors='strict'):
+    """Common read_csv options for the SAM.gov archive files
     
-    # If the file is very large and has issues, try reading in chunks
-    if len(df) == 0:
-        print(f"  Trying chunked reading approach...")
+    A bad line is an error, not a skip: a file the C parser trips over is
+    read again through bad_lines.open_clean_csv, which hands it only the
+    well-formed records.
+    """
+    return {
+        'encoding': encoding,
+        'encoding_errors': encoding_errors,
+        'quoting': 1,  # QUOTE_ALL - handle quoted fields properly
+        'escapechar': '\\',  # Handle escaped characters
+        'dtype': read_dtypes(COLUMN_MAPPING),  # Text as text, repetitive columns as categoricals
+        'engine': 'c'
+    }
+
+def longer_first_record(df):
+    """True when read_csv took a first record longer than the header as index plus fields, instead of failing"""
+    return not isinstance(df.index, pd.RangeIndex)
+
+def read_csv_directly(csv_file_path, encoding, encoding_errors='strict', nrows=None):
+    """Read a CSV file (or its first nrows rows) with the C parser alone; None if it trips over malformed records"""
+    try:
+        df = pd.read_csv(csv_file_path, nrows=nrows, **csv_read_options(encoding, encoding_errors))
+    except pd.errors.ParserError:
+        return None
+    return None if longer_first_record(df) else df
+
+def read_csv_file(csv_file_path, fiscal_year=None, quarantine_path=None):
+    """Read a whole CSV file with the C parser, malformed records repaired and appended
+    
+    The encoding is sniffed once. Only a file the C parser trips over is
+    read again through the byte scanner: its malformed records are written
+    to quarantine_path (when given) and the ones that can be repaired are
+    added after the file's clean rows.
+    """
+    encoding, encoding_errors = detect_encoding(csv_file_path)
+    df = read_csv_directly(csv_file_path, encoding, encoding_errors)
+    if df is None:
+        quarantine = Quarantine(csv_file_path, fiscal_year, quarantine_path, encoding, encoding_errors)
         try:
-            # Read file in chunks to handle malformed data
-            chunk_size = 10000
-            chunks = []
-            
-            for encoding in encodings:
+            with open_clean_csv(csv_file_path, quarantine) as f:
+                df = pd.read_csv(f, **csv_read_options(encoding, encoding_errors))
+            repaired = quarantine.repaired_frame(df.columns)
+            if len(repaired) > 0:
+                df = pd.concat([df, repaired], ignore_index=True)
+        finally:
+            quarantine.close()
+    print(f"  Successfully read with {encoding} encoding")
+    return df
+
+def estimate_chunk_size(csv_file_path, encoding, memory_budget_mb, sample_rows=1000, min_rows=1000, encoding_errors='strict',
+                        chunks_held=1):
+    """Size read chunks so the chunks in flight stay inside the memory budget
+    
+    Measures the deep in-memory size of a sample of rows, once cleaned into
+    the compact dtype plan they keep until written, and leaves headroom for
+    the raw chunk and the copies made while cleaning and serializing for
+    the write, plus one copy of every other chunk held at the same time
+    (chunks_held counts them all, as in a pipeline).
+    """
+    sample = read_csv_directly(csv_file_path, encoding, encoding_errors, nrows=sample_rows)
+    if sample is None:
+        with open_clean_csv(csv_file_path, Quarantine(csv_file_path, encoding=encoding, encoding_errors=encoding_errors)) as f:
+            sample = pd.read_csv(f, nrows=sample_rows, **csv_read_options(encoding, encoding_errors))
+    if len(sample) == 0:
+        return min_rows
+    
+    bytes_per_row = clean_dataframe(sample, None).memory_usage(index=True, deep=True).sum() / len(sample)
+    working_copies = 3 + chunks_held
+    budget_bytes = memory_budget_mb * 1024 * 1024
+    return max(min_rows, int(budget_bytes / (bytes_per_row * working_copies)))
+
+def iter_csv_chunks(csv_file_path, encoding, chunk_size, encoding_errors='strict', quarantine=None):
+    """Yield raw DataFrame chunks of chunk_size rows, the last one shorter, from a CSV file
+    
+    Chunks come from the C parser reading the file itself. Where it trips
+    over a malformed record (extra fields, or a stray backslash running a
+    record into the next), the records after the rows already read come
+    through the byte scanner instead: malformed records go to quarantine
+    (a bad_lines.Quarantine owned by the caller, or a throwaway one), and
+    the ones it repairs are added after the last of them. A file without
+    them is never scanned. A quote inside a field that keeps the record
+    whole is read leniently by the C parser, as before.
+    
+    Chunk i holds rows i * chunk_size up to (i + 1) * chunk_size, as
+    parquet_cache.iter_cached_chunks gives them back, so a resume
+    checkpoint means the same rows on either path.
+    """
+    owned = quarantine is None
+    if owned:
+        quarantine = Quarantine(csv_file_path, encoding=encoding, encoding_errors=encoding_errors)
+    options = csv_read_options(encoding, encoding_errors)
+    try:
+        last = None
+        rows_read = 0
+        malformed = False
+        with pd.read_csv(csv_file_path, chunksize=chunk_size, **options) as reader:
+            while True:
                 try:
-                    chunk_reader = pd.read_csv(
-                        csv_file_path,
-                        encoding=encoding,
-                        quoting=1,
-                        escapechar='\\',
-                        on_bad_lines='skip',
-                        engine='python',
-                        chunksize=chunk_size
-                    )
-                    
-                    for chunk in chunk_reader:
-                        if len(chunk) > 0:
-                            chunks.append(chunk)
-                    
-                    if chunks:
-                        df = pd.concat(chunks, ignore_index=True)
-                        print(f"  Successfully read {len(df)} rows using chunked approach with {encoding} encoding")
-                        break
-                        
-                except Exception as e:
-                    print(f"  Chunked approach failed with {encoding} encoding: {str(e)}")
-                    continue
-            
-            if df is None or len(df) == 0:
-                print(f"  Error: Could not read file even with chunked approach")
-                return
-                
-        except Exception as e:
-            print(f"  Error with chunked reading: {str(e)}")
+                    chunk = next(reader, None)
+                except pd.errors.ParserError:
+                    malformed = True
+                    break
+                if chunk is None:
+                    break
+                if rows_read == 0 and longer_first_record(chunk):
+                    malformed = True
+                    break
+                # Held back one chunk, so the repaired rows can fill up the last one
+                if last is not None and len(last) > 0:
+                    yield last
+                last = chunk
+                rows_read += len(chunk)
+        if not malformed:
+            if last is not None:
+                yield last
             return
+        
+        print(f"  {os.path.basename(csv_file_path)}: malformed records after row {rows_read}, scanning the rest")
+        with open_clean_csv(csv_file_path, quarantine, skip_records=rows_read) as f:
+            for chunk in pd.read_csv(f, chunksize=chunk_size, **options):
+                if last is not None and len(last) > 0:
+                    yield last
+                last = chunk
+            repaired = quarantine.repaired_frame(f.raw.columns)
+        if last is None:
+            tail = repaired
+        elif len(repaired) > 0:
+            tail = pd.concat([last, repaired], ignore_index=True)
+        else:
+            tail = last
+        for start in range(0, len(tail), chunk_size):
+            yield tail.iloc[start:start + chunk_size]
+    finally:
+        if owned:
+            quarantine.close()
+
+def iter_clean_chunks(chunks, fiscal_year):
+    """Yield cleaned chunks"""
+    for chunk in chunks:
+        yield clean_dataframe(chunk, fiscal_year)
+
+def iter_source_chunks(csv_file_path, fiscal_year, encoding, encoding_errors, chunk_size,
+                       start_chunk=0, cache_dir=None, content_hash=None, quarantine=None, queue_depth=0):
+    """Yield (chunk_index, cleaned chunk) for a file, from the Parquet cache when possible
     
-    # Clean column names by removing quotes and extra whitespace
-    df.columns = df.columns.str.strip().str.replace('"', '')
+    If cache_dir holds a partition built from this exact content, cleaned
+    rows are read back from it and the CSV is not parsed. Otherwise the CSV
+    is parsed and cleaned, and with a cache_dir every chunk is also written
+    to a new partition, including chunks before start_chunk, which are not
+    yielded. Malformed records met while parsing go to quarantine.
     
-    # Clean column names to match database schema
-    column_mapping = {
-        'NoticeId': 'notice_id',
-        'Title': 'title',
-        'Sol#': 'solicitation_number',
-        'Department/Ind.Agency': 'department_agency',
-        'CGAC': 'cgac',
-        'Sub-Tier': 'sub_tier',
-        'FPDS Code': 'fpds_code',
-        'Office': 'office',
-        'AAC Code': 'aac_code',
-        'PostedDate': 'posted_date',
-        'Type': 'type',
-        'BaseType': 'base_type',
-        'ArchiveType': 'archive_type',
-        'ArchiveDate': 'archive_date',
-        'SetASideCode': 'set_aside_code',
-        'SetASide': 'set_aside',
-        'ResponseDeadLine': 'response_deadline',
-        'NaicsCode': 'naics_code',
-        'ClassificationCode': 'classification_code',
-        'PopStreetAddress': 'pop_street_address',
-        'PopCity': 'pop_city',
-        'PopState': 'pop_state',
-        'PopZip': 'pop_zip',
-        'PopCountry': 'pop_country',
-        'Active': 'active',
-        'AwardNumber': 'award_number',
-        'AwardDate': 'award_date',
-        'Award$': 'award_amount',
-        'Awardee': 'awardee',
-        'PrimaryContactTitle': 'primary_contact_title',
-        'PrimaryContactFullname': 'primary_contact_fullname',
-        'PrimaryContactEmail': 'primary_contact_email',
-        'PrimaryContactPhone': 'primary_contact_phone',
-        'PrimaryContactFax': 'primary_contact_fax',
-        'SecondaryContactTitle': 'secondary_contact_title',
-        'SecondaryContactFullname': 'secondary_contact_fullname',
-        'SecondaryContactEmail': 'secondary_contact_email',
-        'SecondaryContactPhone': 'secondary_contact_phone',
-        'SecondaryContactFax': 'secondary_contact_fax',
-        'OrganizationType': 'organization_type',
-        'State': 'state',
-        'City': 'city',
-        'ZipCode': 'zip_code',
-        'CountryCode': 'country_code',
-        'AdditionalInfoLink': 'additional_info_link',
-        'Link': 'link',
-        'Description': 'description'
-    }
+    With queue_depth > 0, reading runs in a thread of its own up to
+    queue_depth chunks ahead of cleaning (see pipeline.threaded). The reader
+    is closed on the way out, so an error or an early stop here ends it too.
+    """
+    def read_ahead(chunks):
+        return threaded(chunks, 'read', queue_depth) if queue_depth > 0 else chunks
     
-    # Rename columns
-    df = df.rename(columns=column_mapping)
+    if cache_dir and cache_is_current(cache_dir, fiscal_year, content_hash):
+        print(f"  Reading cleaned rows from Parquet cache")
+        cached_chunks = read_ahead(timed_chunks(iter_cached_chunks(cache_dir, fiscal_year, chunk_size), 'cache_read'))
+        try:
+            for chunk_index, chunk in enumerate(cached_chunks):
+                if chunk_index >= start_chunk:
+                    yield chunk_index, chunk
+        finally:
+            cached_chunks.close()
+        return
     
-    # Add fiscal year column
-    df['fiscal_year'] = fiscal_year
+    cache_writer = FiscalYearWriter(cache_dir, fiscal_year, content_hash) if cache_dir else None
+    raw_chunks = read_ahead(timed_chunks(iter_csv_chunks(csv_file_path, encoding, chunk_size, encoding_errors, quarantine), 'read'))
+    try:
+        for chunk_index, chunk in enumerate(raw_chunks):
+            # Chunks before the checkpoint are parsed to keep boundaries aligned
+            # but are only cleaned when the cache needs them
+            if chunk_index < start_chunk and cache_writer is None:
+                continue
+            with stage('clean', rows_in=len(chunk)) as rows:
+                chunk = clean_dataframe(chunk, fiscal_year)
+                rows.rows_out = len(chunk)
+            if cache_writer is not None:
+                with stage('cache_write', rows_in=len(chunk)) as rows:
+                    cache_writer.write(chunk)
+                    rows.rows_out = len(chunk)
+            if chunk_index >= start_chunk:
+                yield chunk_index, chunk
+    except BaseException:
+        if cache_writer is not None:
+            cache_writer.abort()
+        raise
+    finally:
+        raw_chunks.close()
+    if cache_writer is not None:
+        cache_writer.close()
+        print(f"  Cached {cache_writer.rows_written} cleaned rows to {cache_writer.path}")
+
+def build_parquet_cache(csv_file_path, fiscal_year, cache_dir, memory_budget_mb=256, quarantine_path=None):
+    """Write a file's cleaned rows to the Parquet cache without touching the database"""
+    content_hash, _ = file_fingerprint(csv_file_path)
+    if cache_is_current(cache_dir, fiscal_year, content_hash):
+        print(f"  {os.path.basename(csv_file_path)}: cache is current")
+        return
     
-    # Clean data types - only if columns exist
-    if 'award_amount' in df.columns:
-        df['award_amount'] = df['award_amount'].apply(clean_currency_value)
-    if 'active' in df.columns:
-        df['active'] = df['active'].apply(clean_boolean_value)
+    with recording_scope(os.path.basename(csv_file_path), fiscal_year=fiscal_year, method='cache_only'):
+        encoding, encoding_errors = detect_encoding(csv_file_path)
+        chunk_size = estimate_chunk_size(csv_file_path, encoding, memory_budget_mb, encoding_errors=encoding_errors)
+        quarantine = Quarantine(csv_file_path, fiscal_year, quarantine_path, encoding, encoding_errors)
+        try:
+            for _ in iter_source_chunks(csv_file_path, fiscal_year, encoding, encoding_errors, chunk_size,
+                                        cache_dir=cache_dir, content_hash=content_hash, quarantine=quarantine):
+                pass
+        finally:
+            quarantine.close()
+
+def load_csv_streaming(csv_file_path, engine, fiscal_year, method='to_sql', memory_budget_mb=256, resume=False, cache_dir=None,
+                       agency_cache=None, quarantine_path=None, queue_depth=0):
+    """Load a single CSV file to PostgreSQL in bounded chunks
     
-    # Convert date columns
-    date_columns = ['posted_date', 'archive_date', 'award_date']
-    for col in date_columns:
-        if col in df.columns:
-            df[col] = pd.to_datetime(df[col], errors='coerce')
+    Read, clean and write run as a generator pipeline, so only one chunk is
+    materialized at a time and peak memory follows memory_budget_mb rather
+    than the size of the file. Duplicates are resolved by the database on
+    each write.
     
-    if 'response_deadline' in df.columns:
-        df['response_deadline'] = pd.to_datetime(df['response_deadline'], errors='coerce')
+    With resume=True the file is tracked in ingest_manifest: an unchanged,
+    fully loaded file is skipped, and a partly loaded one restarts after its
+    last committed chunk. Each chunk and its checkpoint commit together.
     
-    # Load to database with duplicate handling
-    try:
-        # First, try to add the unique constraint if it doesn't exist
-        with engine.connect() as conn:
-            conn.execute(text("""
-                DO $$ 
-                BEGIN 
-                    IF NOT EXISTS (
-                        SELECT 1 FROM pg_constraint 
-                        WHERE conname = 'unique_notice_id'
-                    ) THEN
-                        ALTER TABLE archived_opportunities ADD CONSTRAINT unique_notice_id UNIQUE (notice_id);
-                    END IF;
-                END $$;
-            """))
-            conn.commit()
+    With cache_dir, cleaned rows come from (or are written to) the Parquet
+    cache of the archive, so an unchanged file is only ever parsed once.
+    
+    With agency_cache (a DimensionCache), each chunk's department_agency_id
+    is resolved in memory and written with the rows.
+    
+    Malformed records are appended to quarantine_path (when given); the
+    repaired ones are written after the clean rows, and the quarantine
+    counts are added to the returned stats.
+    
+    With queue_depth > 0, reading, cleaning and writing overlap: the reader
+    and the cleaner each run in a thread, handing chunks on through queues
+    of queue_depth chunks, and this thread resolves agency ids and writes.
+    A slow writer holds the other stages back instead of letting chunks
+    pile up, and an error in any stage stops the others and is raised
+    here. Chunks are sized so the memory budget covers every chunk the
+    pipeline can hold.
+    """
+    print(f"Streaming {csv_file_path}...")
+    file_name = os.path.basename(csv_file_path)
+    with recording_scope(file_name, fiscal_year=fiscal_year, method=method):
+        stats = {'rows_read': 0, 'rows_skipped': 0, 'rows_written': 0, 'rows_malformed': 0, 'rows_recovered': 0, 'rows_lost': 0}
         
-        # Get existing notice_ids to avoid duplicates
-        with engine.connect() as conn:
-            existing_notice_ids = set()
-            result = conn.execute(text("SELECT notice_id FROM archived_opportunities WHERE notice_id IS NOT NULL"))
-            for row in result:
-                existing_notice_ids.add(row[0])
+        with stage('prepare'):
+            encoding, encoding_errors = detect_encoding(csv_file_path)
+            in_flight = chunks_in_flight(queue_depth) if queue_depth > 0 else 1
+            chunk_size = estimate_chunk_size(csv_file_path, encoding, memory_budget_mb, encoding_errors=encoding_errors,
+                                             chunks_held=in_flight)
+            
+            content_hash = None
+            if resume or cache_dir:
+                content_hash, size_bytes = file_fingerprint(csv_file_path)
         
-        # Filter out records that already exist
-        if 'notice_id' in df.columns:
-            original_count = len(df)
-            df = df[~df['notice_id'].isin(existing_notice_ids)]
-            skipped_count = original_count - len(df)
-            if skipped_count > 0:
-                print(f"  Skipped {skipped_count} existing records")
+        start_chunk = 0
+        if resume:
+            action, chunk_size, start_chunk = plan_resume(engine, csv_file_path, fiscal_year, chunk_size,
+                                                          fingerprint=(content_hash, size_bytes))
+            if action == 'skip':
+                print(f"  Unchanged since last complete load, skipping")
+                return stats
+            if start_chunk > 0:
+                print(f"  Resuming after chunk {start_chunk - 1}")
+        print(f"  Using {encoding} encoding, {chunk_size} rows per chunk ({memory_budget_mb} MB budget"
+              + (f", {in_flight} chunks in flight)" if queue_depth > 0 else ")"))
+        
+        ensure_unique_notice_id(engine)
+        
+        write_time = 0.0
         
-        # Load to database
-        if len(df) > 0:
-            df.to_sql('archived_opportunities', engine, if_exists='append', index=False, method='multi', chunksize=1000)
-            print(f"Loaded {len(df)} new records from {csv_file_path}")
+        quarantine = Quarantine(csv_file_path, fiscal_year, quarantine_path, encoding, encoding_errors)
+        chunks = iter_source_chunks(csv_file_path, fiscal_year, encoding, encoding_errors, chunk_size,
+                                    start_chunk=start_chunk, cache_dir=cache_dir, content_hash=content_hash,
+                                    quarantine=quarantine, queue_depth=queue_depth)
+        if queue_depth > 0:
+            chunks = threaded(chunks, 'clean', queue_depth)
+        
+        try:
+            for chunk_index, chunk in chunks:
+                write_start = time.time()
+                if agency_cache is not None:
+                    with stage('agency_ids', rows_in=len(chunk)) as rows:
+                        chunk = assign_agency_ids(chunk, agency_cache)
+                        rows.rows_out = len(chunk)
+                with stage('write', rows_in=len(chunk)) as rows, engine.begin() as conn:
+                    inserted = write_dataframe(chunk, conn, method)
+                    if resume:
+                        record_chunk(conn, file_name, chunk_index, len(chunk), inserted)
+                    rows.rows_out = inserted
+                write_time += time.time() - write_start
+                stats['rows_read'] += len(chunk)
+                stats['rows_written'] += inserted
+                stats['rows_skipped'] += len(chunk) - inserted
+                print(f"  Wrote {inserted} of {len(chunk)} rows in chunk ({stats['rows_written']} so far)")
+        finally:
+            # Stops and joins the pipeline threads before the quarantine is read
+            chunks.close()
+            quarantine.close()
+        stats.update(quarantine.summary())
+        
+        if stats['rows_skipped'] > 0:
+            print(f"  Skipped {stats['rows_skipped']} existing records")
+        
+        if resume:
+            with engine.begin() as conn:
+                complete_manifest_entry(conn, file_name)
+        
+        if stats['rows_written'] > 0:
+            report_write_rate(csv_file_path, stats['rows_written'], write_time, method)
         else:
             print(f"No new records to load from {csv_file_path}")
         
-    except Exception as e:
-        print(f"Error during database load: {str(e)}")
-        # Fallback to regular insert if the constraint method fails
-        df.to_sql('archived_opportunities', engine, if_exists='append', index=False, method='multi', chunksize=1000)
-        print(f"Loaded {len(df)} records using fallback method")
+        return stats
 
-def main():
-    # Supabase database connection parameters from environment
-    db_params = {
-        'host': os.getenv('supabase_url', 'db.urilshgkjcbwatvkjgda.supabase.co'),
-        'port': os.getenv('supabase_port', '5432'),
-        'database': os.getenv('supbase_database', 'postgres'),
-        'user': os.getenv('supbaabase_username', 'postgres'),
-        'password': os.getenv('supabase_pswd')
-    }
+def load_csv_to_postgres(csv_file_path, engine, fiscal_year, method='to_sql', agency_cache=None, quarantine_path=None):
+    """Load a single CSV file to PostgreSQL
+    
+    method selects the write path: 'to_sql' (multi-row INSERT) or 'copy'
+    (COPY FROM STDIN into a staging table, then INSERT ... SELECT). With
+    agency_cache, department_agency_id is resolved before the write.
+    Malformed records are appended to quarantine_path (when given).
+    """
+    print(f"Loading {csv_file_path}...")
     
-    # Create SQLAlchemy engine for Supabase
-    engine = create_engine(f"postgresql://{db_params['user']}:{db_params['password']}@{db_params['host']}:{db_params['port']}/{db_params['database']}")
+    with recording_scope(os.path.basename(csv_file_path), fiscal_year=fiscal_year, method=method):
+        try:
+            with stage('read') as rows:
+                df = read_csv_file(csv_file_path, fiscal_year, quarantine_path)
+                rows.rows_out = len(df)
+        except Exception as e:
+            print(f"  Error: Could not read file: {str(e)}")
+            return
+        
+        if len(df) == 0:
+            print(f"  Error: No rows could be read from file")
+            return
+        
+        with stage('clean', rows_in=len(df)) as rows:
+            df = clean_dataframe(df, fiscal_year)
+            rows.rows_out = len(df)
+        if agency_cache is not None:
+            with stage('agency_ids', rows_in=len(df)) as rows:
+                df = assign_agency_ids(df, agency_cache)
+                rows.rows_out = len(df)
+        
+        # Load to database with duplicate handling
+        try:
+            # First, try to add the unique constraint if it doesn't exist
+            ensure_unique_notice_id(engine)
+            
+            # Load to database; rows whose notice_id already exists are skipped
+            # by ON CONFLICT, and the counts come back from the database
+            write_start = time.time()
+            inserted = 0
+            if len(df) > 0:
+                with stage('write', rows_in=len(df)) as rows, engine.begin() as conn:
+                    inserted = write_dataframe(df, conn, method)
+                    rows.rows_out = inserted
+            skipped_count = len(df) - inserted
+            if skipped_count > 0:
+                print(f"  Skipped {skipped_count} existing records")
+            
+            if inserted > 0:
+                report_write_rate(csv_file_path, inserted, time.time() - write_start, method)
+            else:
+                print(f"No new records to load from {csv_file_path}")
+        
+        except Exception as e:
+            print(f"Error during database load: {str(e)}")
+            if method == 'copy':
+                raise
+            # Fall back to the COPY staging merge, which handles the partitioned
+            # table, the normalized view and facet counting like any other write
+            with engine.begin() as conn:
+                inserted = write_dataframe(df, conn, 'copy')
+            print(f"Loaded {inserted} records using fallback method, skipped {len(df) - inserted} existing")
+
+def write_dataframe(df, conn, method='to_sql'):
+    """Write a cleaned DataFrame to archived_opportunities with the chosen method
     
-    # Directory containing CSV files
-    data_dir = '/Users/daltonallen/Documents/projects/00-active/gov-contract/data/historical-opportnity-database'
+    conn is a SQLAlchemy Connection; the caller owns the transaction, so the
+    write can commit together with other statements. Returns the number of
+    rows actually inserted; rows whose notice_id is already present are
+    skipped by the database.
+    """
+    # The normalized schema's view only accepts writes through the staging
+    # merge, and the partitioned table is written one partition at a time
+    with conn.connection.cursor() as cursor:
+        staged_only = is_normalized(cursor) or is_partitioned(cursor)
+        counting = cube_exists(cursor)
+    if method == 'copy' or staged_only:
+        return copy_dataframe_to_postgres(df, conn)
     
-    # Get all CSV files
-    csv_files = [f for f in os.listdir(data_dir) if f.endswith('.csv')]
-    csv_files.sort()
+    insert_method = insert_counting_facets_method if counting else insert_on_conflict_do_nothing
+    inserted = df.to_sql('archived_opportunities', conn, if_exists='append', index=False, method=insert_method, chunksize=1000)
+    return inserted or 0
+
+def insert_on_conflict_do_nothing(table, conn, keys, data_iter):
+    """pandas to_sql insert method: multi-row INSERT ... ON CONFLICT (notice_id) DO NOTHING"""
+    rows = [dict(zip(keys, row)) for row in data_iter]
+    stmt = postgresql.insert(table.table).values(rows).on_conflict_do_nothing(index_elements=['notice_id'])
+    result = conn.execute(stmt)
+    return result.rowcount
+
+def insert_counting_facets_method(table, conn, keys, data_iter):
+    """pandas to_sql insert method: insert_on_conflict_do_nothing, adding the inserted rows to facet_counts"""
+    rows = [dict(zip(keys, row)) for row in data_iter]
+    stmt = postgresql.insert(table.table).values(rows).on_conflict_do_nothing(index_elements=['notice_id'])
+    returned = conn.execute(stmt.returning(*[column(name) for name in CUBE_COLUMNS + ['award_amount']])).fetchall()
+    if returned:
+        add_counted_rows(conn, returned)
+    return len(returned)
+
+def copy_dataframe_to_postgres(df, conn, table_name='archived_opportunities', chunk_size=50000):
+    """Stream a DataFrame into PostgreSQL with COPY ... FROM STDIN through a staging table
     
-    print(f"Found {len(csv_files)} CSV files to process")
+    Runs on the DBAPI connection behind conn, inside the caller's transaction.
+    Rows are merged from staging with ON CONFLICT (notice_id) DO NOTHING, so
+    duplicates are resolved server-side. Returns the number of rows inserted.
+    """
+    columns = ', '.join(f'"{col}"' for col in df.columns)
+    staging_table = f"staging_{table_name}"
     
-    for csv_file in csv_files:
-        csv_path = os.path.join(data_dir, csv_file)
-        fiscal_year = extract_fiscal_year(csv_file)
+    with conn.connection.cursor() as cursor:
+        # Staging table only carries the columns present in the frame, with no
+        # constraints or defaults, so COPY does not touch the id sequence
+        cursor.execute(f"""
+            DROP TABLE IF EXISTS {staging_table};
+            CREATE TEMP TABLE {staging_table} ON COMMIT DROP AS
+            SELECT {columns} FROM {table_name} WITH NO DATA
+        """)
+        
+        # Serialize in bounded slices so the CSV buffer never holds the whole file
+        copy_dataframe(cursor, df, staging_table, chunk_size=chunk_size)
         
+        # clean_dataframe tags every row with its file's fiscal year
+        fiscal_years = df['fiscal_year'].unique() if 'fiscal_year' in df.columns else []
+        fiscal_year = fiscal_years[0] if len(fiscal_years) == 1 else None
+        inserted = merge_from_staging(cursor, staging_table, list(df.columns), table_name, fiscal_year=fiscal_year)
+        cursor.execute(f"DROP TABLE {staging_table}")
+    return inserted
+
+def merge_from_staging(cursor, staging_table, columns, table_name='archived_opportunities', agency_lookup=None,
+                       fiscal_year=None):
+    """Insert staged rows, letting ON CONFLICT (notice_id) skip existing ones
+    
+    With agency_lookup (the department_agency table), agencies new to the
+    lookup are added first and department_agency_id is joined in by trimmed
+    name as the rows are inserted. Once archived_opportunities has been
+    normalized, rows go to the fact table with their dimension keys; once
+    it is partitioned, they go straight into fiscal_year's partition.
+    """
+    if is_normalized(cursor, table_name):
+        return merge_into_fact(cursor, staging_table, columns, agency_lookup)
+    
+    target, conflict, where = table_name, 'notice_id', ''
+    if is_partitioned(cursor, table_name):
+        target, conflict, where = partition_merge_clauses(cursor, fiscal_year)
+    
+    column_list = ', '.join(f'"{col}"' for col in columns)
+    if agency_lookup is None or 'department_agency_id' in columns:
+        return insert_counting_facets(cursor, f"""
+            INSERT INTO {target} ({column_list})
+            SELECT {column_list} FROM {staging_table} s
+            {where}
+            ON CONFLICT ({conflict}) DO NOTHING
+        """)
+    
+    insert_new_agencies(cursor, staging_table, agency_lookup)
+    return insert_counting_facets(cursor, f"""
+        INSERT INTO {target} ({column_list}, department_agency_id)
+        SELECT s.*, da.id
+        FROM {staging_table} s
+        LEFT JOIN {agency_lookup} da ON da.agency_name = TRIM(s.department_agency)
+        {where}
+        ON CONFLICT ({conflict}) DO NOTHING
+    """)
+
+def prepare_copy_file(csv_file_path, fiscal_year, work_dir, memory_budget_mb=256, cache_dir=None, quarantine_path=None):
+    """Parse and clean one CSV into a COPY-ready file
+    
+    Runs inside a worker process of the parallel loader. The cleaned rows are
+    written to disk chunk by chunk rather than returned, so large frames are
+    never pickled back to the parent process. With cache_dir, cleaned rows
+    are read from (or written to) the Parquet cache. Malformed records are
+    appended to quarantine_path (when given) and counted in the result.
+    """
+    copy_path = os.path.join(work_dir, os.path.basename(csv_file_path) + '.copy.csv')
+    with recording_scope(os.path.basename(csv_file_path), fiscal_year=fiscal_year, method='parallel'):
+        with stage('prepare'):
+            encoding, encoding_errors = detect_encoding(csv_file_path)
+            chunk_size = estimate_chunk_size(csv_file_path, encoding, memory_budget_mb, encoding_errors=encoding_errors)
+            content_hash = file_fingerprint(csv_file_path)[0] if cache_dir else None
+        
+        columns = None
+        rows_read = 0
+        quarantine = Quarantine(csv_file_path, fiscal_year, quarantine_path, encoding, encoding_errors)
         try:
-            load_csv_to_postgres(csv_path, engine, fiscal_year)
-        except Exception as e:
-            print(f"Error loading {csv_file}: {str(e)}")
-            continue
+            with open(copy_path, 'w', encoding='utf-8', newline='') as out:
+                for _, chunk in iter_source_chunks(csv_file_path, fiscal_year, encoding, encoding_errors, chunk_size,
+                                                   cache_dir=cache_dir, content_hash=content_hash, quarantine=quarantine):
+                    if columns is None:
+                        columns = list(chunk.columns)
+                    with stage('serialize', rows_in=len(chunk)) as rows:
+                        chunk.reindex(columns=columns).to_csv(out, index=False, header=False)
+                        rows.rows_out = len(chunk)
+                    rows_read += len(chunk)
+        finally:
+            quarantine.close()
+    
+    return {'copy_path': copy_path, 'columns': columns or [], 'rows_read': rows_read, **quarantine.summary()}
+
+def stage_copy_file(engine, copy_path, columns, staging_table, table_name='archived_opportunities', scope=None):
+    """COPY a prepared file into its own unlogged staging table
+    
+    scope is the file's StageScope when the caller records metrics.
+    """
+    column_list = ', '.join(f'"{col}"' for col in columns)
+    
+    raw_conn = engine.raw_connection()
+    try:
+        with stage('copy', scope=scope) as rows, raw_conn.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {staging_table}")
+            cursor.execute(f"""
+                CREATE UNLOGGED TABLE {staging_table} AS
+                SELECT {column_list} FROM {table_name} WITH NO DATA
+            """)
+            copy_file(cursor, copy_path, staging_table, columns)
+            rows.rows_out = cursor.rowcount
+        raw_conn.commit()
+    except Exception:
+        raw_conn.rollback()
+        raise
+    finally:
+        raw_conn.close()
+
+def merge_staged_file(engine, columns, staging_table, table_name='archived_opportunities', file_name=None, rows_read=0,
+                      agency_lookup=None, fiscal_year=None):
+    """Merge a staging table into the target and drop it in one transaction
+    
+    When file_name is given, the file is marked complete in ingest_manifest
+    in the same transaction. agency_lookup and fiscal_year are passed to
+    merge_from_staging.
+    """
+    with engine.begin() as conn:
+        with conn.connection.cursor() as cursor:
+            inserted = merge_from_staging(cursor, staging_table, columns, table_name, agency_lookup, fiscal_year)
+            cursor.execute(f"DROP TABLE {staging_table}")
+        if file_name is not None:
+            record_chunk(conn, file_name, 0, rows_read, inserted)
+            complete_manifest_entry(conn, file_name)
+    return inserted
+
+def drop_staging_table(engine, staging_table):
+    """Best-effort removal of a staging table left behind by a failed file"""
+    try:
+        with engine.connect() as conn:
+            conn.execute(text(f"DROP TABLE IF EXISTS {staging_table}"))
+            conn.commit()
+    except Exception as e:
+        print(f"  Could not drop {staging_table}: {str(e)}")
+
+def reload_fiscal_year(csv_file_path, engine, fiscal_year, memory_budget_mb=256, agency_lookup=None, keep_old=False,
+                       quarantine_path=None):
+    """Replace one fiscal year of the partitioned archive with the rows of a CSV
+    
+    The file is loaded and indexed into a stand-alone table while the
+    current partition keeps serving queries, then swapped in by DETACH and
+    ATTACH in a short transaction, so a reload never DELETEs the old year
+    row by row. notice_ids stored under other fiscal years are still
+    skipped. Malformed records are appended to quarantine_path (when given).
+    Returns (rows inserted, rows the old partition held).
+    """
+    file_name = os.path.basename(csv_file_path)
+    if fiscal_year is None:
+        raise ValueError(f"No fiscal year (FYnnnn) in the name of {file_name}")
+    staging_table = f"staging_{partition_name(fiscal_year)}"
+    print(f"Reloading FY{fiscal_year} from {file_name}...")
+    
+    with engine.begin() as conn:
+        with conn.connection.cursor() as cursor:
+            if not is_partitioned(cursor):
+                raise RuntimeError("Reloading a fiscal year needs the partitioned archive; run partition_archive.py partition first")
+            reload_table = create_reload_table(cursor, fiscal_year)
     
-    print("Data loading completed!")
+    work_dir = tempfile.mkdtemp(prefix='load_data_')
+    try:
+        prepared = prepare_copy_file(csv_file_path, fiscal_year, work_dir, memory_budget_mb, quarantine_path=quarantine_path)
+        columns = prepared['columns']
+        with recording_scope(file_name, fiscal_year=fiscal_year, method='reload'):
+            inserted = 0
+            if prepared['rows_read'] > 0:
+                stage_copy_file(engine, prepared['copy_path'], columns, staging_table)
+                with stage('merge', rows_in=prepared['rows_read']) as rows, engine.begin() as conn:
+                    with conn.connection.cursor() as cursor:
+                        # Not counted into facet_counts here: the swap recounts the year
+                        _, conflict, where = partition_merge_clauses(cursor, fiscal_year, target=reload_table)
+                        column_list = ', '.join(f'"{col}"' for col in columns)
+                        if agency_lookup is None or 'department_agency_id' in columns:
+                            select_list, join = column_list, ''
+                        else:
+                            insert_new_agencies(cursor, staging_table, agency_lookup)
+                            select_list, join = 's.*, da.id', f"LEFT JOIN {agency_lookup} da ON da.agency_name = TRIM(s.department_agency)"
+                            column_list += ', department_agency_id'
+                        cursor.execute(f"""
+                            INSERT INTO {reload_table} ({column_list})
+                            SELECT {select_list} FROM {staging_table} s
+                            {join}
+                            {where}
+                            ON CONFLICT ({conflict}) DO NOTHING
+                        """)
+                        inserted = rows.rows_out = cursor.rowcount
+                        cursor.execute(f"DROP TABLE {staging_table}")
+            with stage('index'), engine.begin() as conn:
+                with conn.connection.cursor() as cursor:
+                    index_reload_table(cursor, reload_table)
+            swap_start = time.time()
+            with stage('swap', rows_in=inserted), engine.begin() as conn:
+                with conn.connection.cursor() as cursor:
+                    old_rows = swap_partition(cursor, fiscal_year, reload_table, keep_old)
+            swap_seconds = time.time() - swap_start
+            with engine.connect() as conn:
+                conn.execution_options(isolation_level='AUTOCOMMIT').execute(text(f"VACUUM (ANALYZE) {partition_name(fiscal_year)}"))
+    except Exception:
+        drop_staging_table(engine, staging_table)
+        drop_staging_table(engine, reload_table)
+        raise
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    
+    print(f"✓ FY{fiscal_year}: {inserted} rows replace {old_rows} (swap {swap_seconds:.2f}s)")
+    return inserted, old_rows
+
+def load_files_parallel(csv_paths, engine, workers, db_connections, memory_budget_mb=256, resume=False, cache_dir=None,
+                        agency_lookup=None, quarantine_path=None):
+    """Load several CSV files with a process pool for parsing and bounded DB writers
+    
+    Files are parsed and cleaned in `workers` processes. Each prepared file is
+    COPYed into its own staging table by a pool of `db_connections` threads,
+    and staging tables are merged strictly in the order of csv_paths. Because
+    ON CONFLICT keeps whichever row was merged first, the loaded data is the
+    same for any number of workers. With resume=True, files recorded complete
+    in ingest_manifest with unchanged content are skipped, and each merge
+    marks its file complete. With agency_lookup, department_agency_id is
+    resolved during each merge. Workers append malformed records to
+    quarantine_path (when given). Returns one result dict per file, in order.
+    """
+    ensure_unique_notice_id(engine)
+    
+    results = [{'file': os.path.basename(path), 'status': 'pending', 'rows_read': 0,
+                'rows_inserted': 0, 'rows_skipped': 0, 'rows_recovered': 0, 'rows_lost': 0, 'error': None}
+               for path in csv_paths]
+    scopes = [StageScope(result['file'], {'fiscal_year': extract_fiscal_year(result['file']), 'method': 'parallel'})
+              for result in results]
+    staging_tables = [f"staging_archived_opportunities_{i}" for i in range(len(csv_paths))]
+    
+    if resume:
+        for path, result in zip(csv_paths, results):
+            content_hash, size_bytes, entry = fingerprint_and_check(engine, path)
+            if entry and entry['content_hash'] == content_hash and entry['status'] == 'complete':
+                result['status'] = 'unchanged'
+                print(f"  {result['file']}: unchanged since last complete load, skipping")
+            else:
+                # Whole-file merges are atomic, so a partial checkpoint is simply reset
+                start_manifest_entry(engine, result['file'], content_hash, size_bytes,
+                                     extract_fiscal_year(result['file']), None)
+    
+    work_dir = tempfile.mkdtemp(prefix='load_data_')
+    try:
+        # Workers append their parse stages to the same metrics file
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(recording_settings(),)) as parse_pool, \
+                ThreadPoolExecutor(max_workers=db_connections) as write_pool:
+            parse_futures = {
+                parse_pool.submit(prepare_copy_file, path, extract_fiscal_year(os.path.basename(path)), work_dir, memory_budget_mb, cache_dir,
+                                  quarantine_path): i
+                for i, path in enumerate(csv_paths)
+                if results[i]['status'] == 'pending'
+            }
+            prepared = [None] * len(csv_paths)
+            stage_futures = [None] * len(csv_paths)
+            
+            # Hand each file to a writer as soon as its parse finishes
+            for future in as_completed(parse_futures):
+                i = parse_futures[future]
+                try:
+                    prepared[i] = future.result()
+                except Exception as e:
+                    results[i].update(status='failed', error=f"parse: {str(e)}")
+                    print(f"  ✗ {results[i]['file']}: parse failed: {str(e)}")
+                    continue
+                results[i].update(rows_read=prepared[i]['rows_read'], rows_recovered=prepared[i]['rows_recovered'],
+                                  rows_lost=prepared[i]['rows_lost'])
+                print(f"  Parsed {results[i]['file']}: {prepared[i]['rows_read']} rows")
+                if prepared[i]['rows_read'] > 0:
+                    stage_futures[i] = write_pool.submit(
+                        stage_copy_file, engine, prepared[i]['copy_path'], prepared[i]['columns'], staging_tables[i],
+                        scope=scopes[i]
+                    )
+            
+            # Merge in file order so duplicate resolution does not depend on timing
+            for i, result in enumerate(results):
+                if result['status'] in ('failed', 'unchanged'):
+                    continue
+                if stage_futures[i] is None:
+                    if resume:
+                        with engine.begin() as conn:
+                            complete_manifest_entry(conn, result['file'])
+                    result['status'] = 'ok'
+                    continue
+                try:
+                    stage_futures[i].result()
+                    with stage('merge', rows_in=result['rows_read'], scope=scopes[i]) as rows:
+                        inserted = merge_staged_file(
+                            engine, prepared[i]['columns'], staging_tables[i],
+                            file_name=result['file'] if resume else None, rows_read=result['rows_read'],
+                            agency_lookup=agency_lookup, fiscal_year=extract_fiscal_year(result['file'])
+                        )
+                        rows.rows_out = inserted
+                    result.update(status='ok', rows_inserted=inserted, rows_skipped=result['rows_read'] - inserted)
+                    print(f"  ✓ {result['file']}: inserted {inserted}, skipped {result['rows_skipped']}")
+                except Exception as e:
+                    result.update(status='failed', error=f"write: {str(e)}")
+                    print(f"  ✗ {result['file']}: write failed: {str(e)}")
+                    drop_staging_table(engine, staging_tables[i])
+                scopes[i].emit()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    
+    return results
+
+def print_load_summary(results):
+    """Print per-file success/failure for a parallel load"""
+    print("\nLoad summary:")
+    for result in results:
+        if result['status'] == 'ok':
+            repaired = f", recovered {result['rows_recovered']}, lost {result['rows_lost']}" if result['rows_recovered'] or result['rows_lost'] else ''
+            print(f"  ✓ {result['file']}: read {result['rows_read']}, inserted {result['rows_inserted']}, skipped {result['rows_skipped']}{repaired}")
+        elif result['status'] == 'unchanged':
+            print(f"  - {result['file']}: unchanged, skipped")
+        else:
+            print(f"  ✗ {result['file']}: {result['error']}")
+    failed = sum(1 for result in results if result['status'] == 'failed')
+    print(f"{len(results) - failed} succeeded, {failed} failed")
+
+def report_write_rate(csv_file_path, row_count, elapsed, method):
+    """Print write throughput so the to_sql and COPY paths can be compared"""
+    rate = row_count / elapsed if elapsed > 0 else float('inf')
+    print(f"Loaded {row_count} new records from {csv_file_path}")
+    print(f"  Write ({method}): {elapsed:.2f}s, {rate:,.0f} rows/sec")
+
+def parse_args():
+    """Parse command line options for the loader"""
+    parser = argparse.ArgumentParser(description="Load SAM.gov archived opportunity CSVs into PostgreSQL")
+    parser.add_argument(
+        '--method',
+        choices=['to_sql', 'copy'],
+        default='to_sql',
+        help="Write path: multi-row INSERT via to_sql, or COPY FROM STDIN through a staging table"
+    )
+    parser.add_argument(
+        '--stream',
+        action='store_true',
+        help="Read, clean, dedupe and write each file in bounded chunks instead of loading it whole"
+    )
+    parser.add_argument(
+        '--memory-budget-mb',
+        type=int,
+        default=256,
+        help="Approximate memory allowed for one chunk in flight when streaming (default: 256)"
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=1,
+        help="Parse and clean files in N worker processes and load them with COPY (default: 1, sequential)"
+    )
+    parser.add_argument(
+        '--db-connections',
+        type=int,
+        default=2,
+        help="Maximum database connections used for writes when --workers > 1 (default: 2)"
+    )
+    parser.add_argument(
+        '--pipeline',
+        action='store_true',
+        help="Overlap reading, cleaning and writing: each stage runs in its own thread, linked by bounded queues (implies --stream)"
+    )
+    parser.add_argument(
+        '--queue-depth',
+        type=int,
+        default=1,
+        help="With --pipeline, chunks each stage may run ahead of the next one (default: 1)"
+    )
+    parser.add_argument(
+        '--resume',
+        action='store_true',
+        help="Track files in ingest_manifest: skip unchanged loaded files and resume partial ones (implies --stream)"
+    )
+    parser.add_argument(
+        '--agency-ids',
+        action='store_true',
+        help="Resolve department_agency to department_agency_id while loading, adding unseen agencies to department_agency"
+    )
+    parser.add_argument(
+        '--reload',
+        action='store_true',
+        help="Replace each file's fiscal year wholesale by loading it into a new partition and swapping it in (partitioned archive only)"
+    )
+    parser.add_argument(
+        '--keep-old',
+        action='store_true',
+        help="With --reload, keep each replaced partition as <partition>_old instead of dropping it"
+    )
+    parser.add_argument(
+        '--bulk',
+        action='store_true',
+        help="Drop the secondary indexes before loading and rebuild them in parallel afterwards, then ANALYZE"
+    )
+    parser.add_argument(
+        '--brin-dates',
+        action='store_true',
+        help="With --bulk, rebuild the posted_date and archive_date indexes as BRIN indexes"
+    )
+    parser.add_argument(
+        '--maintenance-work-mem',
+        default='512MB',
+        help="With --bulk, maintenance_work_mem for each index build (default: 512MB)"
+    )
+    parser.add_argument(
+        '--quarantine',
+        metavar='PATH',
+        default=None,
+        help="Append malformed CSV records, with byte offsets and repair status, to this JSON-lines file "
+             "(default: off; repaired rows are loaded and counted either way)"
+    )
+    parser.add_argument(
+        '--parquet-cache',
+        metavar='DIR',
+        help="Read cleaned rows from a Parquet dataset partitioned by fiscal_year, writing it on first use (implies --stream)"
+    )
+    parser.add_argument(
+        '--cache-only',
+        action='store_true',
+        help="With --parquet-cache, only build the cache and do not load the database"
+    )
+    add_instrumentation_args(parser)
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    
+    start_from_args(args)
+    
+    with profiled(args.profile):
+        # Directory containing CSV files
+        data_dir = '/Users/daltonallen/Documents/projects/00-active/gov-contract/data/historical-opportnity-database'
+        
+        if args.cache_only:
+            if not args.parquet_cache:
+                raise SystemExit("--cache-only requires --parquet-cache")
+            for csv_file in sorted(f for f in os.listdir(data_dir) if f.endswith('.csv')):
+                build_parquet_cache(os.path.join(data_dir, csv_file), extract_fiscal_year(csv_file), args.parquet_cache, args.memory_budget_mb,
+                                    args.quarantine)
+            print("Parquet cache build completed!")
+            return
+        
+        # Shared pooled engine for Supabase; in parallel mode the pool caps how
+        # many connections the writers can hold at once. Bulk merges can run long,
+        # so the statement timeout is off.
+        pool_size = args.db_connections if args.workers > 1 else 1
+        engine = get_engine(pool_size=pool_size, max_overflow=0, statement_timeout_ms=0, application_name='load_data')
+        
+        # Get all CSV files
+        csv_files = [f for f in os.listdir(data_dir) if f.endswith('.csv')]
+        csv_files.sort()
+        
+        print(f"Found {len(csv_files)} CSV files to process")
+        
+        if args.resume:
+            ensure_manifest_table(engine)
+        
+        agency_cache = None
+        if args.agency_ids:
+            ensure_department_agency_table(engine)
+            ensure_department_agency_column(engine)
+            if args.workers == 1:
+                agency_cache = DimensionCache(engine)
+        
+        if args.reload:
+            for csv_file in csv_files:
+                try:
+                    reload_fiscal_year(os.path.join(data_dir, csv_file), engine, extract_fiscal_year(csv_file), args.memory_budget_mb,
+                                       agency_lookup='department_agency' if args.agency_ids else None, keep_old=args.keep_old,
+                                       quarantine_path=args.quarantine)
+                except Exception as e:
+                    print(f"Error reloading {csv_file}: {str(e)}")
+            print("Data reloading completed!")
+            return
+        
+        # The rebuild runs even when a file fails, so the table is never left without its indexes
+        index_table = physical_table(engine) if args.bulk else None
+        if args.bulk:
+            drop_secondary_indexes(engine, index_table)
+        try:
+            if args.workers > 1:
+                csv_paths = [os.path.join(data_dir, csv_file) for csv_file in csv_files]
+                results = load_files_parallel(csv_paths, engine, args.workers, args.db_connections, args.memory_budget_mb,
+                                              resume=args.resume, cache_dir=args.parquet_cache,
+                                              agency_lookup='department_agency' if args.agency_ids else None,
+                                              quarantine_path=args.quarantine)
+                print_load_summary(results)
+            else:
+                for csv_file in csv_files:
+                    csv_path = os.path.join(data_dir, csv_file)
+                    fiscal_year = extract_fiscal_year(csv_file)
+                    
+                    try:
+                        file_start = time.time()
+                        if args.stream or args.pipeline or args.resume or args.parquet_cache:
+                            load_csv_streaming(csv_path, engine, fiscal_year, method=args.method, memory_budget_mb=args.memory_budget_mb,
+                                               resume=args.resume, cache_dir=args.parquet_cache, agency_cache=agency_cache,
+                                               quarantine_path=args.quarantine, queue_depth=args.queue_depth if args.pipeline else 0)
+                        else:
+                            load_csv_to_postgres(csv_path, engine, fiscal_year, method=args.method, agency_cache=agency_cache,
+                                                 quarantine_path=args.quarantine)
+                        print(f"  Total for {csv_file}: {time.time() - file_start:.2f}s")
+                    except Exception as e:
+                        print(f"Error loading {csv_file}: {str(e)}")
+                        continue
+        finally:
+            if args.bulk:
+                rebuild_indexes(get_engine(pool_size=args.db_connections, max_overflow=0, statement_timeout_ms=0, application_name='load_data_indexes'),
+                                index_table, workers=args.db_connections, maintenance_work_mem=args.maintenance_work_mem,
+                                brin_dates=args.brin_dates)
+        
+        print("Data loading completed!")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+import hashlib
+import os
+from sqlalchemy import text
+
+MANIFEST_SQL_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'create_ingest_manifest.sql')
+
+def ensure_manifest_table(engine):
+    """Create the ingest_manifest table if it doesn't exist"""
+    with open(MANIFEST_SQL_FILE) as f:
+        create_sql = f.read()
+    with engine.begin() as conn:
+        conn.execute(text(create_sql))
+
+def file_fingerprint(csv_file_path, block_size=8 * 1024 * 1024):
+    """Return (sha256 hex digest, size in bytes) of a file, read in blocks"""
+    digest = hashlib.sha256()
+    with open(csv_file_path, 'rb') as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            digest.update(block)
+    return digest.hexdigest(), os.path.getsize(csv_file_path)
+
+def get_manifest_entry(engine, file_name):
+    """Fetch the manifest row for a file as a dict, or None"""
+    with engine.connect() as conn:
+        row = conn.execute(
+            text("SELECT * FROM ingest_manifest WHERE file_name = :file_name"),
+            {'file_name': file_name}
+        ).mappings().fetchone()
+    return dict(row) if row else None
+
+def start_manifest_entry(engine, file_name, content_hash, size_bytes, fiscal_year, chunk_size):
+    """Register a file as in progress, resetting any checkpoint from older content"""
+    with engine.begin() as conn:
+        conn.execute(text("""
+            INSERT INTO ingest_manifest (file_name, content_hash, size_bytes, fiscal_year, chunk_size)
+            VALUES (:file_name, :content_hash, :size_bytes, :fiscal_year, :chunk_size)
+            ON CONFLICT (file_name) DO UPDATE SET
+                content_hash = EXCLUDED.content_hash,
+                size_bytes = EXCLUDED.size_bytes,
+                fiscal_year = EXCLUDED.fiscal_year,
+                chunk_size = EXCLUDED.chunk_size,
+                status = 'in_progress',
+                rows_read = 0,
+                rows_inserted = 0,
+                last_committed_chunk = -1,
+                started_at = CURRENT_TIMESTAMP,
+                updated_at = CURRENT_TIMESTAMP,
+                completed_at = NULL
+        """), {
+            'file_name': file_name,
+            'content_hash': content_hash,
+            'size_bytes': size_bytes,
+            'fiscal_year': fiscal_year,
+            'chunk_size': chunk_size
+        })
+
+def record_chunk(conn, file_name, chunk_index, rows_read, rows_inserted):
+    """Advance a file's checkpoint
+    
+    Call on the same connection, inside the same transaction, as the chunk
+    write so the checkpoint and the rows commit together.
+    """
+    conn.execute(text("""
+        UPDATE ingest_manifest
+        SET last_committed_chunk = :chunk_index,
+            rows_read = rows_read + :rows_read,
+            rows_inserted = rows_inserted + :rows_inserted,
+            updated_at = CURRENT_TIMESTAMP
+        WHERE file_name = :file_name
+    """), {
+        'file_name': file_name,
+        'chunk_index': chunk_index,
+        'rows_read': rows_read,
+        'rows_inserted': rows_inserted
+    })
+
+def complete_manifest_entry(conn, file_name):
+    """Mark a file as fully loaded"""
+    conn.execute(text("""
+        UPDATE ingest_manifest
+        SET status = 'complete',
+            updated_at = CURRENT_TIMESTAMP,
+            completed_at = CURRENT_TIMESTAMP
+        WHERE file_name = :file_name
+    """), {'file_name': file_name})
+
+def fingerprint_and_check(engine, csv_file_path):
+    """Return (content_hash, size_bytes, entry) for a file and its manifest row"""
+    content_hash, size_bytes = file_fingerprint(csv_file_path)
+    return content_hash, size_bytes, get_manifest_entry(engine, os.path.basename(csv_file_path))
+
+def plan_resume(engine, csv_file_path, fiscal_year, chunk_size, fingerprint=None):
+    """Decide how to load a file given its manifest entry
+    
+    Returns (action, chunk_size, start_chunk) where action is 'skip' for a
+    file whose unchanged content was fully loaded, or 'load'. An unchanged,
+    partly loaded file resumes after its last committed chunk with the chunk
+    size it was started with, so chunk boundaries line up. New or changed
+    files start from chunk 0. Pass fingerprint=(content_hash, size_bytes) if
+    the caller already hashed the file.
+    """
+    file_name = os.path.basename(csv_file_path)
+    content_hash, size_bytes = fingerprint or file_fingerprint(csv_file_path)
+    entry = get_manifest_entry(engine, file_name)
+    
+    if entry and entry['content_hash'] == content_hash:
+        if entry['status'] == 'complete':
+            return 'skip', entry['chunk_size'], None
+        if entry['chunk_size']:
+            return 'load', entry['chunk_size'], entry['last_committed_chunk'] + 1
+    
+    start_manifest_entry(engine, file_name, content_hash, size_bytes, fiscal_year, chunk_size)
+    return 'load', chunk_size, 0
\ No newline at end of file
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+import pandas as pd
+from sqlalchemy import text
+import time
+import argparse
+from dotenv import load_dotenv
+from db import get_engine
+from normalize_schema import SOURCE_TABLE, is_normalized, dimension_table, table_columns, create_compatibility_view
+from facet_cube import CUBE_TABLE, cube_exists
+
+# Load environment variables
+load_dotenv()
+
+# NAICS level -> leading digits of the 6-digit code
+NAICS_LEVELS = {
+    'sector': 2,
+    'subsector': 3,
+    'industry_group': 4,
+    'industry': 5,
+    'national_industry': 6
+}
+
+# Levels stored as columns; the national industry is naics_code itself
+LEVEL_COLUMNS = {level: f"naics_{level}" for level in ['sector', 'subsector', 'industry_group', 'industry']}
+
+# Sectors that span several two-digit prefixes
+SECTOR_RANGES = {
+    '31': '31-33', '32': '31-33', '33': '31-33',
+    '44': '44-45', '45': '44-45',
+    '48': '48-49', '49': '48-49'
+}
+
+SECTOR_TITLES = {
+    '11': 'Agriculture, Forestry, Fishing and Hunting',
+    '21': 'Mining, Quarrying, and Oil and Gas Extraction',
+    '22': 'Utilities',
+    '23': 'Construction',
+    '31-33': 'Manufacturing',
+    '42': 'Wholesale Trade',
+    '44-45': 'Retail Trade',
+    '48-49': 'Transportation and Warehousing',
+    '51': 'Information',
+    '52': 'Finance and Insurance',
+    '53': 'Real Estate and Rental and Leasing',
+    '54': 'Professional, Scientific, and Technical Services',
+    '55': 'Management of Companies and Enterprises',
+    '56': 'Administrative and Support and Waste Management and Remediation Services',
+    '61': 'Educational Services',
+    '62': 'Health Care and Social Assistance',
+    '71': 'Arts, Entertainment, and Recreation',
+    '72': 'Accommodation and Food Services',
+    '81': 'Other Services (except Public Administration)',
+    '92': 'Public Administration'
+}
+
+def naics_level_sql(level, column='naics_code'):
+    """SQL expression for a code's prefix at a NAICS level, NULL when the code is too short
+    
+    Sectors are reported by their official range, e.g. '31-33' for any
+    manufacturing code.
+    """
+    prefix = f"substring(btrim({column}) FROM '^[0-9]{{{NAICS_LEVELS[level]}}}')"
+    if level != 'sector':
+        return prefix
+    cases = ' '.join(f"WHEN '{code}' THEN '{sector}'" for code, sector in SECTOR_RANGES.items())
+    return f"CASE {prefix} {cases} ELSE {prefix} END"
+
+def level_of(code):
+    """NAICS level of a code or prefix such as '23', '31-33', '541' or '541512'"""
+    if code in SECTOR_TITLES or code in SECTOR_RANGES.values():
+        return 'sector'
+    for level, digits in NAICS_LEVELS.items():
+        if len(code) == digits and code.isdigit():
+            return level
+    raise ValueError(f"Not a NAICS code or prefix: {code}")
+
+def add_naics_levels(conn, table_name, column='naics_code'):
+    """Add the stored NAICS level columns, and an index on each, to a table
+    
+    They are generated columns, so PostgreSQL fills them in for every row
+    the loader inserts. Adding them rewrites the table once.
+    """
+    conn.execute(text(f"""
+        ALTER TABLE {table_name}
+        {', '.join(f"ADD COLUMN IF NOT EXISTS {name} TEXT GENERATED ALWAYS AS ({naics_level_sql(level, column)}) STORED" for level, name in LEVEL_COLUMNS.items())}
+    """))
+    for name in LEVEL_COLUMNS.values():
+        conn.execute(text(f"CREATE INDEX IF NOT EXISTS idx_{table_name}_{name} ON {table_name}({name})"))
+
+def ensure_naics_levels(engine):
+    """Set up the NAICS level columns on the archive, normalized or not
+    
+    On the normalized schema they go on dim_naics_code, where each code is
+    stored once, and the compatibility view is extended to expose them.
+    """
+    start_time = time.time()
+    with engine.begin() as conn:
+        conn.execute(text("SET LOCAL statement_timeout = 0"))
+        with conn.connection.cursor() as cursor:
+            normalized = is_normalized(cursor)
+        table_name = dimension_table('naics_code') if normalized else SOURCE_TABLE
+        add_naics_levels(conn, table_name, 'value' if normalized else 'naics_code')
+        if normalized:
+            columns = table_columns(conn, SOURCE_TABLE)
+            missing = [(name, 'text') for name in LEVEL_COLUMNS.values() if name not in [column for column, _ in columns]]
+            if missing:
+                create_compatibility_view(conn, columns + missing, replace=True)
+    with engine.connect() as conn:
+        conn.execute(text(f"ANALYZE {table_name}"))
+        conn.commit()
+    print(f"✓ NAICS levels ready on {table_name} ({time.time() - start_time:.1f}s)")
+
+def naics_rollup(engine, level='sector', within=None, fiscal_years=None, by_year=False):
+    """Contracts, awards and award totals at a NAICS level, from facet_counts
+    
+    within narrows the rollup to one code at a coarser level, e.g. '23' or
+    '541'; by_year adds a row per fiscal year. facet_counts holds one row
+    per NAICS code and facet combination, so this sums a few thousand
+    pre-aggregated cells instead of scanning the archive.
+    """
+    with engine.connect() as conn:
+        with conn.connection.cursor() as cursor:
+            if not cube_exists(cursor):
+                raise RuntimeError(f"{CUBE_TABLE} does not exist; run facet_cube.py build first")
+        
+        conditions = [f"{naics_level_sql(level)} IS NOT NULL"]
+        params = {}
+        if within:
+            within = SECTOR_RANGES.get(within, within)
+            conditions.append(f"{naics_level_sql(level_of(within))} = :within")
+            params['within'] = within
+        if fiscal_years:
+            conditions.append("fiscal_year = ANY(:fiscal_years)")
+            params['fiscal_years'] = list(fiscal_years)
+        group_by = ['naics'] + (['fiscal_year'] if by_year else [])
+        df = pd.read_sql(text(f"""
+            SELECT {naics_level_sql(level)} AS naics, {'fiscal_year, ' if by_year else ''}
+                   SUM(contracts)::bigint AS contracts, SUM(awards)::bigint AS awards,
+                   ROUND(SUM(total_award_amount), 2) AS total_award_amount
+            FROM {CUBE_TABLE}
+            WHERE {' AND '.join(conditions)}
+            GROUP BY {', '.join(group_by)}
+            ORDER BY {', '.join(group_by)}
+        """), conn, params=params)
+    if level == 'sector':
+        df.insert(1, 'title', df['naics'].map(SECTOR_TITLES))
+    return df
+
+def parse_args():
+    """Parse command-line options for NAICS levels and rollups"""
+    parser = argparse.ArgumentParser(description="NAICS hierarchy levels and rollups for archived_opportunities")
+    commands = parser.add_subparsers(dest='command', required=True)
+    
+    commands.add_parser('setup', help="Add the naics_sector/subsector/industry_group/industry columns and indexes")
+    
+    rollup = commands.add_parser('rollup', help="Contracts and award totals at one NAICS level (needs facet_counts)")
+    rollup.add_argument('--level', default='sector', choices=list(NAICS_LEVELS), help="Level to group by (default: sector)")
+    rollup.add_argument('--within', help="Only codes under this sector, subsector, industry group or industry")
+    rollup.add_argument('--fy', type=int, nargs='+', help="Only these fiscal years")
+    rollup.add_argument('--by-year', action='store_true', help="One row per code and fiscal year")
+    rollup.add_argument('--csv', help="Also write the result to this CSV file")
+    
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    
+    if args.command == 'setup':
+        engine = get_engine(pool_size=1, max_overflow=0, statement_timeout_ms=0, application_name='naics_setup')
+        ensure_naics_levels(engine)
+        return
+    
+    engine = get_engine(pool_size=1, max_overflow=0, application_name='naics_rollup')
+    start_time = time.time()
+    result = naics_rollup(engine, args.level, args.within, args.fy, args.by_year)
+    elapsed = time.time() - start_time
+    
+    with pd.option_context('display.max_rows', None, 'display.max_columns', None, 'display.width', 200):
+        print(result.to_string(index=False))
+    print(f"\n{len(result)} rows in {elapsed * 1000:.0f} ms")
+    if args.csv:
+        result.to_csv(args.csv, index=False)
+        print(f"✓ Wrote {args.csv}")
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
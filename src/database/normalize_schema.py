@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+from sqlalchemy import text
+import time
+import argparse
+from dotenv import load_dotenv
+from db import get_engine
+from dimensions import insert_new_agencies
+from facet_cube import CUBE_COLUMNS, insert_counting_facets
+
+# Load environment variables
+load_dotenv()
+
+# Low-cardinality text columns moved into dimension tables
+NORMALIZED_COLUMNS = [
+    'department_agency',
+    'sub_tier',
+    'office',
+    'type',
+    'base_type',
+    'set_aside',
+    'naics_code',
+    'classification_code',
+    'organization_type'
+]
+
+SOURCE_TABLE = 'archived_opportunities'
+FACT_TABLE = 'archived_opportunities_fact'
+WIDE_TABLE = 'archived_opportunities_wide'
+
+def dimension_table(column):
+    """Dimension table holding the distinct values of a normalized column"""
+    return f"dim_{column}"
+
+def key_column(column):
+    """Fact table column holding a normalized column's surrogate key"""
+    # _key rather than _id so it does not collide with department_agency_id,
+    # which points at the trimmed department_agency lookup
+    return f"{column}_key"
+
+def relation_kind(cursor, name):
+    """pg_class.relkind of a relation ('r' table, 'v' view, 'p' partitioned), or None"""
+    cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", (name,))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+def is_normalized(cursor, table_name=SOURCE_TABLE):
+    """True when table_name is the compatibility view over the normalized fact table"""
+    return table_name == SOURCE_TABLE and relation_kind(cursor, SOURCE_TABLE) == 'v' and relation_kind(cursor, FACT_TABLE) is not None
+
+def physical_table(engine):
+    """The table that actually stores archive rows: the fact table once normalized"""
+    with engine.connect() as conn:
+        with conn.connection.cursor() as cursor:
+            return FACT_TABLE if is_normalized(cursor) else SOURCE_TABLE
+
+def table_columns(conn, table_name, generated=False):
+    """[(column, type)] of a table in column order
+    
+    Generated columns (such as search_vector) are left out unless generated,
+    since they can be neither copied nor inserted into.
+    """
+    return [tuple(row) for row in conn.execute(text("""
+        SELECT attname, format_type(atttypid, atttypmod)
+        FROM pg_attribute
+        WHERE attrelid = to_regclass(:table_name) AND attnum > 0 AND NOT attisdropped
+          AND (:generated OR attgenerated = '')
+        ORDER BY attnum
+    """), {'table_name': table_name, 'generated': generated})]
+
+def create_dimension_tables(conn, source_table=SOURCE_TABLE):
+    """Create dim_<column> for every normalized column and fill it with the distinct values"""
+    for column in NORMALIZED_COLUMNS:
+        start_time = time.time()
+        dim = dimension_table(column)
+        conn.execute(text(f"""
+            CREATE TABLE IF NOT EXISTS {dim} (
+                id SERIAL PRIMARY KEY,
+                value TEXT UNIQUE NOT NULL
+            )
+        """))
+        result = conn.execute(text(f"""
+            INSERT INTO {dim} (value)
+            SELECT DISTINCT {column} FROM {source_table} WHERE {column} IS NOT NULL
+            ON CONFLICT (value) DO NOTHING
+        """))
+        print(f"  ✓ {dim}: {result.rowcount} values ({time.time() - start_time:.1f}s)")
+
+def build_fact_table(conn, columns, source_table=SOURCE_TABLE):
+    """Copy the wide table into the fact table, replacing normalized text with keys"""
+    select_list = []
+    joins = []
+    for column, _ in columns:
+        if column in NORMALIZED_COLUMNS:
+            alias = f"d_{column}"
+            select_list.append(f"{alias}.id AS {key_column(column)}")
+            joins.append(f"LEFT JOIN {dimension_table(column)} {alias} ON {alias}.value = o.{column}")
+        else:
+            select_list.append(f"o.{column}")
+    
+    start_time = time.time()
+    conn.execute(text(f"""
+        CREATE TABLE {FACT_TABLE} AS
+        SELECT {', '.join(select_list)}
+        FROM {source_table} o
+        {' '.join(joins)}
+        ORDER BY o.id
+    """))
+    print(f"  ✓ Built {FACT_TABLE} ({time.time() - start_time:.1f}s)")
+
+def add_fact_constraints(conn, columns, source_table=SOURCE_TABLE):
+    """Primary key, id sequence, defaults, unique notice_id, foreign keys and indexes on the fact table
+    
+    The wide table keeps its data under a new name, so its unique_notice_id
+    constraint is renamed and the fact table takes over the name the loader
+    looks for.
+    """
+    column_names = [column for column, _ in columns]
+    has_unique = conn.execute(text(
+        "SELECT 1 FROM pg_constraint WHERE conname = 'unique_notice_id' AND conrelid = to_regclass(:table_name)"
+    ), {'table_name': WIDE_TABLE}).fetchone()
+    if has_unique:
+        conn.execute(text(f"ALTER TABLE {WIDE_TABLE} RENAME CONSTRAINT unique_notice_id TO unique_notice_id_wide"))
+    conn.execute(text(f"""
+        ALTER TABLE {FACT_TABLE} ADD PRIMARY KEY (id);
+        ALTER TABLE {FACT_TABLE} ALTER COLUMN id SET DEFAULT nextval('{source_table}_id_seq');
+        ALTER SEQUENCE {source_table}_id_seq OWNED BY {FACT_TABLE}.id;
+        ALTER TABLE {FACT_TABLE} ADD CONSTRAINT unique_notice_id UNIQUE (notice_id);
+    """))
+    if 'created_at' in column_names:
+        conn.execute(text(f"ALTER TABLE {FACT_TABLE} ALTER COLUMN created_at SET DEFAULT CURRENT_TIMESTAMP"))
+    
+    for column in NORMALIZED_COLUMNS:
+        conn.execute(text(f"""
+            ALTER TABLE {FACT_TABLE}
+            ADD CONSTRAINT fk_{FACT_TABLE}_{key_column(column)} FOREIGN KEY ({key_column(column)}) REFERENCES {dimension_table(column)}(id)
+        """))
+    if 'department_agency_id' in column_names:
+        conn.execute(text(f"""
+            ALTER TABLE {FACT_TABLE}
+            ADD CONSTRAINT fk_{FACT_TABLE}_department_agency FOREIGN KEY (department_agency_id) REFERENCES department_agency(id)
+        """))
+    
+    # Same access paths as create_database.sql, on the keys where the column was normalized
+    for column in ['posted_date', 'fiscal_year', 'award_amount', key_column('department_agency'), key_column('naics_code')]:
+        conn.execute(text(f"CREATE INDEX idx_fact_{column} ON {FACT_TABLE}({column})"))
+    if 'department_agency_id' in column_names:
+        conn.execute(text(f"CREATE INDEX idx_fact_department_agency_id ON {FACT_TABLE}(department_agency_id)"))
+
+def create_compatibility_view(conn, columns, replace=False):
+    """archived_opportunities as a view with the original column names and order
+    
+    Columns come from the fact table, or, for attributes derived from a
+    normalized column (such as the NAICS levels), from its dimension table.
+    With replace, an existing view is redefined; columns may only be added
+    at the end.
+    """
+    fact_columns = {column for column, _ in table_columns(conn, FACT_TABLE, generated=True)}
+    dimension_columns = {
+        column: {name for name, _ in table_columns(conn, dimension_table(column), generated=True)} - {'id', 'value'}
+        for column in NORMALIZED_COLUMNS
+    }
+    select_list = []
+    joins = []
+    for column, _ in columns:
+        if column in NORMALIZED_COLUMNS:
+            alias = f"d_{column}"
+            select_list.append(f"{alias}.value AS {column}")
+            joins.append(f"LEFT JOIN {dimension_table(column)} {alias} ON {alias}.id = f.{key_column(column)}")
+        elif column in fact_columns:
+            select_list.append(f"f.{column}")
+        else:
+            owners = [normalized for normalized, names in dimension_columns.items() if column in names]
+            if not owners:
+                raise RuntimeError(f"Column {column} is on neither {FACT_TABLE} nor a dimension table")
+            select_list.append(f"d_{owners[0]}.{column}")
+    conn.execute(text(f"""
+        CREATE {'OR REPLACE ' if replace else ''}VIEW {SOURCE_TABLE} AS
+        SELECT {', '.join(select_list)}
+        FROM {FACT_TABLE} f
+        {' '.join(joins)}
+    """))
+
+def normalize(engine, drop_wide=False):
+    """Rewrite archived_opportunities into dimension tables, a fact table and a compatibility view
+    
+    Runs as one transaction, so a failure leaves the wide table untouched.
+    The wide table is kept as archived_opportunities_wide unless drop_wide.
+    A partitioned archive is refused, as partition() refuses a normalized one.
+    """
+    with engine.begin() as conn:
+        with conn.connection.cursor() as cursor:
+            if is_normalized(cursor):
+                print(f"{SOURCE_TABLE} is already normalized")
+                return
+            # partition_archive builds on this module, so its is_partitioned check is inlined
+            if relation_kind(cursor, SOURCE_TABLE) == 'p':
+                raise RuntimeError(f"{SOURCE_TABLE} is partitioned; run partition_archive.py unpartition first")
+        conn.execute(text("SET LOCAL statement_timeout = 0"))
+        conn.execute(text(f"LOCK TABLE {SOURCE_TABLE} IN SHARE MODE"))
+        columns = table_columns(conn, SOURCE_TABLE)
+        view_columns = table_columns(conn, SOURCE_TABLE, generated=True)
+        generated = [column for column, _ in view_columns if column not in [name for name, _ in columns]]
+        
+        print(f"Normalizing {SOURCE_TABLE} ({len(NORMALIZED_COLUMNS)} columns)...")
+        create_dimension_tables(conn)
+        build_fact_table(conn, columns)
+        conn.execute(text(f"ALTER TABLE {SOURCE_TABLE} RENAME TO {WIDE_TABLE}"))
+        add_fact_constraints(conn, columns)
+        # Generated columns are not copied; search.py and naics.py build on
+        # this module, so their DDL is imported here to re-create them
+        if 'search_vector' in generated:
+            from search import add_search_column
+            add_search_column(conn, FACT_TABLE)
+        if any(column.startswith('naics_') for column in generated):
+            from naics import add_naics_levels
+            add_naics_levels(conn, dimension_table('naics_code'), 'value')
+        create_compatibility_view(conn, view_columns)
+        if drop_wide:
+            conn.execute(text(f"DROP TABLE {WIDE_TABLE}"))
+    
+    with engine.connect() as conn:
+        conn.execute(text(f"ANALYZE {FACT_TABLE}"))
+        conn.commit()
+    print(f"✓ {SOURCE_TABLE} is now a view over {FACT_TABLE}")
+
+def denormalize(engine):
+    """Undo normalize(): drop the view and fact table and restore the kept wide table
+    
+    Rows loaded after normalizing are copied back into the wide table first.
+    """
+    with engine.begin() as conn:
+        with conn.connection.cursor() as cursor:
+            if not is_normalized(cursor) or relation_kind(cursor, WIDE_TABLE) is None:
+                raise RuntimeError(f"Nothing to restore: {SOURCE_TABLE} is not normalized or {WIDE_TABLE} was dropped")
+        conn.execute(text("SET LOCAL statement_timeout = 0"))
+        columns = ', '.join(column for column, _ in table_columns(conn, WIDE_TABLE))
+        result = conn.execute(text(f"""
+            INSERT INTO {WIDE_TABLE} ({columns})
+            SELECT {columns} FROM {SOURCE_TABLE} v
+            WHERE NOT EXISTS (SELECT 1 FROM {WIDE_TABLE} w WHERE w.id = v.id)
+        """))
+        conn.execute(text(f"""
+            DROP VIEW {SOURCE_TABLE};
+            ALTER SEQUENCE {SOURCE_TABLE}_id_seq OWNED BY {WIDE_TABLE}.id;
+            DROP TABLE {FACT_TABLE};
+            ALTER TABLE {WIDE_TABLE} RENAME TO {SOURCE_TABLE};
+        """))
+        has_unique = conn.execute(text(
+            "SELECT 1 FROM pg_constraint WHERE conname = 'unique_notice_id_wide' AND conrelid = to_regclass(:table_name)"
+        ), {'table_name': SOURCE_TABLE}).fetchone()
+        if has_unique:
+            conn.execute(text(f"ALTER TABLE {SOURCE_TABLE} RENAME CONSTRAINT unique_notice_id_wide TO unique_notice_id"))
+    print(f"✓ Restored {SOURCE_TABLE} as a table ({result.rowcount} rows copied back)")
+
+def merge_into_fact(cursor, staging_table, columns, agency_lookup=None):
+    """Insert staged wide rows into the fact table, resolving dimension keys
+    
+    New values are added to each dimension first, then every row is inserted
+    with its keys joined in, skipping notice_ids already present. columns are
+    the staged column names. Returns the number of rows inserted.
+    """
+    if agency_lookup is not None and 'department_agency_id' not in columns:
+        insert_new_agencies(cursor, staging_table, agency_lookup)
+    
+    insert_list = []
+    select_list = []
+    joins = []
+    for column in columns:
+        if column in NORMALIZED_COLUMNS:
+            alias = f"d_{column}"
+            cursor.execute(f"""
+                INSERT INTO {dimension_table(column)} (value)
+                SELECT DISTINCT {column} FROM {staging_table} WHERE {column} IS NOT NULL
+                ON CONFLICT (value) DO NOTHING
+            """)
+            insert_list.append(key_column(column))
+            select_list.append(f"{alias}.id")
+            joins.append(f"LEFT JOIN {dimension_table(column)} {alias} ON {alias}.value = s.{column}")
+        else:
+            insert_list.append(column)
+            select_list.append(f's."{column}"')
+    if agency_lookup is not None and 'department_agency_id' not in columns:
+        insert_list.append('department_agency_id')
+        select_list.append('da.id')
+        joins.append(f"LEFT JOIN {agency_lookup} da ON da.agency_name = TRIM(s.department_agency)")
+    
+    # Inserted keys are joined back to their values for facet_counts
+    returning = []
+    expressions = []
+    cube_joins = []
+    for column in CUBE_COLUMNS:
+        if column in NORMALIZED_COLUMNS:
+            returning.append(key_column(column))
+            expressions.append(f"c_{column}.value")
+            cube_joins.append(f"LEFT JOIN {dimension_table(column)} c_{column} ON c_{column}.id = i.{key_column(column)}")
+        else:
+            returning.append(column)
+            expressions.append(f"i.{column}")
+    
+    return insert_counting_facets(cursor, f"""
+        INSERT INTO {FACT_TABLE} ({', '.join(insert_list)})
+        SELECT {', '.join(select_list)}
+        FROM {staging_table} s
+        {' '.join(joins)}
+        ON CONFLICT (notice_id) DO NOTHING
+    """, returning, expressions, ' '.join(cube_joins))
+
+def report_sizes(engine):
+    """Print heap and index sizes of the wide and fact tables, in 8 kB pages"""
+    with engine.connect() as conn:
+        for table_name in [WIDE_TABLE, SOURCE_TABLE, FACT_TABLE]:
+            row = conn.execute(text("""
+                SELECT c.relkind, pg_relation_size(c.oid) / 8192, pg_indexes_size(c.oid) / 8192
+                FROM pg_class c WHERE c.oid = to_regclass(:table_name)
+            """), {'table_name': table_name}).fetchone()
+            if row and row[0] in ('r', 'p'):
+                print(f"  {table_name}: {row[1]:,} heap pages, {row[2]:,} index pages")
+
+def parse_args():
+    """Parse command-line options for the normalizer"""
+    parser = argparse.ArgumentParser(description="Normalize the low-cardinality columns of archived_opportunities into dimension tables")
+    commands = parser.add_subparsers(dest='command', required=True)
+    normalize_cmd = commands.add_parser('normalize', help="Build dimension and fact tables and the compatibility view")
+    normalize_cmd.add_argument('--drop-wide', action='store_true', help=f"Drop {WIDE_TABLE} instead of keeping it for rollback")
+    commands.add_parser('denormalize', help=f"Restore the kept {WIDE_TABLE} as {SOURCE_TABLE}")
+    commands.add_parser('sizes', help="Compare table and index sizes")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    engine = get_engine(pool_size=1, max_overflow=0, statement_timeout_ms=0, application_name='normalize_schema')
+    if args.command == 'normalize':
+        normalize(engine, args.drop_wide)
+        report_sizes(engine)
+    elif args.command == 'denormalize':
+        denormalize(engine)
+    else:
+        report_sizes(engine)
+
+if __name__ == "__main__":
+    main()
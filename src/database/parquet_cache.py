@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import os
+from datetime import datetime
+from column_types import TEXT_DTYPE, apply_dtype_plan
+
+# Arrow types for the cleaned archive, matching create_database.sql; every
+# other mapped column is TEXT and stored as string
+TYPED_COLUMNS = {
+    'posted_date': pa.date32(),
+    'archive_date': pa.date32(),
+    'award_date': pa.date32(),
+    'response_deadline': pa.timestamp('us'),
+    'active': pa.bool_(),
+    'award_amount': pa.float64(),
+    'fiscal_year': pa.int32()
+}
+
+SOURCE_HASH_KEY = b'source_sha256'
+
+def partition_path(cache_dir, fiscal_year):
+    """Path of the single Parquet file holding one fiscal year"""
+    return os.path.join(cache_dir, f"fiscal_year={fiscal_year}", 'part-0.parquet')
+
+def _local_naive(value):
+    """Drop the UTC offset from a timestamp, keeping its local wall time"""
+    if isinstance(value, datetime) and value.tzinfo is not None:
+        return value.replace(tzinfo=None)
+    return value
+
+def _to_naive_datetimes(series):
+    """Local wall-clock datetimes, the way PostgreSQL reads offsets into DATE/TIMESTAMP"""
+    if isinstance(series.dtype, pd.DatetimeTZDtype):
+        return series.dt.tz_localize(None)
+    if pd.api.types.is_datetime64_dtype(series):
+        return series
+    return pd.to_datetime(series.map(_local_naive), errors='coerce')
+
+def _to_text(series):
+    """Render a column as strings the same way the database stores it, keeping nulls"""
+    if isinstance(series.dtype, pd.StringDtype):
+        # Arrow strings from the dtype plan go to Arrow as they are, without Python objects
+        return series
+    return series.astype(object).where(series.isna(), series.astype(str))
+
+def to_arrow_table(df):
+    """Convert a cleaned chunk to an Arrow table with the archive's typed schema
+    
+    fiscal_year is left out of the file itself; it is the partition key.
+    """
+    arrays = []
+    fields = []
+    for col in df.columns:
+        if col == 'fiscal_year':
+            continue
+        arrow_type = TYPED_COLUMNS.get(col, pa.string())
+        series = df[col]
+        if arrow_type == pa.date32():
+            values = _to_naive_datetimes(series).dt.date
+        elif arrow_type == pa.timestamp('us'):
+            values = _to_naive_datetimes(series)
+        elif arrow_type == pa.string():
+            values = _to_text(series)
+        else:
+            values = series
+        arrays.append(pa.array(values, type=arrow_type, from_pandas=True))
+        fields.append(pa.field(col, arrow_type))
+    return pa.Table.from_arrays(arrays, schema=pa.schema(fields))
+
+class FiscalYearWriter:
+    """Write one fiscal year's cleaned chunks to its partition file
+    
+    Chunks become row groups of a temporary file that replaces the partition
+    only on close(), so an interrupted write never leaves a half-written
+    partition that looks current.
+    """
+    
+    def __init__(self, cache_dir, fiscal_year, source_hash):
+        self.path = partition_path(cache_dir, fiscal_year)
+        self.tmp_path = self.path + '.tmp'
+        self.source_hash = source_hash
+        self.writer = None
+        self.rows_written = 0
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+    
+    def write(self, df):
+        table = to_arrow_table(df)
+        if self.writer is None:
+            schema = table.schema.with_metadata({SOURCE_HASH_KEY: self.source_hash.encode()})
+            self.writer = pq.ParquetWriter(self.tmp_path, schema, compression='zstd')
+        self.writer.write_table(table.cast(self.writer.schema))
+        self.rows_written += len(df)
+    
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            os.replace(self.tmp_path, self.path)
+    
+    def abort(self):
+        if self.writer is not None:
+            self.writer.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+def cached_source_hash(cache_dir, fiscal_year):
+    """The source CSV hash a cached partition was built from, or None"""
+    path = partition_path(cache_dir, fiscal_year)
+    if not os.path.exists(path):
+        return None
+    metadata = pq.read_schema(path).metadata or {}
+    value = metadata.get(SOURCE_HASH_KEY)
+    return value.decode() if value else None
+
+def cache_is_current(cache_dir, fiscal_year, source_hash):
+    """True if the cached partition was built from this exact CSV content"""
+    return cached_source_hash(cache_dir, fiscal_year) == source_hash
+
+def iter_cached_chunks(cache_dir, fiscal_year, batch_size, columns=None):
+    """Yield cleaned DataFrame chunks back from a cached partition
+    
+    The frames look like clean_dataframe output, with fiscal_year restored
+    and the dtype plan applied; strings stay in Arrow memory. Every chunk
+    but the last holds exactly batch_size rows, whatever row groups the
+    partition was written in, so chunk i is the same rows the CSV gives
+    (see load_data.iter_csv_chunks) and resume checkpoints line up.
+    """
+    def to_frame(table):
+        df = table.to_pandas(types_mapper={pa.string(): TEXT_DTYPE}.get, date_as_object=False)
+        df['fiscal_year'] = fiscal_year
+        return apply_dtype_plan(df)
+    
+    parquet_file = pq.ParquetFile(partition_path(cache_dir, fiscal_year))
+    # Batches stop at row group boundaries, so they are joined up and re-cut
+    pending, pending_rows = [], 0
+    for batch in parquet_file.iter_batches(batch_size=batch_size, columns=columns):
+        pending.append(batch)
+        pending_rows += batch.num_rows
+        while pending_rows >= batch_size:
+            table = pa.Table.from_batches(pending)
+            yield to_frame(table.slice(0, batch_size))
+            rest = table.slice(batch_size)
+            pending, pending_rows = rest.to_batches(), rest.num_rows
+    if pending_rows > 0:
+        yield to_frame(pa.Table.from_batches(pending))
+
+def read_archive(cache_dir, columns=None, fiscal_years=None):
+    """Read the cached archive as one DataFrame, projecting columns and pruning years"""
+    filters = [('fiscal_year', 'in', list(fiscal_years))] if fiscal_years else None
+    table = pq.read_table(cache_dir, columns=columns, filters=filters, partitioning='hive')
+    return table.to_pandas()
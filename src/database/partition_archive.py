@@ -0,0 +1,369 @@
+#!/usr/bin/env python3
+from sqlalchemy import text
+import re
+import time
+import argparse
+from dotenv import load_dotenv
+from db import get_engine
+from normalize_schema import SOURCE_TABLE, relation_kind, is_normalized, table_columns
+from facet_cube import CUBE_TABLE, cube_exists, upsert_counts_sql
+
+# Load environment variables
+load_dotenv()
+
+HEAP_TABLE = 'archived_opportunities_heap'
+
+# Not carried over: the unique (notice_id, fiscal_year) index leads with
+# notice_id, and a fiscal_year filter prunes whole partitions
+REDUNDANT_INDEXES = ['idx_notice_id', 'idx_fiscal_year']
+
+# Typical archive queries, timed by measure_queries before and after partitioning
+BENCHMARK_QUERIES = {
+    'fy_count': "SELECT COUNT(*) FROM archived_opportunities WHERE fiscal_year = :fiscal_year",
+    'fy_agency_totals': """
+        SELECT department_agency, COUNT(*), SUM(award_amount)
+        FROM archived_opportunities
+        WHERE fiscal_year = :fiscal_year
+        GROUP BY department_agency
+    """,
+    'fy_posted_month': """
+        SELECT COUNT(*), SUM(award_amount)
+        FROM archived_opportunities
+        WHERE fiscal_year = :fiscal_year AND posted_date >= :month_start AND posted_date < :month_start + 31
+    """,
+    'fy_naics_top': """
+        SELECT naics_code, COUNT(*) FROM archived_opportunities
+        WHERE fiscal_year = :fiscal_year
+        GROUP BY naics_code ORDER BY COUNT(*) DESC LIMIT 20
+    """,
+    'notice_id_lookup': "SELECT * FROM archived_opportunities WHERE notice_id = :notice_id",
+    'notice_id_fy_lookup': "SELECT * FROM archived_opportunities WHERE notice_id = :notice_id AND fiscal_year = :fiscal_year",
+    'all_years_agency_totals': """
+        SELECT fiscal_year, department_agency, COUNT(*)
+        FROM archived_opportunities
+        GROUP BY fiscal_year, department_agency
+    """
+}
+
+def partition_name(fiscal_year):
+    """Partition of archived_opportunities holding one fiscal year"""
+    return f"{SOURCE_TABLE}_fy{int(fiscal_year)}"
+
+def is_partitioned(cursor, table_name=SOURCE_TABLE):
+    """True when table_name is partitioned (by fiscal_year, once partition() has run)"""
+    return relation_kind(cursor, table_name) == 'p'
+
+def partition_tables(conn, table_name=SOURCE_TABLE):
+    """Names of a partitioned table's partitions, in name order"""
+    return [row[0] for row in conn.execute(text("""
+        SELECT inhrelid::regclass::text FROM pg_inherits
+        WHERE inhparent = to_regclass(:table_name)
+        ORDER BY 1
+    """), {'table_name': table_name})]
+
+def ensure_partition(cursor, fiscal_year):
+    """Create the fiscal year's partition if it is missing; returns its name
+    
+    Creating one locks the parent until the transaction ends, which only
+    happens the first time a fiscal year is loaded.
+    """
+    name = partition_name(fiscal_year)
+    if relation_kind(cursor, name) is None:
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {SOURCE_TABLE} FOR VALUES IN ({int(fiscal_year)})")
+    return name
+
+def partition_merge_clauses(cursor, fiscal_year, target=None, alias='s'):
+    """(target table, ON CONFLICT columns, WHERE clause) for merging one fiscal year's staged rows
+    
+    Rows go straight into the year's partition (created if missing), or into
+    target, skipping tuple routing. notice_id is unique within each
+    partition; a notice_id already stored under another fiscal year is
+    kept out by the WHERE clause instead, an index probe per other partition.
+    """
+    if fiscal_year is None:
+        raise ValueError(f"Loading into the partitioned {SOURCE_TABLE} needs a fiscal year (FYnnnn in the file name)")
+    target = target or ensure_partition(cursor, fiscal_year)
+    where = f"""
+        WHERE NOT EXISTS (
+            SELECT 1 FROM {SOURCE_TABLE} o
+            WHERE o.notice_id = {alias}.notice_id AND o.fiscal_year <> {int(fiscal_year)}
+        )
+    """
+    return target, 'notice_id, fiscal_year', where
+
+def index_definitions(conn, table_name):
+    """{index name: CREATE INDEX statement} for a table's indexes that do not back a constraint"""
+    return dict(conn.execute(text("""
+        SELECT c.relname, pg_get_indexdef(i.indexrelid)
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE i.indrelid = to_regclass(:table_name)
+          AND NOT EXISTS (SELECT 1 FROM pg_constraint k WHERE k.conindid = i.indexrelid)
+        ORDER BY c.relname
+    """), {'table_name': table_name}).fetchall())
+
+def constraint_definitions(conn, table_name, types):
+    """{constraint name: definition} for a table's constraints of the given pg_constraint.contype codes"""
+    return dict(conn.execute(text("""
+        SELECT conname, pg_get_constraintdef(oid)
+        FROM pg_constraint
+        WHERE conrelid = to_regclass(:table_name) AND contype = ANY(:types)
+        ORDER BY conname
+    """), {'table_name': table_name, 'types': list(types)}).fetchall())
+
+def rename_table_objects(conn, table_name, suffix=None, strip=None):
+    """Rename a table's constraints and other indexes by adding or removing a suffix
+    
+    Index and constraint names are unique per schema, so the heap's names
+    are moved aside to let the partitioned table take over the originals.
+    """
+    constraints = list(constraint_definitions(conn, table_name, 'pfuc'))
+    for name in constraints + list(index_definitions(conn, table_name)):
+        if suffix:
+            new_name = name + suffix
+        elif name.endswith(strip):
+            new_name = name[:-len(strip)]
+        else:
+            continue
+        if name in constraints:
+            conn.execute(text(f"ALTER TABLE {table_name} RENAME CONSTRAINT {name} TO {new_name}"))
+        else:
+            conn.execute(text(f"ALTER INDEX {name} RENAME TO {new_name}"))
+
+def partition(engine, drop_heap=False):
+    """Rewrite archived_opportunities as a table partitioned by fiscal_year, one partition per year
+    
+    Runs as one transaction, so a failure leaves the table untouched. The
+    primary key becomes (id, fiscal_year) and unique_notice_id becomes
+    UNIQUE (notice_id, fiscal_year), since a partitioned table's unique
+    constraints must include the partition key. Other indexes, foreign keys
+    and check constraints are carried over. The old table is kept as
+    archived_opportunities_heap unless drop_heap.
+    """
+    with engine.begin() as conn:
+        with conn.connection.cursor() as cursor:
+            if is_normalized(cursor):
+                raise RuntimeError(f"{SOURCE_TABLE} is normalized; run normalize_schema.py denormalize first")
+            if is_partitioned(cursor):
+                print(f"{SOURCE_TABLE} is already partitioned")
+                return
+        conn.execute(text("SET LOCAL statement_timeout = 0"))
+        conn.execute(text(f"LOCK TABLE {SOURCE_TABLE} IN SHARE MODE"))
+        missing_year = conn.execute(text(f"SELECT COUNT(*) FROM {SOURCE_TABLE} WHERE fiscal_year IS NULL")).scalar()
+        if missing_year:
+            raise RuntimeError(f"{missing_year} rows have no fiscal_year; set it before partitioning")
+        
+        columns = ', '.join(column for column, _ in table_columns(conn, SOURCE_TABLE))
+        indexes = {name: definition for name, definition in index_definitions(conn, SOURCE_TABLE).items()
+                   if name not in REDUNDANT_INDEXES}
+        constraints = constraint_definitions(conn, SOURCE_TABLE, 'fc')
+        fiscal_years = [row[0] for row in conn.execute(text(
+            f"SELECT DISTINCT fiscal_year FROM {SOURCE_TABLE} ORDER BY fiscal_year"
+        ))]
+        
+        print(f"Partitioning {SOURCE_TABLE} by fiscal_year ({len(fiscal_years)} years)...")
+        conn.execute(text(f"ALTER TABLE {SOURCE_TABLE} RENAME TO {HEAP_TABLE}"))
+        rename_table_objects(conn, HEAP_TABLE, suffix='_heap')
+        conn.execute(text(f"""
+            CREATE TABLE {SOURCE_TABLE} (LIKE {HEAP_TABLE} INCLUDING DEFAULTS INCLUDING GENERATED INCLUDING STORAGE)
+            PARTITION BY LIST (fiscal_year);
+            ALTER TABLE {SOURCE_TABLE} ALTER COLUMN fiscal_year SET NOT NULL;
+            ALTER SEQUENCE {SOURCE_TABLE}_id_seq OWNED BY {SOURCE_TABLE}.id;
+        """))
+        
+        # Rows are copied before any index exists, then each index is built once per partition
+        for fiscal_year in fiscal_years:
+            start_time = time.time()
+            name = partition_name(fiscal_year)
+            conn.execute(text(f"CREATE TABLE {name} PARTITION OF {SOURCE_TABLE} FOR VALUES IN ({int(fiscal_year)})"))
+            result = conn.execute(text(f"""
+                INSERT INTO {name} ({columns})
+                SELECT {columns} FROM {HEAP_TABLE} WHERE fiscal_year = :fiscal_year ORDER BY id
+            """), {'fiscal_year': fiscal_year})
+            print(f"  ✓ {name}: {result.rowcount:,} rows ({time.time() - start_time:.1f}s)")
+        
+        start_time = time.time()
+        conn.execute(text(f"""
+            ALTER TABLE {SOURCE_TABLE} ADD PRIMARY KEY (id, fiscal_year);
+            ALTER TABLE {SOURCE_TABLE} ADD CONSTRAINT unique_notice_id UNIQUE (notice_id, fiscal_year);
+        """))
+        for definition in indexes.values():
+            conn.execute(text(definition))
+        for name, definition in constraints.items():
+            # NOT VALID foreign keys are not supported on partitioned tables;
+            # the rows were already checked against the heap's constraint
+            conn.execute(text(f"ALTER TABLE {SOURCE_TABLE} ADD CONSTRAINT {name} {definition.replace(' NOT VALID', '')}"))
+        print(f"  ✓ Built {len(indexes) + 2} indexes and {len(constraints)} constraints ({time.time() - start_time:.1f}s)")
+        if drop_heap:
+            conn.execute(text(f"DROP TABLE {HEAP_TABLE}"))
+    
+    # VACUUM sets the visibility map on the copied rows, so the fiscal_year
+    # counts that idx_fiscal_year used to answer become index-only scans again
+    with engine.connect() as conn:
+        conn.execution_options(isolation_level='AUTOCOMMIT').execute(text(f"VACUUM (ANALYZE) {SOURCE_TABLE}"))
+    print(f"✓ {SOURCE_TABLE} is now partitioned by fiscal_year")
+
+def unpartition(engine):
+    """Undo partition(): drop the partitioned table and restore the kept heap
+    
+    The heap is refilled from the partitions first, so rows loaded, reloaded
+    or updated since partitioning are kept. Plain columns added since (such
+    as department_agency_id) are added to the heap, but not their indexes
+    or constraints.
+    """
+    with engine.begin() as conn:
+        with conn.connection.cursor() as cursor:
+            if not is_partitioned(cursor) or relation_kind(cursor, HEAP_TABLE) is None:
+                raise RuntimeError(f"Nothing to restore: {SOURCE_TABLE} is not partitioned or {HEAP_TABLE} was dropped")
+        conn.execute(text("SET LOCAL statement_timeout = 0"))
+        heap_columns = [column for column, _ in table_columns(conn, HEAP_TABLE, generated=True)]
+        for column, column_type in table_columns(conn, SOURCE_TABLE):
+            if column not in heap_columns:
+                conn.execute(text(f"ALTER TABLE {HEAP_TABLE} ADD COLUMN {column} {column_type}"))
+                print(f"  Added {column} to {HEAP_TABLE}")
+        columns = ', '.join(column for column, _ in table_columns(conn, HEAP_TABLE))
+        conn.execute(text(f"TRUNCATE {HEAP_TABLE}"))
+        result = conn.execute(text(f"INSERT INTO {HEAP_TABLE} ({columns}) SELECT {columns} FROM {SOURCE_TABLE} ORDER BY id"))
+        conn.execute(text(f"""
+            ALTER SEQUENCE {SOURCE_TABLE}_id_seq OWNED BY {HEAP_TABLE}.id;
+            DROP TABLE {SOURCE_TABLE};
+            ALTER TABLE {HEAP_TABLE} RENAME TO {SOURCE_TABLE};
+        """))
+        rename_table_objects(conn, SOURCE_TABLE, strip='_heap')
+    print(f"✓ Restored {SOURCE_TABLE} as a single table ({result.rowcount:,} rows copied back)")
+
+def create_reload_table(cursor, fiscal_year):
+    """Create an empty stand-alone table shaped like a partition, to load one fiscal year into
+    
+    It carries the parent's primary key and unique constraints, so the
+    loader's ON CONFLICT works and ATTACH adopts them instead of building
+    new ones, and a CHECK on fiscal_year that lets ATTACH skip its
+    validation scan. Returns its name.
+    """
+    name = f"{partition_name(fiscal_year)}_reload"
+    cursor.execute(f"""
+        DROP TABLE IF EXISTS {name};
+        CREATE TABLE {name} (LIKE {SOURCE_TABLE} INCLUDING DEFAULTS INCLUDING GENERATED INCLUDING STORAGE);
+        ALTER TABLE {name} ADD CONSTRAINT {name}_fiscal_year CHECK (fiscal_year = {int(fiscal_year)});
+    """)
+    cursor.execute("""
+        SELECT pg_get_constraintdef(oid) FROM pg_constraint
+        WHERE conrelid = to_regclass(%s) AND contype IN ('p', 'u')
+    """, (SOURCE_TABLE,))
+    for (definition,) in cursor.fetchall():
+        cursor.execute(f"ALTER TABLE {name} ADD {definition}")
+    return name
+
+def index_definition_on(definition, table_name, concurrently=False, index_name=None):
+    """Rewrite a pg_get_indexdef() statement as the same index on another table
+    
+    Used to build a partitioned index's counterpart on a single partition,
+    e.g. CREATE INDEX idx_posted_date ON ONLY public.archived_opportunities
+    USING btree (posted_date) -> CREATE INDEX ON <table> USING btree
+    (posted_date). PostgreSQL names the new index unless index_name is given.
+    """
+    return re.sub(r'^CREATE (UNIQUE )?INDEX \S+ ON (ONLY )?\S+ ',
+                  lambda match: f"CREATE {match.group(1) or ''}INDEX {'CONCURRENTLY ' if concurrently else ''}"
+                                f"{index_name + ' ' if index_name else ''}ON {table_name} ",
+                  definition)
+
+def index_reload_table(cursor, reload_table):
+    """Build the parent's other indexes on a loaded reload table, so ATTACH only has to adopt them"""
+    cursor.execute("""
+        SELECT pg_get_indexdef(i.indexrelid)
+        FROM pg_index i
+        WHERE i.indrelid = to_regclass(%s)
+          AND NOT EXISTS (SELECT 1 FROM pg_constraint k WHERE k.conindid = i.indexrelid)
+    """, (SOURCE_TABLE,))
+    for (definition,) in cursor.fetchall():
+        cursor.execute(index_definition_on(definition, reload_table))
+
+def swap_partition(cursor, fiscal_year, reload_table, keep_old=False):
+    """Replace a fiscal year's partition with a loaded reload table by DETACH and ATTACH
+    
+    Meant to run in a short transaction of its own: DETACH holds an
+    exclusive lock on archived_opportunities until commit, but nothing here
+    scans or rewrites rows except recounting the year's facet_counts cells.
+    The old partition is dropped, or kept as <partition>_old with keep_old.
+    Returns the number of rows the old partition held.
+    """
+    name = partition_name(fiscal_year)
+    old_rows = 0
+    if relation_kind(cursor, name) is not None:
+        cursor.execute(f"SELECT COUNT(*) FROM {name}")
+        old_rows = cursor.fetchone()[0]
+        cursor.execute(f"ALTER TABLE {SOURCE_TABLE} DETACH PARTITION {name}")
+        if keep_old:
+            cursor.execute(f"DROP TABLE IF EXISTS {name}_old; ALTER TABLE {name} RENAME TO {name}_old")
+        else:
+            cursor.execute(f"DROP TABLE {name}")
+    cursor.execute(f"""
+        ALTER TABLE {reload_table} RENAME TO {name};
+        ALTER TABLE {SOURCE_TABLE} ATTACH PARTITION {name} FOR VALUES IN ({int(fiscal_year)});
+        ALTER TABLE {name} DROP CONSTRAINT {reload_table}_fiscal_year;
+    """)
+    if cube_exists(cursor):
+        cursor.execute(f"DELETE FROM {CUBE_TABLE} WHERE fiscal_year = %s", (int(fiscal_year),))
+        cursor.execute(upsert_counts_sql(name))
+    return old_rows
+
+def measure_queries(engine, fiscal_year, repeat=5):
+    """Best-of-repeat milliseconds for each of BENCHMARK_QUERIES, scoped to one fiscal year where they filter"""
+    with engine.connect() as conn:
+        params = conn.execute(text("""
+            SELECT :fiscal_year AS fiscal_year, MIN(notice_id) AS notice_id,
+                   COALESCE(MIN(posted_date), make_date(:fiscal_year - 1, 10, 1)) AS month_start
+            FROM archived_opportunities
+            WHERE fiscal_year = :fiscal_year
+        """), {'fiscal_year': fiscal_year}).mappings().fetchone()
+        timings = {}
+        for name, query in BENCHMARK_QUERIES.items():
+            best = float('inf')
+            for _ in range(repeat):
+                start = time.perf_counter()
+                conn.execute(text(query), dict(params)).fetchall()
+                best = min(best, time.perf_counter() - start)
+            timings[name] = round(best * 1000, 2)
+    return timings
+
+def report_partitions(engine):
+    """Print rows and heap and index sizes per partition, in 8 kB pages"""
+    with engine.connect() as conn:
+        with conn.connection.cursor() as cursor:
+            tables = partition_tables(conn) if is_partitioned(cursor) else [SOURCE_TABLE]
+        for table_name in tables:
+            row = conn.execute(text("""
+                SELECT c.reltuples::bigint, pg_relation_size(c.oid) / 8192, pg_indexes_size(c.oid) / 8192
+                FROM pg_class c WHERE c.oid = to_regclass(:table_name)
+            """), {'table_name': table_name}).fetchone()
+            print(f"  {table_name}: ~{max(row[0], 0):,} rows, {row[1]:,} heap pages, {row[2]:,} index pages")
+
+def parse_args():
+    """Parse command-line options for the partitioning migration"""
+    parser = argparse.ArgumentParser(description="Partition archived_opportunities by fiscal_year")
+    commands = parser.add_subparsers(dest='command', required=True)
+    partition_cmd = commands.add_parser('partition', help="Convert the table to one partition per fiscal year")
+    partition_cmd.add_argument('--drop-heap', action='store_true', help=f"Drop {HEAP_TABLE} instead of keeping it for rollback")
+    commands.add_parser('unpartition', help=f"Restore the kept {HEAP_TABLE} as {SOURCE_TABLE}")
+    commands.add_parser('sizes', help="Rows and sizes per partition")
+    bench = commands.add_parser('bench', help="Time typical queries, to compare before and after partitioning")
+    bench.add_argument('--fy', type=int, required=True, help="Fiscal year the scoped queries filter on")
+    bench.add_argument('--repeat', type=int, default=5, help="Runs per query, best is reported (default: 5)")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    engine = get_engine(pool_size=1, max_overflow=0, statement_timeout_ms=0, application_name='partition_archive')
+    if args.command == 'partition':
+        partition(engine, args.drop_heap)
+        report_partitions(engine)
+    elif args.command == 'unpartition':
+        unpartition(engine)
+    elif args.command == 'bench':
+        for name, milliseconds in measure_queries(engine, args.fy, args.repeat).items():
+            print(f"  {name:<26} {milliseconds:>10.2f} ms")
+    else:
+        report_partitions(engine)
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+import queue
+import threading
+from instrumentation import current_scope, in_scope
+
+# Seconds a blocked stage waits between checks for a cancelled pipeline
+POLL_SECONDS = 0.1
+
+# Last entry a stage puts in its queue: (END, None) when done, (END, exception) when it failed
+END = object()
+
+def threaded(items, name, depth=2):
+    """Yield from items, advanced in a thread of its own at most depth items ahead of the consumer
+    
+    Chaining calls builds a pipeline: each stage runs in its thread and
+    hands its output over a bounded queue, so stages overlap and a fast
+    stage blocks when it is depth items ahead of a slow one (backpressure),
+    holding at most depth items in the queue.
+    
+    An exception in the stage is re-raised in the consumer after the items
+    produced before it. When the consumer stops early (an exception, or
+    closing this generator), the stage is cancelled: it stops at its next
+    hand-over and closes items, which cancels the stages before it in
+    turn. Either way the thread has finished when this generator returns.
+    
+    The thread records its stages into the consumer's current
+    instrumentation scope.
+    """
+    handover = queue.Queue(maxsize=depth)
+    cancelled = threading.Event()
+    scope = current_scope()
+    
+    def put(entry):
+        """Block until entry is queued; False if the pipeline was cancelled first"""
+        while not cancelled.is_set():
+            try:
+                handover.put(entry, timeout=POLL_SECONDS)
+                return True
+            except queue.Full:
+                continue
+        return False
+    
+    def produce():
+        iterator = iter(items)
+        try:
+            with in_scope(scope):
+                for item in iterator:
+                    if not put((item, None)):
+                        return
+            put((END, None))
+        except BaseException as e:
+            put((END, e))
+        finally:
+            # Runs the generator's own cleanup, in this thread, when it was stopped early
+            close = getattr(iterator, 'close', None)
+            if close is not None:
+                close()
+    
+    worker = threading.Thread(target=produce, name=f"pipeline-{name}", daemon=True)
+    worker.start()
+    try:
+        while True:
+            item, error = handover.get()
+            if item is END:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        cancelled.set()
+        worker.join()
+
+def chunks_in_flight(depth, stages=3):
+    """Most items a chain of stages threaded with this depth holds at once: one per stage plus full queues"""
+    return stages + (stages - 1) * depth
\ No newline at end of file
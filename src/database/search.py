@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+import pandas as pd
+from sqlalchemy import text
+import time
+import argparse
+from dotenv import load_dotenv
+from db import get_engine
+from normalize_schema import (SOURCE_TABLE, FACT_TABLE, is_normalized, table_columns,
+                              create_compatibility_view)
+
+# Load environment variables
+load_dotenv()
+
+# Title is weighted A, description B and awardee C
+SEARCH_VECTOR_EXPRESSION = """
+    setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+    setweight(to_tsvector('english', coalesce(description, '')), 'B') ||
+    setweight(to_tsvector('english', coalesce(awardee, '')), 'C')
+"""
+
+# ts_rank weights in {D, C, B, A} order: title 3x, description 2x and
+# awardee 1.5x, as in research/technical-spikes/search_architeture.md
+RANK_WEIGHTS = '{0.1, 0.5, 0.67, 1.0}'
+
+RESULT_COLUMNS = ['id', 'notice_id', 'title', 'department_agency', 'naics_code', 'set_aside',
+                  'fiscal_year', 'posted_date', 'award_amount', 'awardee']
+
+def add_search_column(conn, table_name):
+    """Add the stored search_vector column and its GIN index to a table
+    
+    search_vector is a generated column, so PostgreSQL computes it for every
+    row the loader inserts, whichever write path it takes. Adding it rewrites
+    the table once.
+    """
+    conn.execute(text(f"""
+        ALTER TABLE {table_name}
+        ADD COLUMN IF NOT EXISTS search_vector tsvector
+        GENERATED ALWAYS AS ({SEARCH_VECTOR_EXPRESSION}) STORED
+    """))
+    conn.execute(text(f"CREATE INDEX IF NOT EXISTS idx_{table_name}_search_vector ON {table_name} USING GIN (search_vector)"))
+
+def ensure_search_index(engine):
+    """Set up full-text search on the archive, normalized or not
+    
+    On the normalized schema the column goes on the fact table and the
+    compatibility view is extended to expose it.
+    """
+    start_time = time.time()
+    with engine.begin() as conn:
+        conn.execute(text("SET LOCAL statement_timeout = 0"))
+        with conn.connection.cursor() as cursor:
+            normalized = is_normalized(cursor)
+        add_search_column(conn, FACT_TABLE if normalized else SOURCE_TABLE)
+        if normalized:
+            columns = table_columns(conn, SOURCE_TABLE)
+            if 'search_vector' not in [column for column, _ in columns]:
+                create_compatibility_view(conn, columns + [('search_vector', 'tsvector')], replace=True)
+    with engine.connect() as conn:
+        conn.execute(text(f"ANALYZE {FACT_TABLE if normalized else SOURCE_TABLE}"))
+        conn.commit()
+    print(f"✓ Full-text search ready on {FACT_TABLE if normalized else SOURCE_TABLE} ({time.time() - start_time:.1f}s)")
+
+def search_contracts(engine, query, agency=None, naics=None, fiscal_years=None, limit=20, after=None):
+    """Full-text search over title, description and awardee, best matches first
+    
+    query uses web search syntax ("quoted phrases", OR, -excluded). agency,
+    naics and fiscal_years narrow the matches. Results are ordered by rank
+    then id and paged by keyset: pass the returned next_after as `after` to
+    get the following page. Returns (DataFrame, next_after), where
+    next_after is None on the last page.
+    """
+    conditions = ["search_vector @@ q.query"]
+    params = {'query': query, 'limit': limit}
+    if agency:
+        conditions.append("department_agency = :agency")
+        params['agency'] = agency
+    if naics:
+        conditions.append("naics_code = :naics")
+        params['naics'] = naics
+    if fiscal_years:
+        conditions.append("fiscal_year = ANY(:fiscal_years)")
+        params['fiscal_years'] = list(fiscal_years)
+    if after:
+        conditions.append(f"(ts_rank('{RANK_WEIGHTS}', search_vector, q.query), id) < (CAST(:after_rank AS real), :after_id)")
+        params['after_rank'], params['after_id'] = after
+    
+    sql = f"""
+        SELECT {', '.join(RESULT_COLUMNS)}, ts_rank('{RANK_WEIGHTS}', search_vector, q.query) AS rank
+        FROM {SOURCE_TABLE}, websearch_to_tsquery('english', :query) AS q(query)
+        WHERE {' AND '.join(conditions)}
+        ORDER BY rank DESC, id DESC
+        LIMIT :limit
+    """
+    with engine.connect() as conn:
+        df = pd.read_sql(text(sql), conn, params=params)
+    next_after = (float(df['rank'].iloc[-1]), int(df['id'].iloc[-1])) if len(df) == limit else None
+    return df, next_after
+
+def parse_after(value):
+    """Parse a 'rank:id' page cursor"""
+    rank, id_ = value.split(':')
+    return float(rank), int(id_)
+
+def parse_args():
+    """Parse command-line options for search"""
+    parser = argparse.ArgumentParser(description="Full-text search over archived_opportunities")
+    parser.add_argument('query', nargs='?', help="Search terms (web search syntax)")
+    parser.add_argument('--setup', action='store_true', help="Add the search_vector column and GIN index, then exit")
+    parser.add_argument('--agency', help="Only this department/agency")
+    parser.add_argument('--naics', help="Only this NAICS code")
+    parser.add_argument('--fy', type=int, nargs='+', help="Only these fiscal years")
+    parser.add_argument('--limit', type=int, default=20, help="Results per page (default: 20)")
+    parser.add_argument('--after', type=parse_after, help="Page cursor printed by the previous page (rank:id)")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    if args.setup:
+        engine = get_engine(pool_size=1, max_overflow=0, statement_timeout_ms=0, application_name='search_setup')
+        ensure_search_index(engine)
+        return
+    if not args.query:
+        raise SystemExit("Give a search query, or --setup")
+    
+    engine = get_engine(pool_size=1, max_overflow=0, application_name='search')
+    start_time = time.time()
+    df, next_after = search_contracts(engine, args.query, args.agency, args.naics, args.fy, args.limit, args.after)
+    elapsed = time.time() - start_time
+    
+    with pd.option_context('display.max_rows', None, 'display.max_colwidth', 60, 'display.width', 200):
+        print(df.drop(columns=['id']).to_string(index=False))
+    print(f"\n{len(df)} results in {elapsed * 1000:.0f} ms")
+    if next_after:
+        print(f"Next page: --after {next_after[0]!r}:{next_after[1]}")
+
+if __name__ == "__main__":
+    main()
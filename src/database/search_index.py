@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+import pandas as pd
+import numpy as np
+import hashlib
+import json
+import glob
+import os
+import shutil
+import time
+import argparse
+from datetime import datetime
+from dotenv import load_dotenv
+from parquet_cache import iter_cached_chunks
+
+# Load environment variables
+load_dotenv()
+
+# Text fields and their weight in the term frequencies BM25 sees: title 3x,
+# description 2x and awardee 1.5x, as in the search spike
+FIELD_WEIGHTS = {
+    'title': 3.0,
+    'description': 2.0,
+    'awardee': 1.5
+}
+
+# Facet name -> archive column
+FACETS = {
+    'agency': 'department_agency',
+    'naics': 'naics_code',
+    'set_aside': 'set_aside',
+    'state': 'pop_state',
+    'fiscal_year': 'fiscal_year'
+}
+
+# Columns kept in the index so hits can be shown without the database
+STORED_FIELDS = ['notice_id', 'title']
+
+STOPWORDS = frozenset([
+    'a', 'an', 'and', 'any', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'in', 'is', 'it',
+    'no', 'not', 'of', 'on', 'or', 'the', 'this', 'that', 'to', 'will', 'with'
+])
+
+K1 = 1.2
+B = 0.75
+
+META_FILE = 'meta.json'
+
+def tokenize(series):
+    """Lowercased alphanumeric tokens of a text Series, one row per token, indexed by row position
+    
+    Stopwords and one-character tokens are dropped, and a plural -s is
+    folded away ("helicopters" -> "helicopter"). Queries go through the
+    same function, so index and query terms always agree.
+    """
+    tokens = series.astype('string').fillna('').str.lower().str.findall(r'[a-z0-9]+').explode().dropna()
+    tokens = tokens[(tokens.str.len() > 1) & ~tokens.isin(STOPWORDS)]
+    return tokens.str.replace(r'(?<=[a-z]{3})(?<!s)s$', '', regex=True)
+
+def term_hash(term):
+    """64-bit hash a term is looked up by in the on-disk dictionary"""
+    return int.from_bytes(hashlib.blake2b(term.encode(), digest_size=8).digest(), 'little')
+
+def facet_value(value):
+    """JSON-safe facet value, with blanks and nulls as None"""
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return None
+    if isinstance(value, str):
+        value = value.strip()
+        return value or None
+    return value.item() if hasattr(value, 'item') else value
+
+def snapshot_chunks(snapshot_dir, fiscal_years=None, batch_size=100000):
+    """Yield archive chunks with the indexed columns from a Parquet snapshot or loader cache"""
+    columns = list(dict.fromkeys(STORED_FIELDS + list(FIELD_WEIGHTS) + [c for c in FACETS.values() if c != 'fiscal_year']))
+    years = sorted(int(path.rsplit('=', 1)[1]) for path in glob.glob(os.path.join(snapshot_dir, 'fiscal_year=*')))
+    for fiscal_year in years:
+        if fiscal_years and fiscal_year not in fiscal_years:
+            continue
+        yield from iter_cached_chunks(snapshot_dir, fiscal_year, batch_size, columns=columns)
+
+def build_index(chunks, index_dir, source=''):
+    """Build an on-disk inverted index from DataFrame chunks of the archive
+    
+    Every file is a plain .npy array, so SearchIndex can memory-map them:
+    - term_hash / term_offsets: the sorted term dictionary and where each
+      term's postings start
+    - post_docs / post_tf: document numbers and field-weighted term
+      frequencies, grouped by term
+    - doc_length: weighted length of each document
+    - facet_<name>: a value code per document; the values are in meta.json
+    - stored_<field> / stored_<field>_offsets: UTF-8 text of the stored fields
+    The index is written next to index_dir and swapped in when complete.
+    """
+    start_time = time.time()
+    vocabulary = {}
+    facet_values = {name: {} for name in FACETS}
+    postings = []
+    doc_lengths = []
+    facet_codes = {name: [] for name in FACETS}
+    stored = {field: [] for field in STORED_FIELDS}
+    documents = 0
+    
+    for df in chunks:
+        df = df.reset_index(drop=True)
+        docs = []
+        terms = []
+        weights = []
+        for field, weight in FIELD_WEIGHTS.items():
+            tokens = tokenize(df[field])
+            codes, uniques = pd.factorize(tokens)
+            term_ids = np.array([vocabulary.setdefault(term, len(vocabulary)) for term in uniques], dtype=np.int64)
+            docs.append(tokens.index.to_numpy(dtype=np.int64))
+            terms.append(term_ids[codes])
+            weights.append(np.full(len(codes), weight, dtype=np.float32))
+        docs = np.concatenate(docs)
+        terms = np.concatenate(terms)
+        weights = np.concatenate(weights)
+        
+        # One posting per (term, document), sorted by term then document
+        keys, inverse = np.unique((terms << 32) | docs, return_inverse=True)
+        postings.append((
+            (keys >> 32).astype(np.int32),
+            ((keys & 0xFFFFFFFF) + documents).astype(np.int32),
+            np.bincount(inverse, weights=weights).astype(np.float32)
+        ))
+        doc_lengths.append(np.bincount(docs, weights=weights, minlength=len(df)).astype(np.float32))
+        
+        for name, column in FACETS.items():
+            values = facet_values[name]
+            codes, uniques = pd.factorize(df[column], use_na_sentinel=False)
+            mapped = np.array([values.setdefault(facet_value(value), len(values)) for value in uniques], dtype=np.int32)
+            facet_codes[name].append(mapped[codes])
+        for field in STORED_FIELDS:
+            stored[field].extend('' if pd.isna(value) else str(value) for value in df[field])
+        
+        documents += len(df)
+        print(f"  Indexed {documents:,} documents, {len(vocabulary):,} terms ({time.time() - start_time:.1f}s)")
+    
+    tmp_dir = index_dir.rstrip('/') + '.tmp'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    
+    # Lay the dictionary out in hash order so lookups are a binary search
+    hashes = np.array([term_hash(term) for term in vocabulary], dtype=np.uint64)
+    if len(np.unique(hashes)) != len(hashes):
+        raise RuntimeError("Term hash collision; the index cannot be built")
+    order = np.argsort(hashes)
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    post_terms = rank[np.concatenate([p[0] for p in postings])] if postings else np.empty(0, dtype=np.int64)
+    post_order = np.argsort(post_terms, kind='stable')
+    np.save(os.path.join(tmp_dir, 'term_hash.npy'), hashes[order])
+    np.save(os.path.join(tmp_dir, 'term_offsets.npy'), np.concatenate([[0], np.cumsum(np.bincount(post_terms, minlength=len(order)))]).astype(np.int64))
+    np.save(os.path.join(tmp_dir, 'post_docs.npy'), np.concatenate([p[1] for p in postings])[post_order] if postings else np.empty(0, dtype=np.int32))
+    np.save(os.path.join(tmp_dir, 'post_tf.npy'), np.concatenate([p[2] for p in postings])[post_order] if postings else np.empty(0, dtype=np.float32))
+    del postings, post_terms, post_order
+    
+    doc_length = np.concatenate(doc_lengths) if doc_lengths else np.empty(0, dtype=np.float32)
+    np.save(os.path.join(tmp_dir, 'doc_length.npy'), doc_length)
+    for name in FACETS:
+        np.save(os.path.join(tmp_dir, f'facet_{name}.npy'), np.concatenate(facet_codes[name]) if facet_codes[name] else np.empty(0, dtype=np.int32))
+    for field in STORED_FIELDS:
+        encoded = [value.encode() for value in stored[field]]
+        np.save(os.path.join(tmp_dir, f'stored_{field}.npy'), np.frombuffer(b''.join(encoded), dtype=np.uint8))
+        np.save(os.path.join(tmp_dir, f'stored_{field}_offsets.npy'), np.concatenate([[0], np.cumsum([len(value) for value in encoded])]).astype(np.int64))
+    
+    meta = {
+        'documents': documents,
+        'terms': len(vocabulary),
+        'avg_length': float(doc_length.mean()) if documents else 0.0,
+        'k1': K1,
+        'b': B,
+        'field_weights': FIELD_WEIGHTS,
+        'facets': {name: {'column': FACETS[name], 'values': list(facet_values[name])} for name in FACETS},
+        'source': source,
+        'built_at': datetime.now().isoformat(timespec='seconds')
+    }
+    with open(os.path.join(tmp_dir, META_FILE), 'w') as f:
+        json.dump(meta, f)
+    
+    shutil.rmtree(index_dir, ignore_errors=True)
+    os.replace(tmp_dir, index_dir)
+    print(f"✓ Built {index_dir}: {documents:,} documents, {len(vocabulary):,} terms ({time.time() - start_time:.1f}s)")
+    return meta
+
+class SearchIndex:
+    """BM25 keyword search with facet counts over an index written by build_index
+    
+    The arrays are memory-mapped, so opening is instant and pages are read
+    from disk as queries touch them; several processes serving the same
+    index share them through the page cache. No database or search
+    service is needed.
+    """
+    
+    def __init__(self, index_dir):
+        self.index_dir = index_dir
+        with open(os.path.join(index_dir, META_FILE)) as f:
+            self.meta = json.load(f)
+        self.documents = self.meta['documents']
+        self.term_hashes = self._load('term_hash')
+        self.term_offsets = self._load('term_offsets')
+        self.post_docs = self._load('post_docs')
+        self.post_tf = self._load('post_tf')
+        self.doc_length = self._load('doc_length')
+        self.facet_codes = {name: self._load(f'facet_{name}') for name in self.meta['facets']}
+        self.facet_values = {name: facet['values'] for name, facet in self.meta['facets'].items()}
+        self.facet_lookup = {name: {value: code for code, value in enumerate(values)} for name, values in self.facet_values.items()}
+        self.stored = {field: (self._load(f'stored_{field}'), self._load(f'stored_{field}_offsets')) for field in STORED_FIELDS}
+    
+    def _load(self, name):
+        return np.load(os.path.join(self.index_dir, f'{name}.npy'), mmap_mode='r')
+    
+    def postings(self, term):
+        """(documents, weighted term frequencies) for one term, empty if unknown"""
+        key = np.uint64(term_hash(term))
+        i = np.searchsorted(self.term_hashes, key)
+        if i == len(self.term_hashes) or self.term_hashes[i] != key:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
+        start, end = self.term_offsets[i], self.term_offsets[i + 1]
+        return self.post_docs[start:end], self.post_tf[start:end]
+    
+    def stored_value(self, field, doc):
+        blob, offsets = self.stored[field]
+        return blob[offsets[doc]:offsets[doc + 1]].tobytes().decode()
+    
+    def score(self, query):
+        """(matching documents, their BM25 scores) for any of the query's terms
+        
+        An empty query matches every document with a score of 0.
+        """
+        terms = list(dict.fromkeys(tokenize(pd.Series([query]))))
+        if not terms:
+            return np.arange(self.documents), np.zeros(self.documents, dtype=np.float32)
+        
+        k1, b, avg_length = self.meta['k1'], self.meta['b'], self.meta['avg_length']
+        scores = np.zeros(self.documents, dtype=np.float32)
+        matched = np.zeros(self.documents, dtype=bool)
+        for term in terms:
+            docs, tf = self.postings(term)
+            if len(docs) == 0:
+                continue
+            idf = np.log(1 + (self.documents - len(docs) + 0.5) / (len(docs) + 0.5))
+            norm = k1 * (1 - b + b * self.doc_length[docs] / avg_length)
+            scores[docs] += idf * tf * (k1 + 1) / (tf + norm)
+            matched[docs] = True
+        docs = np.flatnonzero(matched)
+        return docs, scores[docs]
+    
+    def search(self, query, filters=None, limit=20, offset=0, facet_limit=10):
+        """Ranked hits, facet counts and the total number of hits for a query
+        
+        filters maps facet names to a value or a list of values (any of
+        them matches). Each facet's counts apply every filter except its
+        own, so a UI can show the alternatives to a selected value.
+        Returns (hits DataFrame, {facet: counts DataFrame}, total).
+        """
+        filters = filters or {}
+        unknown = set(filters) - set(self.facet_codes)
+        if unknown:
+            raise ValueError(f"Unknown facets: {', '.join(sorted(unknown))}")
+        
+        docs, scores = self.score(query)
+        masks = {}
+        for name, wanted in filters.items():
+            wanted = wanted if isinstance(wanted, (list, tuple, set)) else [wanted]
+            codes = [self.facet_lookup[name][value] for value in wanted if value in self.facet_lookup[name]]
+            masks[name] = np.isin(self.facet_codes[name][docs], codes)
+        
+        keep = np.ones(len(docs), dtype=bool)
+        for mask in masks.values():
+            keep &= mask
+        hit_docs, hit_scores = docs[keep], scores[keep]
+        
+        # Best scores first, ties in document order; only the page is sorted
+        top = offset + limit
+        if len(hit_docs) > top:
+            candidates = np.argpartition(-hit_scores, top - 1)[:top]
+        else:
+            candidates = np.arange(len(hit_docs))
+        candidates = candidates[np.lexsort((hit_docs[candidates], -hit_scores[candidates]))][offset:top]
+        page = hit_docs[candidates]
+        
+        hits = pd.DataFrame({field: [self.stored_value(field, doc) for doc in page] for field in STORED_FIELDS})
+        for name in self.facet_codes:
+            values = self.facet_values[name]
+            hits[name] = [values[code] for code in self.facet_codes[name][page]]
+        hits['score'] = hit_scores[candidates]
+        
+        facets = {}
+        for name in self.facet_codes:
+            selected = np.ones(len(docs), dtype=bool)
+            for other, mask in masks.items():
+                if other != name:
+                    selected &= mask
+            counts = np.bincount(self.facet_codes[name][docs[selected]], minlength=len(self.facet_values[name]))
+            top_codes = np.argsort(-counts, kind='stable')[:facet_limit]
+            top_codes = top_codes[counts[top_codes] > 0]
+            facets[name] = pd.DataFrame({
+                'value': [self.facet_values[name][code] for code in top_codes],
+                'count': counts[top_codes]
+            })
+        return hits, facets, int(len(hit_docs))
+
+def parse_args():
+    """Parse command-line options for the search index CLI"""
+    parser = argparse.ArgumentParser(description="Build and query an embedded BM25 search index of archived_opportunities")
+    parser.add_argument(
+        '--index',
+        default=os.getenv('search_index_dir', 'data/search-index'),
+        help="Index directory (default: $search_index_dir or data/search-index)"
+    )
+    commands = parser.add_subparsers(dest='command', required=True)
+    
+    build = commands.add_parser('build', help="Build the index from a Parquet snapshot (analytics.py export) or --parquet-cache")
+    build.add_argument(
+        '--snapshot',
+        default=os.getenv('analytics_snapshot_dir', 'data/archive-snapshot'),
+        help="Snapshot directory, partitioned by fiscal_year (default: $analytics_snapshot_dir or data/archive-snapshot)"
+    )
+    build.add_argument('--fy', type=int, nargs='+', help="Only these fiscal years")
+    build.add_argument('--batch-size', type=int, default=100000, help="Rows per indexed chunk (default: 100000)")
+    
+    query = commands.add_parser('query', help="Search the index")
+    query.add_argument('query', nargs='?', default='', help="Search terms; empty browses every document")
+    query.add_argument('--agency', nargs='+', help="Only these departments/agencies")
+    query.add_argument('--naics', nargs='+', help="Only these NAICS codes")
+    query.add_argument('--set-aside', nargs='+', help="Only these set-asides")
+    query.add_argument('--state', nargs='+', help="Only these place-of-performance states")
+    query.add_argument('--fy', type=int, nargs='+', help="Only these fiscal years")
+    query.add_argument('--limit', type=int, default=10, help="Hits to show (default: 10)")
+    query.add_argument('--offset', type=int, default=0, help="Hits to skip (default: 0)")
+    query.add_argument('--facet-limit', type=int, default=5, help="Values to show per facet (default: 5)")
+    
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    
+    if args.command == 'build':
+        print(f"Indexing {args.snapshot} into {args.index}...")
+        build_index(snapshot_chunks(args.snapshot, args.fy, args.batch_size), args.index, source=os.path.abspath(args.snapshot))
+        return
+    
+    start_time = time.time()
+    index = SearchIndex(args.index)
+    opened = time.time() - start_time
+    
+    filters = {}
+    for name, values in [('agency', args.agency), ('naics', args.naics), ('set_aside', args.set_aside),
+                         ('state', args.state), ('fiscal_year', args.fy)]:
+        if values:
+            filters[name] = values
+    start_time = time.time()
+    hits, facets, total = index.search(args.query, filters, args.limit, args.offset, args.facet_limit)
+    elapsed = time.time() - start_time
+    
+    with pd.option_context('display.max_rows', None, 'display.max_colwidth', 50, 'display.width', 200):
+        print(hits.to_string(index=False))
+        for name, counts in facets.items():
+            print(f"\n{name}:")
+            print(counts.to_string(index=False, header=False))
+    print(f"\n{total:,} hits in {elapsed * 1000:.1f} ms (index opened in {opened * 1000:.1f} ms)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+import pandas as pd
+import numpy as np
+import os
+import csv
+import io
+import argparse
+from load_data import COLUMN_MAPPING
+
+# Header of the SAM.gov archive files, in their column order
+CSV_COLUMNS = list(COLUMN_MAPPING)
+
+AGENCIES = [
+    'DEPT OF DEFENSE', 'DEPARTMENT OF THE ARMY', 'DEPARTMENT OF THE NAVY', 'DEPARTMENT OF THE AIR FORCE',
+    'VETERANS AFFAIRS, DEPARTMENT OF', 'HOMELAND SECURITY, DEPARTMENT OF', 'GENERAL SERVICES ADMINISTRATION',
+    'HEALTH AND HUMAN SERVICES, DEPARTMENT OF', 'INTERIOR, DEPARTMENT OF THE', 'AGRICULTURE, DEPARTMENT OF',
+    'ENERGY, DEPARTMENT OF', 'TRANSPORTATION, DEPARTMENT OF', 'JUSTICE, DEPARTMENT OF',
+    'NATIONAL AERONAUTICS AND SPACE ADMINISTRATION', 'COMMERCE, DEPARTMENT OF'
+]
+
+NOTICE_TYPES = ['Award Notice', 'Presolicitation', 'Combined Synopsis/Solicitation', 'Sources Sought', 'Special Notice']
+
+SET_ASIDES = [
+    ('', ''), ('SBA', 'Total Small Business Set-Aside (FAR 19.5)'), ('8A', '8(a) Set-Aside (FAR 19.8)'),
+    ('SDVOSBC', 'Service-Disabled Veteran-Owned Small Business (SDVOSB) Set-Aside (FAR 19.14)'),
+    ('HZC', 'HUBZone Set-Aside (FAR 19.13)'), ('WOSB', 'Women-Owned Small Business (WOSB) Program Set-Aside (FAR 19.15)')
+]
+
+STATES = ['VA', 'MD', 'DC', 'CA', 'TX', 'FL', 'WA', 'CO', 'OH', 'GA', 'NC', 'AL', 'HI', 'AK', 'NY', 'PA']
+
+NAICS_CODES = ['236220', '237310', '238210', '334511', '336411', '423450', '485991', '517311', '541330', '541512',
+               '541519', '541611', '541715', '561210', '561720', '562910', '611430', '621111', '811219', '928110']
+
+WORDS = ('repair replace maintenance hvac roof runway hangar pier dredging janitorial services support '
+         'software license network cyber engineering design construction renovation building facility '
+         'medical supplies equipment vehicle fuel training lodging catering security guard fire alarm '
+         'elevator generator sewer water paving bridge survey environmental remediation lab analysis').split()
+
+# Characters that differ between utf-8 and cp1252, as in text pasted from Word
+SPECIAL_TEXT = ['Contractor’s', '“as is”', 'Café', 'Señor', '— see attached', 'résumé', '½ inch']
+
+def fiscal_year_days(fiscal_year):
+    """Every day of a federal fiscal year (October through September)"""
+    return pd.date_range(f'{fiscal_year - 1}-10-01', f'{fiscal_year}-09-30', freq='D')
+
+def notice_ids(seed, fiscal_year, count):
+    """Deterministic 32-character hex notice ids, distinct across seeds and fiscal years"""
+    return [f"{seed:04x}{fiscal_year:04x}{i:024x}" for i in range(count)]
+
+def make_records(fiscal_year, rows, rng, ids):
+    """Synthetic archive rows for one fiscal year as strings, keyed by CSV header
+    
+    Values are formatted as the SAM.gov extracts format them ("$1,234.50",
+    "Yes", dates with UTC offsets), with the same sparsity in optional
+    columns.
+    """
+    days = fiscal_year_days(fiscal_year)
+    posted = days[rng.integers(0, len(days), rows)]
+    
+    def sparse(values, share):
+        values = pd.Series(values, dtype=object)
+        values[rng.random(rows) < share] = ''
+        return values
+    
+    def pick(choices):
+        return np.array(choices, dtype=object)[rng.integers(0, len(choices), rows)]
+    
+    title_words = pick(WORDS), pick(WORDS), pick(WORDS)
+    titles = [f"{a.title()} {b} {c} - {posted_day:%B %Y}" for a, b, c, posted_day in zip(*title_words, posted)]
+    set_aside = rng.integers(0, len(SET_ASIDES), rows)
+    amounts = rng.integers(1000, 500_000_000, rows) / 100
+    agencies = pick(AGENCIES)
+    states = pick(STATES)
+    offsets = ['-05' if day.month < 3 or day.month > 10 else '-04' for day in posted]
+    
+    return pd.DataFrame({
+        'NoticeId': ids,
+        'Title': titles,
+        'Sol#': [f"W{n:05d}{fiscal_year % 100:02d}R{m:04d}" for n, m in zip(rng.integers(0, 99999, rows), rng.integers(0, 9999, rows))],
+        'Department/Ind.Agency': agencies,
+        'CGAC': [f"{n:03d}" for n in rng.integers(1, 100, rows)],
+        'Sub-Tier': agencies,
+        'FPDS Code': [f"{n:04d}" for n in rng.integers(1, 9999, rows)],
+        'Office': [f"CONTRACTING OFFICE {n}" for n in rng.integers(1, 500, rows)],
+        'AAC Code': [f"W{n:05d}" for n in rng.integers(1, 99999, rows)],
+        'PostedDate': [f"{day:%Y-%m-%d} {h:02d}:{m:02d}:{s:02d}.{ms:03d}{offset}" for day, h, m, s, ms, offset in
+                       zip(posted, rng.integers(0, 24, rows), rng.integers(0, 60, rows), rng.integers(0, 60, rows),
+                           rng.integers(0, 1000, rows), offsets)],
+        'Type': pick(NOTICE_TYPES),
+        'BaseType': pick(NOTICE_TYPES),
+        'ArchiveType': pick(['auto15', 'autocustom', 'manual']),
+        'ArchiveDate': [f"{day + pd.Timedelta(days=int(n)):%Y-%m-%d}" for day, n in zip(posted, rng.integers(15, 120, rows))],
+        'SetASideCode': [SET_ASIDES[i][0] for i in set_aside],
+        'SetASide': [SET_ASIDES[i][1] for i in set_aside],
+        'ResponseDeadLine': sparse([f"{day + pd.Timedelta(days=int(n)):%Y-%m-%d}T17:00:00{offset}:00"
+                                    for day, n, offset in zip(posted, rng.integers(7, 45, rows), offsets)], 0.3),
+        'NaicsCode': sparse(pick(NAICS_CODES), 0.05),
+        'ClassificationCode': [f"{chr(65 + int(n))}{m:03d}" for n, m in zip(rng.integers(0, 26, rows), rng.integers(0, 999, rows))],
+        'PopStreetAddress': sparse([f"{n} Main St" for n in rng.integers(1, 9999, rows)], 0.7),
+        'PopCity': sparse([f"City {n}" for n in rng.integers(1, 2000, rows)], 0.4),
+        'PopState': sparse(states, 0.3),
+        'PopZip': sparse([f"{n:05d}" for n in rng.integers(1000, 99999, rows)], 0.5),
+        'PopCountry': sparse(np.full(rows, 'USA', dtype=object), 0.3),
+        'Active': pick(['Yes', 'No', 'No', 'No']),
+        'AwardNumber': sparse([f"W{n:06d}-{fiscal_year % 100}-C-{m:04d}" for n, m in zip(rng.integers(0, 999999, rows), rng.integers(0, 9999, rows))], 0.6),
+        'AwardDate': sparse([f"{day + pd.Timedelta(days=int(n)):%Y-%m-%d}" for day, n in zip(posted, rng.integers(0, 60, rows))], 0.6),
+        'Award$': sparse([f"${amount:,.2f}" for amount in amounts], 0.6),
+        'Awardee': sparse([f"{a.title()} {b.title()} LLC" for a, b in zip(pick(WORDS), pick(WORDS))], 0.6),
+        'PrimaryContactTitle': sparse(pick(['Contracting Officer', 'Contract Specialist', 'Buyer']), 0.5),
+        'PrimaryContactFullname': [f"Contact {n}" for n in rng.integers(1, 5000, rows)],
+        'PrimaryContactEmail': [f"contact{n}@agency.gov" for n in rng.integers(1, 5000, rows)],
+        'PrimaryContactPhone': sparse([f"{n:010d}" for n in rng.integers(2000000000, 9999999999, rows)], 0.2),
+        'PrimaryContactFax': sparse([f"{n:010d}" for n in rng.integers(2000000000, 9999999999, rows)], 0.9),
+        'SecondaryContactTitle': sparse(pick(['Contracting Officer', 'Contract Specialist']), 0.8),
+        'SecondaryContactFullname': sparse([f"Contact {n}" for n in rng.integers(1, 5000, rows)], 0.7),
+        'SecondaryContactEmail': sparse([f"contact{n}@agency.gov" for n in rng.integers(1, 5000, rows)], 0.7),
+        'SecondaryContactPhone': sparse([f"{n:010d}" for n in rng.integers(2000000000, 9999999999, rows)], 0.8),
+        'SecondaryContactFax': sparse([f"{n:010d}" for n in rng.integers(2000000000, 9999999999, rows)], 0.95),
+        'OrganizationType': pick(['OFFICE', 'OFFICE', 'SUBTIER']),
+        'State': states,
+        'City': [f"City {n}" for n in rng.integers(1, 2000, rows)],
+        'ZipCode': [f"{n:05d}" for n in rng.integers(1000, 99999, rows)],
+        'CountryCode': np.full(rows, 'USA', dtype=object),
+        'AdditionalInfoLink': sparse([f"https://www.example.gov/doc/{n}" for n in rng.integers(1, 10 ** 6, rows)], 0.8),
+        'Link': [f"https://sam.gov/opp/{notice_id}/view" for notice_id in ids],
+        'Description': [' '.join(np.array(WORDS, dtype=object)[rng.integers(0, len(WORDS), n)]) for n in rng.integers(20, 200, rows)]
+    }, columns=CSV_COLUMNS)
+
+def write_fy_csv(csv_file_path, fiscal_year, rows=100_000, seed=0, duplicate_ids=None, duplicate_share=0.01,
+                 quirk_share=0.02, unicode_share=0.03, cp1252_share=0.01, bad_line_share=0.001):
+    """Write one synthetic FY CSV with the quirks of the real extracts; returns what was injected
+    
+    Every field is quoted with embedded quotes escaped by a backslash, as
+    in the SAM.gov files. On top of that, a share of rows:
+    - quirk_share: Description holds commas, newlines, backslash-escaped or
+      doubled quotes and literal backslashes, all correctly quoted
+    - unicode_share: non-ASCII text (curly quotes, accents) in utf-8
+    - cp1252_share: the same text written as Windows-1252 in an otherwise
+      utf-8 file
+    - bad_line_share: malformed, either extra unquoted fields or a stray
+      backslash before Description's closing quote, which runs the record
+      into the next line
+    - duplicate_share: notice ids repeated from duplicate_ids (e.g. an
+      earlier fiscal year) or from earlier in the same file
+    Output is byte-for-byte reproducible for a given seed.
+    """
+    rng = np.random.default_rng([seed, fiscal_year])
+    ids = pd.Series(notice_ids(seed, fiscal_year, rows), dtype=object)
+    duplicated = rng.random(rows) < duplicate_share
+    pool = list(duplicate_ids) if duplicate_ids is not None and len(duplicate_ids) else ids[:max(1, rows // 2)].tolist()
+    ids[duplicated] = np.array(pool, dtype=object)[rng.integers(0, len(pool), int(duplicated.sum()))]
+    records = make_records(fiscal_year, rows, rng, ids.tolist())
+    
+    kinds = rng.random(rows)
+    quirky = kinds < quirk_share
+    cp1252 = (kinds >= quirk_share) & (kinds < quirk_share + cp1252_share)
+    unicode = (kinds >= quirk_share + cp1252_share) & (kinds < quirk_share + cp1252_share + unicode_share)
+    bad = rng.random(rows) < bad_line_share
+    quirks = ['He said "urgent", then left', 'Line one\nLine two\r\nLine three', 'Path C:\\Temp\\bid.docx',
+              'Width 4" x 8\' sheets', 'Bring """quoted""" text', 'Ends with a backslash \\']
+    descriptions = records['Description'].to_numpy()
+    for i in np.flatnonzero(quirky):
+        descriptions[i] = f"{descriptions[i]} {quirks[rng.integers(0, len(quirks))]}"
+    for i in np.flatnonzero(cp1252 | unicode):
+        descriptions[i] = f"{SPECIAL_TEXT[rng.integers(0, len(SPECIAL_TEXT))]} {descriptions[i]}"
+    records['Description'] = descriptions
+    
+    buffer = io.StringIO()
+    escaped = csv.writer(buffer, quoting=csv.QUOTE_ALL, escapechar='\\', doublequote=False, lineterminator='\n')
+    doubled = csv.writer(buffer, quoting=csv.QUOTE_ALL, escapechar='\\', doublequote=True, lineterminator='\n')
+    bad_lines = 0
+    with open(csv_file_path, 'wb') as f:
+        f.write((','.join(CSV_COLUMNS) + '\n').encode('utf-8'))
+        for i, row in enumerate(records.itertuples(index=False, name=None)):
+            (doubled if quirky[i] and i % 2 else escaped).writerow(row)
+            line = buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            if bad[i]:
+                bad_lines += 1
+                if i % 2:
+                    line = line[:-1] + ',extra,"fields"\n'
+                else:
+                    line = line[:-2] + '\\"\n'
+            f.write(line.encode('cp1252', errors='replace') if cp1252[i] else line.encode('utf-8'))
+    
+    return {
+        'file': os.path.basename(csv_file_path),
+        'rows': rows,
+        'duplicates': int(duplicated.sum()),
+        'quirky_rows': int(quirky.sum()),
+        'unicode_rows': int(unicode.sum()),
+        'cp1252_rows': int(cp1252.sum()),
+        'bad_lines': bad_lines,
+        'bytes': os.path.getsize(csv_file_path)
+    }
+
+def generate_files(out_dir, fiscal_years, rows=100_000, seed=0, **options):
+    """Write FY<year>.csv for each fiscal year; each year repeats some notice ids of the year before
+    
+    Returns (paths, summaries).
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    paths, summaries = [], []
+    previous_ids = None
+    for fiscal_year in fiscal_years:
+        path = os.path.join(out_dir, f"FY{fiscal_year}.csv")
+        summaries.append(write_fy_csv(path, fiscal_year, rows, seed, duplicate_ids=previous_ids, **options))
+        paths.append(path)
+        previous_ids = notice_ids(seed, fiscal_year, rows)
+    return paths, summaries
+
+def main():
+    parser = argparse.ArgumentParser(description="Write synthetic SAM.gov FY CSVs with quoting quirks, mixed encodings and bad lines")
+    parser.add_argument('out_dir', help="Directory for the FY<year>.csv files")
+    parser.add_argument('--fy', type=int, nargs='+', default=[2015, 2016, 2017], help="Fiscal years to write (default: 2015 2016 2017)")
+    parser.add_argument('--rows', type=int, default=100_000, help="Rows per file (default: 100000)")
+    parser.add_argument('--seed', type=int, default=0, help="Random seed (default: 0)")
+    parser.add_argument('--duplicate-share', type=float, default=0.01, help="Share of rows repeating a notice id (default: 0.01)")
+    parser.add_argument('--quirk-share', type=float, default=0.02, help="Share of rows with quoting quirks in Description (default: 0.02)")
+    parser.add_argument('--unicode-share', type=float, default=0.03, help="Share of rows with non-ASCII utf-8 text (default: 0.03)")
+    parser.add_argument('--cp1252-share', type=float, default=0.01, help="Share of rows written as Windows-1252 (default: 0.01)")
+    parser.add_argument('--bad-line-share', type=float, default=0.001, help="Share of malformed rows (default: 0.001)")
+    args = parser.parse_args()
+    
+    _, summaries = generate_files(args.out_dir, args.fy, args.rows, args.seed, duplicate_share=args.duplicate_share,
+                                  quirk_share=args.quirk_share, unicode_share=args.unicode_share, cp1252_share=args.cp1252_share,
+                                  bad_line_share=args.bad_line_share)
+    for summary in summaries:
+        print(f"✓ {summary['file']}: {summary['rows']} rows, {summary['duplicates']} duplicate ids, "
+              f"{summary['quirky_rows']} quirky, {summary['unicode_rows']} unicode, {summary['cp1252_rows']} cp1252, {summary['bad_lines']} bad lines, "
+              f"{summary['bytes'] / 1024 / 1024:.1f} MB")
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -1,9 +1,9 @@
 #!/usr/bin/env python3
 import pandas as pd
 import psycopg2
-from sqlalchemy import create_engine, text
-import os
+from sqlalchemy import text
 from dotenv import load_dotenv
+from db import connection_params, get_engine, uses_pgbouncer
 
 # Load environment variables
 load_dotenv()
@@ -12,13 +12,7 @@ def test_database_connection():
     """Test database connection and table existence"""
     
     # Supabase database connection parameters from environment
-    db_params = {
-        'host': os.getenv('supabase_url', 'db.urilshgkjcbwatvkjgda.supabase.co'),
-        'port': os.getenv('supabase_port', '5432'),
-        'database': os.getenv('supbase_database', 'postgres'),
-        'user': os.getenv('supbaabase_username', 'postgres'),
-        'password': os.getenv('supabase_pswd')
-    }
+    db_params = connection_params()
     
     print("Database connection parameters:")
     for key, value in db_params.items():
@@ -26,10 +20,11 @@ def test_database_connection():
             print(f"  {key}: {'*' * len(str(value)) if value else 'None'}")
         else:
             print(f"  {key}: {value}")
+    print(f"  pgbouncer: {uses_pgbouncer(db_params)}")
     
     try:
-        # Create SQLAlchemy engine for Supabase
-        engine = create_engine(f"postgresql://{db_params['user']}:{db_params['password']}@{db_params['host']}:{db_params['port']}/{db_params['database']}")
+        # Shared pooled engine for Supabase
+        engine = get_engine(pool_size=1, max_overflow=0, application_name='test_connection')
         
         # Test connection
         with engine.connect() as conn:
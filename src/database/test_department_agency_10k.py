@@ -1,10 +1,12 @@
 #!/usr/bin/env python3
 import pandas as pd
 import psycopg2
-from sqlalchemy import create_engine, text
-import os
+from sqlalchemy import text
+import argparse
 from dotenv import load_dotenv
-import time
+from db import get_engine
+from backfill import run_backfill, department_agency_update_sql
+from instrumentation import recording_scope, stage, profiled, add_instrumentation_args, start_from_args
 
 # Load environment variables
 load_dotenv()
@@ -98,69 +100,35 @@ def load_agencies_to_test_table(engine, agencies_df):
     )
     print(f"✓ Successfully loaded {len(agencies_df)} agencies")
 
-def test_foreign_key_update(engine):
-    """Test updating foreign keys with progress monitoring"""
+def test_foreign_key_update(engine, workers=4):
+    """Test updating foreign keys with the keyset backfill and its progress reporting"""
     print("\nTesting foreign key updates with progress monitoring...")
     
     with engine.connect() as conn:
-        # Add foreign key column
-        conn.execute(text("ALTER TABLE test_archived_opportunities_10k ADD COLUMN department_agency_id INTEGER"))
+        # Add foreign key column, replacing one copied from an already backfilled table
+        conn.execute(text("""
+            ALTER TABLE test_archived_opportunities_10k
+            DROP COLUMN IF EXISTS department_agency_id,
+            ADD COLUMN department_agency_id INTEGER
+        """))
         conn.commit()
         print("✓ Added department_agency_id column")
-        
-        # Get total count for progress tracking
-        result = conn.execute(text("SELECT COUNT(*) FROM test_archived_opportunities_10k WHERE department_agency IS NOT NULL"))
-        total_records = result.scalar()
-        print(f"Total records to update: {total_records}")
-        
-        # Update in chunks for progress monitoring
-        chunk_size = 1000
-        updated_total = 0
-        
-        start_time = time.time()
-        
-        for offset in range(0, total_records, chunk_size):
-            chunk_start = time.time()
-            
-            # Update chunk
-            update_query = """
-            UPDATE test_archived_opportunities_10k 
-            SET department_agency_id = da.id
-            FROM test_department_agency da
-            WHERE TRIM(test_archived_opportunities_10k.department_agency) = da.agency_name
-              AND test_archived_opportunities_10k.id IN (
-                  SELECT id FROM test_archived_opportunities_10k 
-                  WHERE department_agency IS NOT NULL 
-                  ORDER BY id 
-                  LIMIT :chunk_size OFFSET :offset
-              )
-            """
-            
-            result = conn.execute(text(update_query), {
-                'chunk_size': chunk_size,
-                'offset': offset
-            })
-            updated_count = result.rowcount
-            updated_total += updated_count
-            
-            chunk_time = time.time() - chunk_start
-            elapsed_time = time.time() - start_time
-            
-            progress = (offset + chunk_size) / total_records * 100
-            estimated_total_time = elapsed_time / (progress / 100) if progress > 0 else 0
-            remaining_time = estimated_total_time - elapsed_time
-            
-            print(f"  Chunk {offset//chunk_size + 1}: Updated {updated_count} records in {chunk_time:.2f}s")
-            print(f"  Progress: {progress:.1f}% | Elapsed: {elapsed_time:.1f}s | Est. remaining: {remaining_time:.1f}s")
-            
-            conn.commit()
-            
-            if offset + chunk_size >= total_records:
-                break
-        
-        total_time = time.time() - start_time
-        print(f"\n✓ Updated {updated_total} records in {total_time:.2f} seconds")
-        print(f"Average: {updated_total/total_time:.1f} records/second")
+    
+    # CREATE TABLE AS does not copy the primary key; the keyset ranges need an index on id
+    with engine.connect() as conn:
+        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_test_10k_id ON test_archived_opportunities_10k(id)"))
+        conn.commit()
+    
+    # Small ranges so the 10k-row test still exercises several parallel ranges
+    run_backfill(
+        engine,
+        'department_agency_id:test_archived_opportunities_10k',
+        'test_archived_opportunities_10k',
+        department_agency_update_sql('test_archived_opportunities_10k', 'test_department_agency'),
+        batch_size=1000,
+        workers=workers,
+        restart=True
+    )
 
 def verify_results(engine):
     """Verify the results of the test"""
@@ -204,43 +172,54 @@ def cleanup_test_tables(engine):
         conn.execute(text("""
             DROP TABLE IF EXISTS test_archived_opportunities_10k;
             DROP TABLE IF EXISTS test_department_agency;
+            DELETE FROM backfill_job WHERE job_name = 'department_agency_id:test_archived_opportunities_10k';
         """))
         conn.commit()
         print("✓ Test tables cleaned up")
 
+def parse_args():
+    """Parse command-line options for the 10k test"""
+    parser = argparse.ArgumentParser(description="Test the department_agency setup and backfill on 10,000 records")
+    parser.add_argument('--workers', type=int, default=4, help="Backfill workers (default: 4)")
+    add_instrumentation_args(parser)
+    return parser.parse_args()
+
 def main():
-    # Database connection parameters
-    db_params = {
-        'host': os.getenv('supabase_url', 'db.urilshgkjcbwatvkjgda.supabase.co'),
-        'port': os.getenv('supabase_port', '5432'),
-        'database': os.getenv('supbase_database', 'postgres'),
-        'user': os.getenv('supbaabase_username', 'postgres'),
-        'password': os.getenv('supabase_pswd')
-    }
+    args = parse_args()
+    start_from_args(args)
     
-    # Create SQLAlchemy engine
-    engine = create_engine(f"postgresql://{db_params['user']}:{db_params['password']}@{db_params['host']}:{db_params['port']}/{db_params['database']}")
+    # Shared pooled engine
+    engine = get_engine(application_name='test_department_agency_10k')
     
     try:
         print("=== TESTING DEPARTMENT AGENCY SETUP ON 10K RECORDS ===\n")
         
-        # Step 1: Create test table
-        create_test_table(engine)
-        
-        # Step 2: Extract unique agencies
-        agencies_df = extract_unique_agencies_test(engine)
-        
-        # Step 3: Create test department_agency table
-        create_test_department_agency_table(engine)
-        
-        # Step 4: Load agencies
-        load_agencies_to_test_table(engine, agencies_df)
-        
-        # Step 5: Test foreign key updates with progress
-        test_foreign_key_update(engine)
-        
-        # Step 6: Verify results
-        verify_results(engine)
+        with profiled(args.profile), recording_scope('test_department_agency_10k'):
+            # Step 1: Create test table
+            with stage('create_test_table'):
+                create_test_table(engine)
+            
+            # Step 2: Extract unique agencies
+            with stage('extract_agencies') as rows:
+                agencies_df = extract_unique_agencies_test(engine)
+                rows.rows_out = len(agencies_df)
+            
+            # Step 3: Create test department_agency table
+            with stage('create_agency_table'):
+                create_test_department_agency_table(engine)
+            
+            # Step 4: Load agencies
+            with stage('load_agencies', rows_in=len(agencies_df)):
+                load_agencies_to_test_table(engine, agencies_df)
+            
+            # Step 5: Test foreign key updates with progress (the backfill
+            # records its ranges under its own job name)
+            with stage('backfill'):
+                test_foreign_key_update(engine, args.workers)
+            
+            # Step 6: Verify results
+            with stage('verify'):
+                verify_results(engine)
         
         print("\n=== TEST COMPLETED SUCCESSFULLY ===")
         print("Review the results above. If everything looks good,")
@@ -252,7 +231,7 @@ def main():
             cleanup_test_tables(engine)
         else:
             print("Test tables preserved for further inspection.")
-        
+    
     except Exception as e:
         print(f"Error: {str(e)}")
         raise
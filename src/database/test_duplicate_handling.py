@@ -1,44 +1,46 @@
 #!/usr/bin/env python3
 import pandas as pd
 import psycopg2
-from sqlalchemy import create_engine, text
+from sqlalchemy import text
 import os
 import re
+import argparse
 from datetime import datetime
 from dotenv import load_dotenv
+from db import get_engine
+from bad_lines import Quarantine, open_clean_csv
+from parquet_cache import read_archive
 
 # Load environment variables
 load_dotenv()
 
-def test_duplicate_handling():
+def test_duplicate_handling(cache_dir=None):
     """Test the duplicate handling logic"""
     csv_file_path = '/Users/daltonallen/Documents/projects/00-active/gov-contract/data/historical-opportnity-database/FY2015_archived_opportunities.csv'
     
-    print(f"Testing duplicate handling with {csv_file_path}...")
+    print(f"Testing duplicate handling with {cache_dir or csv_file_path}...")
     
     # Database connection
-    db_params = {
-        'host': os.getenv('supabase_url', 'db.urilshgkjcbwatvkjgda.supabase.co'),
-        'port': os.getenv('supabase_port', '6543'),
-        'database': os.getenv('supbase_database', 'postgres'),
-        'user': os.getenv('supbaabase_username', 'postgres'),
-        'password': os.getenv('supabase_pswd')
-    }
-    
-    engine = create_engine(f"postgresql://{db_params['user']}:{db_params['password']}@{db_params['host']}:{db_params['port']}/{db_params['database']}")
-    
-    # Read a small sample
-    df = pd.read_csv(
-        csv_file_path, 
-        encoding='latin-1',
-        quoting=1,
-        escapechar='\\',
-        on_bad_lines='skip',
-        engine='python',
-        nrows=20  # Read 20 rows for testing
-    )
+    engine = get_engine(pool_size=1, max_overflow=0, application_name='test_duplicate_handling')
     
-    print(f"  Read {len(df)} rows from CSV")
+    if cache_dir:
+        # Cached rows are already cleaned and renamed; notice_id is the only
+        # column the duplicate check needs
+        df = read_archive(cache_dir, columns=['notice_id'], fiscal_years=[2015]).head(20)
+        print(f"  Read {len(df)} rows from {cache_dir}")
+    else:
+        # Read a small sample, setting malformed records aside
+        quarantine = Quarantine(csv_file_path, 2015, encoding='latin-1')
+        with open_clean_csv(csv_file_path, quarantine) as f:
+            df = pd.read_csv(
+                f, 
+                encoding='latin-1',
+                quoting=1,
+                escapechar='\\',
+                nrows=20  # Read 20 rows for testing
+            )
+        
+        print(f"  Read {len(df)} rows from CSV ({quarantine.malformed} malformed records set aside)")
     
     # Clean column names
     df.columns = df.columns.str.strip().str.replace('"', '')
@@ -98,14 +100,17 @@ def test_duplicate_handling():
     df = df.rename(columns=column_mapping)
     df['fiscal_year'] = 2015
     
-    # Get existing notice_ids
+    # Ask the database which of the sample's notice_ids already exist instead
+    # of pulling every notice_id in the table
+    sample_notice_ids = [str(n) for n in df['notice_id'].dropna().unique()] if 'notice_id' in df.columns else []
     with engine.connect() as conn:
-        existing_notice_ids = set()
-        result = conn.execute(text("SELECT notice_id FROM archived_opportunities WHERE notice_id IS NOT NULL"))
-        for row in result:
-            existing_notice_ids.add(row[0])
+        result = conn.execute(
+            text("SELECT notice_id FROM archived_opportunities WHERE notice_id = ANY(:notice_ids)"),
+            {'notice_ids': sample_notice_ids}
+        )
+        existing_notice_ids = {row[0] for row in result}
     
-    print(f"  Found {len(existing_notice_ids)} existing notice_ids in database")
+    print(f"  Found {len(existing_notice_ids)} of {len(sample_notice_ids)} sample notice_ids in database")
     
     # Check which records would be duplicates
     if 'notice_id' in df.columns:
@@ -126,4 +131,11 @@ def test_duplicate_handling():
     print("  ✓ Duplicate handling test completed")
 
 if __name__ == "__main__":
-    test_duplicate_handling() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Test the duplicate handling logic")
+    parser.add_argument(
+        '--parquet-cache',
+        metavar='DIR',
+        help="Read the sample from the cleaned Parquet dataset written by load_data.py --parquet-cache instead of the CSV"
+    )
+    args = parser.parse_args()
+    test_duplicate_handling(cache_dir=args.parquet_cache) 
\ No newline at end of file
@@ -1,11 +1,15 @@
 #!/usr/bin/env python3
 import pandas as pd
 import psycopg2
-from sqlalchemy import create_engine
 import os
 import re
+import argparse
 from datetime import datetime
 from dotenv import load_dotenv
+from db import get_engine
+from bad_lines import Quarantine, open_clean_csv
+from load_data import COLUMN_MAPPING
+from parquet_cache import read_archive
 
 # Load environment variables
 load_dotenv()
@@ -16,19 +20,22 @@ def test_load_small_sample():
     
     print(f"Testing load with {csv_file_path}...")
     
-    # Try reading with proper quote handling
+    # Try reading with proper quote handling; malformed records are set
+    # aside by the quarantine instead of skipped
     try:
-        df = pd.read_csv(
-            csv_file_path, 
-            low_memory=False, 
-            encoding='latin-1',
-            quoting=1,  # QUOTE_ALL - handle quoted fields properly
-            escapechar='\\',  # Handle escaped characters
-            on_bad_lines='skip',  # Skip problematic lines
-            nrows=10  # Only read first 10 rows for testing
-        )
+        quarantine = Quarantine(csv_file_path, 2015, encoding='latin-1')
+        with open_clean_csv(csv_file_path, quarantine) as f:
+            df = pd.read_csv(
+                f, 
+                low_memory=False, 
+                encoding='latin-1',
+                quoting=1,  # QUOTE_ALL - handle quoted fields properly
+                escapechar='\\',  # Handle escaped characters
+                nrows=10  # Only read first 10 rows for testing
+            )
         
         print(f"  Successfully read {len(df)} rows")
+        print(f"  Quarantine: {quarantine.summary()}")
         print(f"  Columns: {list(df.columns)}")
         
         # Clean column names by removing quotes and extra whitespace
@@ -111,22 +118,46 @@ def test_load_small_sample():
         print(df[['notice_id', 'title', 'award_amount', 'fiscal_year']].head(3))
         
         # Test database connection and load
-        db_params = {
-            'host': os.getenv('supabase_url', 'db.urilshgkjcbwatvkjgda.supabase.co'),
-            'port': os.getenv('supabase_port', '5432'),
-            'database': os.getenv('supbase_database', 'postgres'),
-            'user': os.getenv('supbaabase_username', 'postgres'),
-            'password': os.getenv('supabase_pswd')
-        }
-        
-        engine = create_engine(f"postgresql://{db_params['user']}:{db_params['password']}@{db_params['host']}:{db_params['port']}/{db_params['database']}")
+        engine = get_engine(pool_size=1, max_overflow=0, application_name='test_load')
         
         # Load to database
         df.to_sql('archived_opportunities', engine, if_exists='append', index=False, method='multi', chunksize=1000)
         print(f"  ✓ Successfully loaded {len(df)} records to database")
+    
+    except Exception as e:
+        print(f"  ✗ Error: {str(e)}")
+
+def test_load_cached_sample(cache_dir, fiscal_year=2015, nrows=10):
+    """Test loading a small sample of the cleaned Parquet archive"""
+    print(f"Testing load with {cache_dir}...")
+    
+    # Cached rows are already cleaned and renamed, so only the mapped columns
+    # the load writes are read, for one fiscal year
+    try:
+        df = read_archive(cache_dir, columns=list(COLUMN_MAPPING.values()), fiscal_years=[fiscal_year]).head(nrows)
+        df['fiscal_year'] = fiscal_year
         
+        print(f"  Successfully read {len(df)} rows")
+        print(f"  Sample data:")
+        print(df[['notice_id', 'title', 'award_amount', 'fiscal_year']].head(3))
+        
+        engine = get_engine(pool_size=1, max_overflow=0, application_name='test_load')
+        df.to_sql('archived_opportunities', engine, if_exists='append', index=False, method='multi', chunksize=1000)
+        print(f"  ✓ Successfully loaded {len(df)} records to database")
+    
     except Exception as e:
         print(f"  ✗ Error: {str(e)}")
 
 if __name__ == "__main__":
-    test_load_small_sample() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Test loading a small sample of data")
+    parser.add_argument(
+        '--parquet-cache',
+        metavar='DIR',
+        help="Read the sample from the cleaned Parquet dataset written by load_data.py --parquet-cache instead of the CSV"
+    )
+    args = parser.parse_args()
+    
+    if args.parquet_cache:
+        test_load_cached_sample(args.parquet_cache)
+    else:
+        test_load_small_sample() 
\ No newline at end of file
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+import os
+import shutil
+import tempfile
+from synthetic_csv import write_fy_csv
+from load_data import detect_encoding, iter_source_chunks
+from manifest import file_fingerprint
+
+def test_resume_from_cache(rows=20000, chunk_size=3000, cache_chunk_size=7000):
+    """Check that a resume checkpoint taken on the CSV means the same rows when resuming from the Parquet cache
+    
+    The cache is built with another chunk size (as by --cache-only), so its
+    row groups do not line up with the chunks of the load. Resuming after
+    any checkpoint must give the rows the CSV path gives after it, and
+    together with the chunks before it every row of the file exactly once,
+    the repaired malformed records included.
+    """
+    work_dir = tempfile.mkdtemp(prefix='test_resume_')
+    try:
+        csv_file_path = os.path.join(work_dir, 'FY2015.csv')
+        injected = write_fy_csv(csv_file_path, 2015, rows=rows, bad_line_share=0.005)
+        print(f"Testing resume from cache with {rows} rows, {injected['bad_lines']} malformed records...")
+        
+        encoding, encoding_errors = detect_encoding(csv_file_path)
+        content_hash, _ = file_fingerprint(csv_file_path)
+        cache_dir = os.path.join(work_dir, 'cache')
+        for _ in iter_source_chunks(csv_file_path, 2015, encoding, encoding_errors, cache_chunk_size,
+                                    cache_dir=cache_dir, content_hash=content_hash):
+            pass
+        
+        def chunks(start_chunk, from_cache):
+            return [(chunk_index, chunk['notice_id'].tolist())
+                    for chunk_index, chunk in iter_source_chunks(csv_file_path, 2015, encoding, encoding_errors, chunk_size,
+                                                                 start_chunk=start_chunk,
+                                                                 cache_dir=cache_dir if from_cache else None,
+                                                                 content_hash=content_hash)]
+        
+        from_csv = chunks(0, from_cache=False)
+        all_ids = [notice_id for _, ids in from_csv for notice_id in ids]
+        failures = 0
+        if len(all_ids) != rows:
+            print(f"  ✗ CSV path yielded {len(all_ids)} of {rows} rows")
+            failures += 1
+        
+        for checkpoint in range(len(from_csv)):
+            resumed = chunks(checkpoint + 1, from_cache=True)
+            loaded = [notice_id for _, ids in from_csv[:checkpoint + 1] + resumed for notice_id in ids]
+            if resumed != from_csv[checkpoint + 1:] or loaded != all_ids:
+                print(f"  ✗ Resuming from the cache after chunk {checkpoint} loads {len(loaded)} rows, expected {len(all_ids)}")
+                failures += 1
+        
+        if failures:
+            print(f"✗ {failures} checks failed")
+        else:
+            print(f"✓ Resuming from the cache after each of {len(from_csv)} checkpoints loads every row exactly once")
+        return failures == 0
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    test_resume_from_cache()
\ No newline at end of file
@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+import pandas as pd
+import numpy as np
+from sqlalchemy import text
+import os
+import zlib
+import difflib
+import time
+import argparse
+from dotenv import load_dotenv
+from db import get_engine, insert_rows
+from backfill import id_bounds
+from normalize_schema import physical_table
+
+# Load environment variables
+load_dotenv()
+
+VENDOR_SQL_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'create_vendor_tables.sql')
+
+# Legal-form words dropped from the end of a name ("ACME, INC." -> "ACME")
+LEGAL_SUFFIXES = [
+    'INCORPORATED', 'INC', 'CORPORATION', 'CORP', 'COMPANY', 'CO', 'LIMITED', 'LTD',
+    'L L C', 'LLC', 'L L P', 'LLP', 'L P', 'LP', 'PLLC', 'P C', 'PC', 'P A', 'PA'
+]
+
+# Placeholder awardees that are not vendors
+IGNORED_NAMES = {'', 'NA', 'N A', 'NONE', 'UNKNOWN', 'TBD', 'VARIOUS', 'MULTIPLE', 'MULTIPLE AWARDEES', 'SEE ATTACHED'}
+
+SHINGLE_SIZE = 3
+NUM_HASHES = 40
+BANDS = 10
+MAX_BUCKET = 500
+THRESHOLD = 0.6
+
+# Seconds between checks while waiting for in-flight loads to finish
+WAIT_POLL_SECONDS = 1
+
+# Words in more than this share of names ("SERVICES", "SOLUTIONS") say
+# little about identity and are left out of comparisons
+GENERIC_SHARE = 0.01
+
+# Fixed seed so signatures, and therefore runs, are reproducible
+MERSENNE_PRIME = (1 << 31) - 1
+_rng = np.random.default_rng(20240601)
+HASH_A = _rng.integers(1, MERSENNE_PRIME, NUM_HASHES, dtype=np.int64)
+HASH_B = _rng.integers(0, MERSENNE_PRIME, NUM_HASHES, dtype=np.int64)
+
+def normalize_names(names):
+    """Comparable form of awardee names: upper case, punctuation and legal suffixes removed
+    
+    "The Acme Co., L.L.C. d/b/a Acme Labs" becomes "ACME". Works on a
+    Series and returns one.
+    """
+    suffixes = '|'.join(LEGAL_SUFFIXES)
+    normalized = (names.astype('string').fillna('').str.upper()
+                  .str.replace(r'\s+(D/?B/?A|DBA)\s.*$', '', regex=True)
+                  .str.replace('&', ' AND ', regex=False)
+                  .str.replace(r'[^A-Z0-9]+', ' ', regex=True)
+                  .str.strip()
+                  .str.replace(r'^THE\s+', '', regex=True)
+                  .str.replace(rf'(\s+({suffixes}))+$', '', regex=True)
+                  .str.replace(r'\s+', ' ', regex=True)
+                  .str.strip())
+    return normalized.where(~normalized.isin(IGNORED_NAMES), '')
+
+def split_generic(names, share=GENERIC_SHARE):
+    """Split names into their distinctive part and their set of generic words
+    
+    Misspelled generic words ("SERVCIES") count as the generic word. A name
+    made only of generic words is kept whole as its distinctive part.
+    """
+    tokens = pd.Series(names).str.split().explode()
+    counts = tokens.value_counts()
+    generic_words = counts.index[counts > share * len(names)].tolist()
+    misspelled = {}
+    for token in counts.index[counts <= share * len(names)]:
+        if len(token) >= 5:
+            close = difflib.get_close_matches(token, generic_words, n=1, cutoff=0.85)
+            if close:
+                misspelled[token] = close[0]
+    tokens = tokens.replace(misspelled)
+    is_generic = tokens.isin(generic_words)
+    kept = tokens[~is_generic].groupby(level=0).agg(' '.join).reindex(range(len(names)))
+    generic = tokens[is_generic].groupby(level=0).agg(frozenset).reindex(range(len(names)))
+    distinctive = np.where(kept.isna(), names, kept).astype(object)
+    return distinctive, [words if isinstance(words, frozenset) else frozenset() for words in generic]
+
+def shingles(name):
+    """Character shingles of a name with its spaces removed (the whole name when shorter than a shingle)
+    
+    Dropping spaces makes "PUMP CONTRO LSOLUTIONS" and "PUMP CONTROL
+    SOLUTIONS" the same string.
+    """
+    name = name.replace(' ', '')
+    if len(name) <= SHINGLE_SIZE:
+        return {name}
+    return {name[i:i + SHINGLE_SIZE] for i in range(len(name) - SHINGLE_SIZE + 1)}
+
+def minhash_signatures(shingle_sets, block_size=20000):
+    """MinHash signature (NUM_HASHES values) of each shingle set, computed in blocks to bound memory"""
+    signatures = np.empty((len(shingle_sets), NUM_HASHES), dtype=np.int64)
+    for start in range(0, len(shingle_sets), block_size):
+        block = shingle_sets[start:start + block_size]
+        lengths = np.array([len(s) for s in block])
+        hashes = np.fromiter((zlib.crc32(shingle.encode()) & 0x7FFFFFFF for s in block for shingle in s), dtype=np.int64, count=int(lengths.sum()))
+        permuted = (hashes[:, None] * HASH_A + HASH_B) % MERSENNE_PRIME
+        offsets = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+        signatures[start:start + len(block)] = np.minimum.reduceat(permuted, offsets, axis=0)
+    return signatures
+
+def bucket_pairs(keys, max_bucket=MAX_BUCKET):
+    """All (i, j) index pairs, i < j, that share a key, skipping buckets larger than max_bucket
+    
+    Buckets are grouped by size so the pairs of every bucket of one size
+    come out of a single vectorized step.
+    """
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+    starts = np.flatnonzero(np.concatenate([[True], sorted_keys[1:] != sorted_keys[:-1]]))
+    sizes = np.diff(np.concatenate([starts, [len(keys)]]))
+    pairs = [np.empty((0, 2), dtype=np.int64)]
+    for size in np.unique(sizes[(sizes > 1) & (sizes <= max_bucket)]):
+        bucket_starts = starts[sizes == size]
+        members = order[bucket_starts[:, None] + np.arange(size)]
+        i, j = np.triu_indices(size, 1)
+        pairs.append(np.stack([members[:, i].ravel(), members[:, j].ravel()], axis=1))
+    pairs = np.concatenate(pairs)
+    return np.sort(pairs, axis=1)
+
+def candidate_pairs(names, signatures):
+    """Blocked candidate pairs (a shared MinHash band, or shared rarest tokens) and which came from tokens
+    
+    Bands of NUM_HASHES / BANDS rows make pairs above roughly the
+    similarity threshold very likely to share at least one band while most
+    dissimilar pairs share none, so only a small fraction of all pairs is
+    ever compared.
+    """
+    rows = NUM_HASHES // BANDS
+    blocks = []
+    for band in range(BANDS):
+        band_values = signatures[:, band * rows:(band + 1) * rows]
+        keys = np.zeros(len(names), dtype=np.uint64)
+        for column in range(rows):
+            keys = keys * np.uint64(1000003) + band_values[:, column].astype(np.uint64)
+        blocks.append(bucket_pairs(keys))
+    
+    # Token blocking on each name's two rarest words catches reordered
+    # words ("SMITH JOHN" / "JOHN SMITH") that share few shingles
+    tokens = pd.Series(names).str.split().explode().rename('token').to_frame()
+    tokens['frequency'] = tokens['token'].map(tokens['token'].value_counts()).to_numpy()
+    rarest = tokens.reset_index().sort_values(['index', 'frequency', 'token']).groupby('index').head(2)
+    token_keys = rarest.sort_values(['index', 'token']).groupby('index')['token'].agg(' '.join)
+    codes, _ = pd.factorize(token_keys)
+    keys = np.full(len(names), -1, dtype=np.int64)
+    keys[token_keys.index.to_numpy()] = codes
+    token_pairs = bucket_pairs(keys)
+    
+    pairs = np.unique(np.concatenate(blocks + [token_pairs]), axis=0)
+    token_blocked = np.isin(pairs[:, 0] * len(names) + pairs[:, 1], token_pairs[:, 0] * len(names) + token_pairs[:, 1])
+    return pairs, token_blocked
+
+def matching_pairs(pairs, token_blocked, signatures, shingle_sets, distinctive, generic, threshold, block_size=1000000):
+    """Candidate pairs whose shingle Jaccard similarity reaches threshold and whose words agree
+    
+    Generic words agree when one name's are a subset of the other's, so
+    "ACME" matches "ACME SERVICES" but "ACME SERVICES" does not match
+    "ACME SYSTEMS"; distinctive words must agree as tokens_agree. The
+    MinHash estimate discards clear non-matches in bulk
+    first (with a margin of about three standard deviations), and the
+    exact similarity is only computed for the rest.
+    
+    Pairs that share their rarest tokens (token_blocked) skip the
+    similarity test: shingles depend on word order, so "SMITH JOHN" and
+    "JOHN SMITH" fall below it, and tokens_agree alone decides.
+    """
+    matches = [np.empty((0, 2), dtype=np.int64)]
+    for start in range(0, len(pairs), block_size):
+        block = pairs[start:start + block_size]
+        by_tokens = token_blocked[start:start + block_size]
+        estimate = (signatures[block[:, 0]] == signatures[block[:, 1]]).mean(axis=1)
+        kept = by_tokens | (estimate >= threshold - 0.2)
+        block, by_tokens = block[kept], by_tokens[kept]
+        keep = np.array([(generic[i] <= generic[j] or generic[j] <= generic[i]) and
+                         (tokens or len(shingle_sets[i] & shingle_sets[j]) / len(shingle_sets[i] | shingle_sets[j]) >= threshold) and
+                         tokens_agree(distinctive[i], distinctive[j])
+                         for (i, j), tokens in zip(block, by_tokens)], dtype=bool)
+        matches.append(block[keep] if len(block) else block)
+    return np.concatenate(matches)
+
+def tokens_agree(a, b, cutoff=0.8):
+    """True when every word of each name closely matches some word of the other
+    
+    Keeps two names that merely share one long word ("TELECOMMUNICATIONS
+    PIPE" / "TELECOMMUNICATIONS RADIO") from matching on shingles alone.
+    Words with digits must match exactly, so "X 111 SERVICES" and
+    "X 1111 SERVICES" stay apart.
+    """
+    words_a, words_b = a.split(), b.split()
+    numbers_a = {word for word in words_a if any(character.isdigit() for character in word)}
+    numbers_b = {word for word in words_b if any(character.isdigit() for character in word)}
+    if numbers_a != numbers_b:
+        return False
+    return (all(difflib.get_close_matches(word, words_b, n=1, cutoff=cutoff) for word in words_a) and
+            all(difflib.get_close_matches(word, words_a, n=1, cutoff=cutoff) for word in words_b))
+
+def cluster(count, pairs):
+    """Connected components of the accepted pairs; returns a root index per item"""
+    parent = np.arange(count)
+    
+    def find(i):
+        root = i
+        while parent[root] != root:
+            root = parent[root]
+        while parent[i] != root:
+            parent[i], i = root, parent[i]
+        return root
+    
+    for i, j in pairs:
+        root_i, root_j = find(i), find(j)
+        if root_i != root_j:
+            parent[max(root_i, root_j)] = min(root_i, root_j)
+    return np.array([find(i) for i in range(count)])
+
+def ensure_vendor_tables(engine):
+    """Create the vendor, vendor_alias and vendor_run tables if they don't exist"""
+    with open(VENDOR_SQL_FILE) as f:
+        create_sql = f.read()
+    with engine.begin() as conn:
+        conn.execute(text(create_sql))
+
+def writer_transactions(conn, table_name):
+    """Transaction ids (as text) of other sessions writing to a table or its partitions"""
+    return [row[0] for row in conn.execute(text("""
+        SELECT DISTINCT a.backend_xid::text
+        FROM pg_locks l
+        JOIN pg_stat_activity a ON a.pid = l.pid
+        WHERE l.mode = 'RowExclusiveLock' AND a.backend_xid IS NOT NULL AND a.pid <> pg_backend_pid()
+          AND l.relation IN (SELECT to_regclass(:table_name)
+                             UNION ALL SELECT inhrelid FROM pg_inherits WHERE inhparent = to_regclass(:table_name))
+    """), {'table_name': table_name})]
+
+def wait_for_writers(engine, table_name):
+    """Wait until the transactions writing to a table right now have committed or rolled back
+    
+    A load still in flight may hold ids below the table's current max id
+    (ids come from one sequence, handed out across concurrent loads), and
+    its rows only become visible when it commits. Returns the number of
+    transactions waited for.
+    """
+    with engine.connect() as conn:
+        # Autocommit, so every check sees a fresh pg_stat_activity
+        conn = conn.execution_options(isolation_level='AUTOCOMMIT')
+        xids = writer_transactions(conn, table_name)
+        if xids:
+            print(f"  Waiting for {len(xids)} in-flight load transactions on {table_name} to finish...")
+        while xids and conn.execute(text("""
+            SELECT COUNT(*) FROM pg_stat_activity WHERE backend_xid::text = ANY(:xids)
+        """), {'xids': xids}).scalar():
+            time.sleep(WAIT_POLL_SECONDS)
+    return len(xids)
+
+def resolve_vendors(engine, full=False, threshold=THRESHOLD):
+    """Resolve awardee spellings into vendors, incrementally by default
+    
+    Only rows loaded since the last run (by id) are read, up to the max id
+    taken at the start; loads in flight at that point are waited for
+    first, since they can still commit rows below it. Their new
+    spellings are normalized, blocked against each other and against every
+    known alias, compared by the shingle Jaccard similarity of their
+    distinctive words, and clustered.
+    A cluster that reaches existing aliases joins their vendor (the one
+    with the most contracts if it reaches several; existing vendors are
+    never merged), otherwise it becomes a new vendor named after its most
+    common spelling. full clears the tables and resolves the whole archive.
+    Everything is written in one transaction.
+    """
+    ensure_vendor_tables(engine)
+    start_time = time.time()
+    
+    with engine.connect() as conn:
+        if full:
+            after = 0
+            known = pd.DataFrame(columns=['awardee', 'normalized_name', 'vendor_id', 'contracts'])
+        else:
+            after = conn.execute(text("SELECT COALESCE(MAX(max_id), 0) FROM vendor_run")).scalar()
+            known = pd.read_sql(text("SELECT awardee, normalized_name, vendor_id, contracts FROM vendor_alias"), conn)
+    _, max_id = id_bounds(engine, 'archived_opportunities')
+    max_id = max_id or 0
+    wait_for_writers(engine, physical_table(engine))
+    with engine.connect() as conn:
+        seen = pd.read_sql(text("""
+            SELECT awardee, COUNT(*) AS contracts
+            FROM archived_opportunities
+            WHERE id > :after AND id <= :max_id AND awardee IS NOT NULL
+            GROUP BY awardee
+        """), conn, params={'after': after, 'max_id': max_id})
+    print(f"  Read {len(seen):,} distinct awardees from ids {after + 1:,}-{max_id:,} ({time.time() - start_time:.1f}s)")
+    
+    new = seen[~seen['awardee'].isin(known['awardee'])].reset_index(drop=True)
+    new['normalized_name'] = normalize_names(new['awardee']).to_numpy()
+    new = new[new['normalized_name'] != ''].reset_index(drop=True)
+    
+    # Items to cluster: one per distinct normalized name, known ones first
+    known_names = known.groupby('normalized_name').agg(vendor_id=('vendor_id', 'first'), contracts=('contracts', 'sum'))
+    new_names = new.groupby('normalized_name')['contracts'].sum()
+    new_names = new_names[~new_names.index.isin(known_names.index)]
+    names = np.concatenate([known_names.index.to_numpy(dtype=object), new_names.index.to_numpy(dtype=object)])
+    is_new = np.arange(len(names)) >= len(known_names)
+    
+    pairs = np.empty((0, 2), dtype=np.int64)
+    accepted = pairs
+    if is_new.any():
+        distinctive, generic = split_generic(names)
+        shingle_sets = [shingles(name) for name in distinctive]
+        signatures = minhash_signatures(shingle_sets)
+        pairs, token_blocked = candidate_pairs(distinctive, signatures)
+        involves_new = is_new[pairs[:, 0]] | is_new[pairs[:, 1]]
+        pairs, token_blocked = pairs[involves_new], token_blocked[involves_new]
+        accepted = matching_pairs(pairs, token_blocked, signatures, shingle_sets, distinctive, generic, threshold)
+    print(f"  {len(new_names):,} new names, {len(pairs):,} candidate pairs, {len(accepted):,} matches ({time.time() - start_time:.1f}s)")
+    
+    roots = cluster(len(names), accepted)
+    items = pd.DataFrame({
+        'normalized_name': names,
+        'root': roots,
+        'is_new': is_new,
+        'vendor_id': np.concatenate([known_names['vendor_id'].to_numpy(dtype=float), np.full(len(new_names), np.nan)]),
+        'contracts': np.concatenate([known_names['contracts'].to_numpy(), new_names.to_numpy()])
+    })
+    
+    # Clusters containing known names keep the vendor with the most contracts
+    existing = items[~items['is_new']].sort_values('contracts', ascending=False).drop_duplicates('root')
+    items['vendor_id'] = items['root'].map(existing.set_index('root')['vendor_id'])
+    unresolved = items[items['vendor_id'].isna()]
+    
+    # New clusters are named after their most common raw spelling
+    spellings = new.merge(unresolved[['normalized_name', 'root']], on='normalized_name')
+    canonical = spellings.sort_values(['contracts', 'awardee'], ascending=[False, True]).drop_duplicates('root')
+    
+    with engine.begin() as conn:
+        conn.execute(text("SET LOCAL statement_timeout = 0"))
+        if full:
+            conn.execute(text("TRUNCATE vendor_alias, vendor_run, vendor RESTART IDENTITY"))
+        created = insert_rows(conn, """
+            INSERT INTO vendor (canonical_name, normalized_name) VALUES %s RETURNING id
+        """, list(zip(canonical['awardee'], canonical['normalized_name'])), fetch=True)
+        canonical_ids = dict(zip(canonical['root'], [row[0] for row in created]))
+        items.loc[items['vendor_id'].isna(), 'vendor_id'] = items['root'].map(canonical_ids)
+        
+        aliases = new.merge(items[['normalized_name', 'vendor_id']], on='normalized_name')
+        insert_rows(conn, """
+            INSERT INTO vendor_alias (awardee, normalized_name, vendor_id, contracts) VALUES %s
+        """, list(zip(aliases['awardee'], aliases['normalized_name'], aliases['vendor_id'].astype(int), aliases['contracts'].astype(int))))
+        
+        counted = seen[seen['awardee'].isin(known['awardee'])]
+        insert_rows(conn, """
+            UPDATE vendor_alias a SET contracts = a.contracts + v.contracts
+            FROM (VALUES %s) AS v(awardee, contracts)
+            WHERE a.awardee = v.awardee
+        """, list(zip(counted['awardee'], counted['contracts'].astype(int))))
+        conn.execute(text("""
+            INSERT INTO vendor_run (max_id, new_names, new_vendors) VALUES (:max_id, :new_names, :new_vendors)
+        """), {'max_id': max(max_id, after), 'new_names': len(aliases), 'new_vendors': len(created)})
+    
+    print(f"✓ {len(aliases):,} new awardee spellings resolved to vendors, {len(created):,} new vendors ({time.time() - start_time:.1f}s)")
+    return len(aliases), len(created)
+
+def parse_args():
+    """Parse command-line options for vendor resolution"""
+    parser = argparse.ArgumentParser(description="Resolve awardee spellings into canonical vendors")
+    parser.add_argument('--full', action='store_true', help="Discard existing vendors and resolve the whole archive")
+    parser.add_argument('--threshold', type=float, default=THRESHOLD,
+                        help=f"Shingle Jaccard similarity needed to match two names (default: {THRESHOLD})")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    engine = get_engine(pool_size=1, max_overflow=0, statement_timeout_ms=0, application_name='vendors')
+    print(f"Resolving vendors ({'full' if args.full else 'incremental'})...")
+    resolve_vendors(engine, args.full, args.threshold)
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file